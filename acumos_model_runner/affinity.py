@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+# ===============LICENSE_START=======================================================
+# Acumos Apache-2.0
+# ===================================================================================
+# Copyright (C) 2017-2018 AT&T Intellectual Property & Tech Mahindra. All rights reserved.
+# ===================================================================================
+# This Acumos software file is distributed by AT&T and Tech Mahindra
+# under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# This file is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ===============LICENSE_END=========================================================
+"""
+Provides CPU affinity layouts that pin each gunicorn worker and its native thread pools to dedicated cores
+
+Workers are assigned slots. A replacement worker takes a slot with the CPUs of the worker it replaces, so that the
+layout is stable over the life of the runner. CPU affinity requires Linux.
+"""
+import os
+
+
+def allowed_cpus():
+    '''Returns the sorted CPUs the current process may run on'''
+    if not hasattr(os, 'sched_getaffinity'):
+        raise OSError('CPU affinity is not supported on this platform')
+    return sorted(os.sched_getaffinity(0))
+
+
+def layout(cpus, workers):
+    '''Returns a list with the tuple of CPUs of each worker slot
+
+    CPUs are split into contiguous, equally sized groups, so that the CPUs of a worker tend to share caches. With more
+    workers than CPUs, workers share CPUs round-robin.
+    '''
+    if workers >= len(cpus):
+        return [(cpus[slot % len(cpus)], ) for slot in range(workers)]
+    size, extra = divmod(len(cpus), workers)
+    groups = []
+    start = 0
+    for slot in range(workers):
+        end = start + size + (1 if slot < extra else 0)
+        groups.append(tuple(cpus[start:end]))
+        start = end
+    return groups
+
+
+def format_cpus(cpus):
+    '''Returns a compact description of CPUs, e.g. "0-3,8"'''
+    ranges = []
+    for cpu in sorted(cpus):
+        if ranges and cpu == ranges[-1][1] + 1:
+            ranges[-1][1] = cpu
+        else:
+            ranges.append([cpu, cpu])
+    return ",".join(str(first) if first == last else "{}-{}".format(first, last) for first, last in ranges)
+
+
+def format_layout(groups):
+    '''Returns a one line description of a layout'''
+    return " ".join("{}:{}".format(slot, format_cpus(cpus)) for slot, cpus in enumerate(groups))
+
+
+def free_slot(used, workers):
+    '''Returns the lowest slot that is not in `used` and whose CPUs no slot in `used` has
+
+    Slots `slot` and `slot + workers` have the same CPUs. While every group of CPUs is used, e.g. when new workers start
+    before the old ones stop on a reload, the lowest slot that is not in `used` is returned.
+    '''
+    used = set(slot for slot in used if slot is not None)
+    groups = set(slot % workers for slot in used)
+    slots = [slot for slot in range(workers + len(used) + 1) if slot not in used]
+    return next((slot for slot in slots if slot % workers not in groups), slots[0])
+
+
+def pin(cpus):
+    '''Restricts the current process, and the threads and processes it starts afterwards, to `cpus`'''
+    os.sched_setaffinity(0, cpus)
@@ -19,52 +19,390 @@
 '''
 Provides model runner API implementations
 '''
-from functools import partial
+import json
+import codecs
+import time
+import contextlib
+from types import SimpleNamespace
+from functools import partial, lru_cache
+from itertools import chain, islice
 
-
-from acumos.wrapped import WrappedFunction
+from acumos.wrapped import WrappedFunction, WrappedResponse
 from flask import current_app, send_from_directory, request, abort, Response
 from google.protobuf.message import DecodeError
-from google.protobuf.json_format import ParseError
+from google.protobuf.json_format import ParseError, Parse as ParseJson
+
+from acumos_model_runner.tracing import TRACEPARENT, TRACESTATE
+from acumos_model_runner.descriptors import is_map, is_repeated
+from acumos_model_runner.content_types import _PROTO, _JSON, _TEXT, _OCTET_STREAM  # noqa: F401
+from acumos_model_runner.compression import compress, compress_chunks, is_compressed
+
+_METHODS_PATH = '/model/methods/'
+
+# the size of the reads a request body is copied into a buffer with
+_CHUNK_SIZE = 1024 * 1024
 
+# the size small pieces of a streamed response are collected into before they are sent
+_STREAM_CHUNK_SIZE = 64 * 1024
 
-_PROTO = 'application/vnd.google.protobuf'
-_JSON = 'application/json'
-_TEXT = 'text/plain'
-_OCTET_STREAM = 'application/octet-stream'
+# the number of items of a repeated or map field a streamed JSON output is converted at a time
+_STREAM_ITEMS = 1024
+
+_JSON_ENCODER = json.JSONEncoder(separators=(',', ':'))
 
 
 def methods(method_name: str):
     '''Generic handler for model methods'''
-    content_type, accept = _verify_content_types(method_name)
-    input_is_raw, output_is_raw = _check_if_input_or_output_are_raw(method_name)
-
-    data = request.data
-    method: WrappedFunction = current_app.model.methods[method_name]
-
-    if not input_is_raw:
-        try:
-            wrapped_resp = method.from_pb_bytes(data) if content_type == _PROTO else method.from_json(data)
-        except DecodeError as err:
-            abort(Response("Could not decode input protobuf message: {}".format(err), 400))
-        except ParseError as err:
-            abort(Response("Could not parse input JSON message: {}".format(err), 400))
-        except Exception as err:
-            abort(Response("Could not invoke method due to runtime error: {}".format(err), 400))
-    else:
-        if content_type == _TEXT:
-            data = data.decode("utf-8")
-        wrapped_resp = method.from_raw(raw_in=data)
-
-    if not output_is_raw:
-        if accept == _PROTO:
-            resp_data = wrapped_resp.as_pb_bytes()
-        else:  # accept == _JSON:
-            resp_data = wrapped_resp.as_json()
+    traffic_recorder = current_app.traffic_recorder
+    if traffic_recorder is not None:
+        traffic_recorder.record(time.time(), method_name, request.headers.items(), request.get_data())
+    return _call_method(method_name, _read_body)
+
+
+def stream_raw_input():
+    '''Flask before_request handler that calls methods with raw binary or text inputs on a streamed request body
+
+    Connexion reads the whole body before calling a handler, so streamed methods are handled here instead. With the
+    'file' mode the method receives a file-like object over the request body, a text file for text/plain. With the
+    'buffer' mode it receives a memoryview of a single buffer the body is read into, or the decoded text. Returns None
+    for other requests, which are handled as usual.
+    '''
+    path = request.path
+    if not path.startswith(_METHODS_PATH):
+        return None
+    method_name = path[len(_METHODS_PATH):]
+    method_info = current_app.methods_info.get(method_name)
+    if method_info is None or request.method != 'POST' or _PROTO in method_info['consumes'] \
+            or request.headers.get('Content-Type') not in (_OCTET_STREAM, _TEXT):
+        return None
+
+    if current_app.stream_input == 'file':
+        return _call_method(method_name, _stream_body)
+
+    arrival = time.time()
+    body = _read_into_buffer()
+    traffic_recorder = current_app.traffic_recorder
+    if traffic_recorder is not None:
+        traffic_recorder.record(arrival, method_name, request.headers.items(), body)
+    return _call_method(method_name, partial(_buffered_input, body))
+
+
+def _call_method(method_name: str, read_input):
+    '''Calls a model method and returns its response
+
+    `read_input` is called with the request Content-Type and whether the method input is raw, and returns the method
+    input and the request body to capture if the request is slow, or None if the body cannot be captured.
+    '''
+    tracer = current_app.tracer
+    traceparent = request.headers.get(TRACEPARENT)
+    tracestate = request.headers.get(TRACESTATE)
+    with contextlib.ExitStack() as stack:
+        request_span = stack.enter_context(tracer.span('request', traceparent, tracestate, method=method_name))
+        content_type, accept = _verify_content_types(method_name)
+        input_is_raw, output_is_raw = _check_if_input_or_output_are_raw(method_name)
+        method: WrappedFunction = current_app.model.methods[method_name]
+
+        with tracer.span('decode', content_type=content_type) as decode_span:
+            data, body = read_input(content_type, input_is_raw)
+            if not input_is_raw:
+                msg = _decode(method, data, content_type)
+
+        with tracer.span('compute') as compute_span:
+            if not input_is_raw:
+                try:
+                    wrapped_resp = method.from_pb_msg(msg)
+                except Exception as err:
+                    abort(Response("Could not invoke method due to runtime error: {}".format(err), 400))
+            else:
+                wrapped_resp = method.from_raw(raw_in=data)
+
+        encode_span = stack.enter_context(tracer.span('encode', accept=accept))
+        if not output_is_raw:
+            if accept == _PROTO:
+                resp_data = wrapped_resp.as_pb_bytes()
+            else:  # accept == _JSON:
+                resp_data = _encode_json(method, wrapped_resp)
+        else:
+            resp_data = wrapped_resp.as_raw()
+            if _is_stream(resp_data):
+                resp_data = _raw_chunks(resp_data, accept)
+        resp_data, content_encoding = _compress(resp_data, output_is_raw)
+        spans = stack.pop_all()
+
+    # a streamed body is encoded as it is sent, so its spans end when the server closes the response
+    end_request = partial(_end_request, spans, current_app.slow_request_log, method_name, request.headers, body,
+                          (decode_span, compute_span, encode_span), request_span)
+    response = Response(resp_data, status=200, content_type=accept)
+    if current_app.compression_encodings:
+        response.vary.add('Accept-Encoding')
+        if content_encoding is not None:
+            response.content_encoding = content_encoding
+    if _is_stream(resp_data):
+        response.call_on_close(end_request)
     else:
-        resp_data = wrapped_resp.as_raw()
+        end_request()
+    return response
+
+
+def _end_request(spans, slow_request_log, method_name, headers, body, stage_spans, request_span):
+    '''Ends the encode and request spans of a method call and observes the request if it is slow'''
+    spans.close()
+    if slow_request_log is not None:
+        timings = {span.name: span.duration for span in stage_spans}
+        timings['total'] = request_span.duration
+        slow_request_log.observe(method_name, headers, body, timings)
+
+
+def _compress(resp_data, output_is_raw: bool):
+    '''Returns a response body compressed with the installed encoding the client prefers, and the encoding
+
+    Bodies smaller than the compression threshold and raw outputs that are already compressed are returned as they are,
+    with None as the encoding. Streamed bodies, whose size is not known in advance, are compressed chunk by chunk.
+    '''
+    encodings = current_app.compression_encodings
+    encoding = request.accept_encodings.best_match(encodings) if encodings else None
+    if encoding is None:
+        return resp_data, None
+    level = current_app.compression_levels[encoding]
+
+    if isinstance(resp_data, str):
+        resp_data = resp_data.encode('utf-8')
+    if isinstance(resp_data, (bytes, bytearray, memoryview)):
+        if len(resp_data) < current_app.compression_threshold or (output_is_raw and is_compressed(resp_data)):
+            return resp_data, None
+        return compress(resp_data, encoding, level), encoding
+
+    if not _is_stream(resp_data):
+        return resp_data, None
+    if output_is_raw:
+        # the first chunk tells whether a raw output is already compressed
+        chunks = iter(resp_data)
+        first = next(chunks, b'')
+        resp_data = chain((first, ), chunks)
+        if is_compressed(first):
+            return resp_data, None
+    return compress_chunks(resp_data, encoding, level), encoding
+
+
+def _encode_json(method: WrappedFunction, wrapped_resp):
+    '''Returns the JSON encoding of a method output, or an iterator that encodes it in chunks if its protobuf encoding
+    is estimated to be larger than the streaming threshold, so that the whole encoding is never held in memory'''
+    threshold = current_app.stream_output_threshold
+    if threshold is not None:
+        streamed = _streamed_fields(method.pb_output_type, wrapped_resp.as_wrapped())
+        if streamed and _estimate_size(method.pb_output_type, wrapped_resp.as_wrapped(), streamed) > threshold:
+            return _coalesce(_json_pieces(method.pb_output_type, wrapped_resp.as_wrapped(), streamed))
+    return wrapped_resp.as_json()
+
+
+def _streamed_fields(pb_type, output):
+    '''Returns the names of the non-empty repeated and map fields of an output, and whether each is a map field'''
+    streamed = dict()
+    for field in pb_type.DESCRIPTOR.fields:
+        if is_repeated(field) and getattr(output, field.name):
+            streamed[field.name] = is_map(field)
+    return streamed
+
+
+def _estimate_size(pb_type, output, streamed, samples=16):
+    '''Returns the size of the protobuf encoding of an output, estimated from the encoding of its other fields and of
+    the first `samples` items of each of its repeated and map fields, without encoding the whole output'''
+    empty = _without_items(output, streamed)
+    base = _response(pb_type, empty).as_pb_msg().ByteSize()
+    size = base
+    for name, map_field in streamed.items():
+        value = getattr(output, name)
+        sample = next(_items(value, samples, map_field))
+        sample_size = _response(pb_type, empty._replace(**{name: sample})).as_pb_msg().ByteSize() - base
+        size += sample_size * len(value) // len(sample)
+    return size
+
+
+def _json_pieces(pb_type, output, streamed, size=_STREAM_ITEMS):
+    '''Yields the pieces of the JSON encoding of a method output
+
+    The repeated and map fields of the output are converted `size` items at a time by the serializer of small outputs,
+    `as_json`, so streamed outputs have the same field names and values. Other fields are converted at once.
+    '''
+    empty = _without_items(output, streamed)
+    others = json.loads(_response(pb_type, empty).as_json())
+
+    # the JSON name of a field is the member that differs from the output without its repeated and map items
+    keys = dict()
+    for name, map_field in streamed.items():
+        first = _response(pb_type, empty._replace(**{name: next(_items(getattr(output, name), 1, map_field))}))
+        first = json.loads(first.as_json())
+        keys[name] = next(key for key, value in first.items() if others.get(key) != value)
+        others.pop(keys[name], None)
+
+    yield b'{'
+    for index, (key, value) in enumerate(others.items()):
+        if index:
+            yield b','
+        yield _JSON_ENCODER.encode(key).encode('utf-8') + b':' + _JSON_ENCODER.encode(value).encode('utf-8')
+    for index, (name, map_field) in enumerate(streamed.items()):
+        if index or others:
+            yield b','
+        yield _JSON_ENCODER.encode(keys[name]).encode('utf-8') + (b':{' if map_field else b':[')
+        for offset, chunk in enumerate(_items(getattr(output, name), size, map_field)):
+            items = json.loads(_response(pb_type, empty._replace(**{name: chunk})).as_json())[keys[name]]
+            encoded = (_JSON_ENCODER.encode({key: item})[1:-1] for key, item in items.items()) if map_field \
+                else (_JSON_ENCODER.encode(item) for item in items)
+            for item_index, item in enumerate(encoded):
+                if offset or item_index:
+                    yield b','
+                yield item.encode('utf-8')
+        yield b'}' if map_field else b']'
+    yield b'}'
+
+
+def _without_items(output, streamed):
+    '''Returns an output with its streamed repeated and map fields emptied'''
+    return output._replace(**{name: dict() if map_field else [] for name, map_field in streamed.items()})
+
+
+def _items(value, size: int, map_field: bool):
+    '''Returns an iterator over the items of a repeated or map field value, `size` items at a time'''
+    if map_field:
+        items = iter(value.items())
+        return iter(lambda: dict(islice(items, size)), {})
+    return (value[offset:offset + size] for offset in range(0, len(value), size))
+
+
+def _response(pb_type, output):
+    '''Returns a wrapped method response for an output of a method whose output message type is `pb_type`'''
+    return WrappedResponse(output, _message_types(pb_type), pb_type)
+
+
+@lru_cache(maxsize=None)
+def _message_types(pb_type):
+    '''Returns a namespace of `pb_type` and of the message types of its fields by name, which stands for the protobuf
+    module of the model when wrapped responses are converted'''
+    types = dict()
+    pending = [pb_type]
+    while pending:
+        message_type = pending.pop()
+        if message_type.DESCRIPTOR.name in types:
+            continue
+        types[message_type.DESCRIPTOR.name] = message_type
+        msg = message_type()
+        for field in message_type.DESCRIPTOR.fields:
+            if field.message_type is None:
+                continue
+            value = getattr(msg, field.name)
+            if is_map(field):
+                if field.message_type.fields_by_name['value'].message_type is not None:
+                    pending.append(type(value['']))
+            elif is_repeated(field):
+                pending.append(type(value.add()))
+            else:
+                pending.append(type(value))
+    return SimpleNamespace(**types)
+
+
+def _is_stream(output):
+    '''Returns True if a raw method output is an iterator over chunks of the output rather than the output itself'''
+    return not isinstance(output, (bytes, bytearray, memoryview, str, dict, list)) and hasattr(output, '__iter__')
+
+
+def _raw_chunks(output, accept: str):
+    '''Yields the chunks of a raw method output that is an iterator, as the method produces them
+
+    Items of application/json outputs are encoded as the elements of a JSON array. Text chunks are encoded as UTF-8.
+    '''
+    if accept == _JSON:
+        yield from _coalesce(_json_array(output))
+        return
+    for chunk in output:
+        yield chunk.encode('utf-8') if isinstance(chunk, str) else chunk
+
+
+def _json_array(items):
+    '''Yields the pieces of the JSON encoding of an array of items'''
+    yield b'['
+    for index, item in enumerate(items):
+        if index:
+            yield b','
+        yield _JSON_ENCODER.encode(item).encode('utf-8')
+    yield b']'
+
+
+def _coalesce(pieces, size=_STREAM_CHUNK_SIZE):
+    '''Yields byte pieces joined into chunks of at least `size` bytes, except for the last chunk'''
+    buffer = []
+    buffered = 0
+    for piece in pieces:
+        buffer.append(piece)
+        buffered += len(piece)
+        if buffered >= size:
+            yield b''.join(buffer)
+            buffer = []
+            buffered = 0
+    if buffer:
+        yield b''.join(buffer)
+
+
+def _read_body(content_type: str, input_is_raw: bool):
+    '''Returns the method input and the request body, read completely'''
+    data = body = request.get_data()
+    if input_is_raw and content_type == _TEXT:
+        data = data.decode("utf-8")
+    return data, body
+
+
+def _stream_body(content_type: str, input_is_raw: bool):
+    '''Returns a file-like method input over the request body. The body is consumed by the method, so None is
+    returned as the body'''
+    stream = request.stream
+    if content_type == _TEXT:
+        # the server's input stream is not always an io object, which io.TextIOWrapper requires
+        stream = codecs.getreader('utf-8')(stream)
+    return stream, None
+
+
+def _read_into_buffer():
+    '''Returns a memoryview of a single buffer the request body is read into
+
+    The buffer grows geometrically with the data received, up to the Content-Length, rather than being allocated from
+    the Content-Length up front, so that a request claiming a huge body cannot exhaust memory without sending it.
+    '''
+    length = request.content_length
+    if length is None:  # chunked transfer encoding
+        return memoryview(request.stream.read())
+
+    buffer = bytearray(min(length, _CHUNK_SIZE))
+    stream = request.stream
+    offset = 0
+    while offset < length:
+        chunk = stream.read(min(_CHUNK_SIZE, length - offset))
+        if not chunk:
+            abort(Response("Request body ended after {} of {} bytes".format(offset, length), 400))
+        end = offset + len(chunk)
+        if end > len(buffer):
+            buffer.extend(bytes(min(max(2 * len(buffer), end), length) - len(buffer)))
+        buffer[offset:end] = chunk
+        offset = end
+    return memoryview(buffer)
+
+
+def _buffered_input(body: memoryview, content_type: str, input_is_raw: bool):
+    '''Returns the method input for a body read into a buffer, which is decoded for text/plain, and the body'''
+    return (str(body, 'utf-8') if content_type == _TEXT else body), body
+
 
-    return Response(resp_data, status=200, content_type=accept)
+def _decode(method: WrappedFunction, data: bytes, content_type: str):
+    '''Returns the input protobuf message of a method given a request body'''
+    try:
+        if content_type == _PROTO:
+            return method.pb_input_type.FromString(data)
+        else:
+            return ParseJson(data, method.pb_input_type())
+    except DecodeError as err:
+        abort(Response("Could not decode input protobuf message: {}".format(err), 400))
+    except ParseError as err:
+        abort(Response("Could not parse input JSON message: {}".format(err), 400))
+    except Exception as err:
+        abort(Response("Could not invoke method due to runtime error: {}".format(err), 400))
 
 
 def _verify_content_types(method_name: str) -> (str, str):
@@ -0,0 +1,177 @@
+# -*- coding: utf-8 -*-
+# ===============LICENSE_START=======================================================
+# Acumos Apache-2.0
+# ===================================================================================
+# Copyright (C) 2017-2018 AT&T Intellectual Property & Tech Mahindra. All rights reserved.
+# ===================================================================================
+# This Acumos software file is distributed by AT&T and Tech Mahindra
+# under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# This file is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ===============LICENSE_END=========================================================
+"""
+Provides a benchmark that measures model runner throughput and latency
+"""
+import sys
+import json
+import time
+import socket
+import argparse
+import tempfile
+import subprocess
+import urllib.request
+from os.path import abspath
+
+from acumos_model_runner.loadgen import LoadRequest, run_load, format_table
+
+
+_TABLE_COLUMNS = ('method', 'body', 'workers', 'concurrency', 'requests', 'errors', 'rps', 'p50', 'p95', 'p99')
+
+
+class BenchmarkError(Exception):
+    pass
+
+
+def find_port():
+    '''Returns an open port number'''
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind(('localhost', 0))
+        return sock.getsockname()[1]
+
+
+class RunnerProcess(object):
+
+    def __init__(self, model_dir, port=None, options=None, timeout=60):
+        '''Runs a model runner in a subprocess until it answers requests
+
+        Parameters
+        ----------
+        model_dir : str
+            Directory containing a dumped Acumos Python model
+        port : int, optional
+            The port to bind to. An open port is chosen if not provided
+        options : dict, optional
+            Additional command line options, e.g. {'workers': 2}. Flags are given as True, and omitted if False
+        timeout : float, optional
+            Seconds to wait for the runner to start
+        '''
+        self.port = find_port() if port is None else port
+        self.base_url = "http://localhost:{}".format(self.port)
+        self.timeout = timeout
+        self._cmd = [sys.executable, '-m', 'acumos_model_runner.runner', model_dir, '--host', 'localhost', '--port', str(self.port)]
+        for key, value in (options or dict()).items():
+            if value is False:
+                continue
+            self._cmd.append("--{}".format(key.replace('_', '-')))
+            if value is not True:
+                self._cmd.append(str(value))
+        self._proc = None
+        self._log = None
+
+    def __enter__(self):
+        self._log = tempfile.TemporaryFile()
+        self._proc = subprocess.Popen(self._cmd, stdout=self._log, stderr=subprocess.STDOUT)
+        try:
+            self._wait_ready()
+        except BaseException:
+            self.__exit__(None, None, None)
+            raise
+        return self
+
+    def _wait_ready(self):
+        '''Polls the runner until it serves the model metadata'''
+        deadline = time.monotonic() + self.timeout
+        url = "{}/model/artifacts/metadata".format(self.base_url)
+        while time.monotonic() < deadline:
+            if self._proc.poll() is not None:
+                raise BenchmarkError("Model runner exited with code {}:\n{}".format(self._proc.returncode, self.output()))
+            try:
+                with urllib.request.urlopen(url, timeout=1) as resp:
+                    if resp.status == 200:
+                        return
+            except OSError:
+                pass
+            time.sleep(0.05)
+        raise BenchmarkError("Model runner did not start within {} seconds:\n{}".format(self.timeout, self.output()))
+
+    def output(self):
+        '''Returns the runner output so far'''
+        self._log.seek(0)
+        return self._log.read().decode('utf-8', 'replace')
+
+    def __exit__(self, type, value, tb):
+        if self._proc is not None and self._proc.poll() is None:
+            self._proc.terminate()
+            try:
+                self._proc.wait(timeout=30)
+            except subprocess.TimeoutExpired:
+                self._proc.kill()
+                self._proc.wait()
+        if self._log is not None:
+            self._log.close()
+
+
+def load_variants(model_dir, samples_dir=None):
+    '''Returns a list of (method, body label, headers, body) for every way of calling every method of a model'''
+    from acumos.wrapped import load_model
+    from acumos_model_runner.runner import _write_oas, _methods_from_spec
+    from acumos_model_runner.samples import create_samples, request_variants
+
+    methods_info = _methods_from_spec(_write_oas(model_dir))
+    samples = create_samples(load_model(model_dir), methods_info, samples_dir)
+    return list(request_variants(methods_info, samples))
+
+
+def run_bench(model_dir, workers=(1, ), concurrency=(1, 8), requests=1000, warmup_requests=20, samples_dir=None, runner_options=None):
+    '''Benchmarks every method and content type of a model across worker and concurrency settings. Returns a list of result dicts'''
+    model_dir = abspath(model_dir)
+    variants = load_variants(model_dir, samples_dir)
+
+    results = []
+    for num_workers in workers:
+        options = dict(runner_options or dict(), workers=num_workers)
+        with RunnerProcess(model_dir, options=options) as runner:
+            for method_name, label, headers, body in variants:
+                run_load(runner.base_url, [LoadRequest(None, method_name, headers, body)] * warmup_requests, max(concurrency))
+                for num_clients in concurrency:
+                    stats = run_load(runner.base_url, [LoadRequest(None, method_name, headers, body)] * requests, num_clients)
+                    results.append(dict(stats, method=method_name, body=label, workers=num_workers, concurrency=num_clients))
+    return results
+
+
+def _int_list(value):
+    '''Parses a comma-separated list of integers'''
+    return tuple(int(v) for v in value.split(','))
+
+
+def run_bench_cli(argv=None):
+    '''CLI entry point for benchmarking a model'''
+    parser = argparse.ArgumentParser(prog='acumos_model_runner bench', description='Measures model runner throughput and latency percentiles')
+    parser.add_argument('model_dir', type=str, help='Directory containing a dumped Acumos Python model')
+    parser.add_argument('--workers', type=_int_list, default=(1, ), help='Comma-separated numbers of gunicorn workers to benchmark')
+    parser.add_argument('--concurrency', type=_int_list, default=(1, 8), help='Comma-separated numbers of concurrent clients to benchmark')
+    parser.add_argument('--requests', type=int, default=1000, help='The number of requests per method, body type, worker and concurrency setting')
+    parser.add_argument('--warmup-requests', type=int, default=20, help='The number of unmeasured requests sent before each method and body type')
+    parser.add_argument('--samples', type=str, default=None, help='Directory of <method>.json, <method>.pb or <method>.bin sample inputs. Inputs are synthesized otherwise')
+    parser.add_argument('--json', type=str, default=None, help='Writes the results as JSON to this file')
+
+    pargs = parser.parse_args(argv)
+
+    results = run_bench(pargs.model_dir, pargs.workers, pargs.concurrency, pargs.requests, pargs.warmup_requests, pargs.samples)
+
+    print(format_table(results, _TABLE_COLUMNS))
+    if pargs.json is not None:
+        with open(pargs.json, 'w') as file:
+            json.dump({'model_dir': abspath(pargs.model_dir), 'results': results}, file, indent=2)
+    return 0 if all(row['errors'] == 0 for row in results) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(run_bench_cli())
@@ -0,0 +1,176 @@
+# -*- coding: utf-8 -*-
+# ===============LICENSE_START=======================================================
+# Acumos Apache-2.0
+# ===================================================================================
+# Copyright (C) 2017-2018 AT&T Intellectual Property & Tech Mahindra. All rights reserved.
+# ===================================================================================
+# This Acumos software file is distributed by AT&T and Tech Mahindra
+# under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# This file is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ===============LICENSE_END=========================================================
+"""
+Provides startup bundles that let the model runner skip startup work done at image build time
+
+A bundle is written to the ``runner_bundle`` directory of a model directory and contains:
+
+- ``spec.json``: the generated and validated OpenAPI specification
+- ``methods.json``: the method dispatch table
+- ``parser.pickle``: the serialized protobuf IDL parser tables
+- ``manifest.json``: the fingerprint of the model files and runner the bundle was built from
+
+Byte code for the model ``scripts/user_provided`` and ``scripts/acumos_gen`` packages is precompiled in place.
+"""
+import os
+import sys
+import json
+import hashlib
+import logging
+import argparse
+from collections import namedtuple
+from os.path import abspath, isdir, isfile, join as path_join
+
+from acumos_model_runner._version import __version__
+
+
+logger = logging.getLogger(__name__)
+
+BUNDLE_DIR = 'runner_bundle'
+
+Bundle = namedtuple('Bundle', 'path, spec, methods_info')
+
+_SPEC = 'spec.json'
+_METHODS = 'methods.json'
+_PARSER = 'parser.pickle'
+_MANIFEST = 'manifest.json'
+_FINGERPRINTED_FILES = ('metadata.json', 'model.proto')
+_SCRIPTS_DIRS = (('scripts', 'user_provided'), ('scripts', 'acumos_gen'))
+
+
+def fingerprint(model_dir):
+    '''Returns a digest of the model files and runner version that generated artifacts depend on'''
+    digest = hashlib.sha256(__version__.encode('utf-8'))
+    for name in _FINGERPRINTED_FILES:
+        with open(path_join(model_dir, name), 'rb') as file:
+            digest.update(file.read())
+    return digest.hexdigest()
+
+
+def _parser_key():
+    '''Returns an identifier of the grammar and parser library the parser tables depend on'''
+    import lark
+    from acumos_model_runner.proto_parser import load_grammar
+    return "{}:{}".format(lark.__version__, hashlib.sha256(load_grammar().encode('utf-8')).hexdigest())
+
+
+def precompile(model_dir):
+    '''Writes a startup bundle for a model directory and returns its path'''
+    from connexion.spec import Specification
+    from acumos_model_runner.proto_parser import save_parser_tables
+    from acumos_model_runner.runner import _write_oas, _methods_from_spec
+
+    model_dir = abspath(model_dir)
+    bundle_dir = path_join(model_dir, BUNDLE_DIR)
+    os.makedirs(bundle_dir, exist_ok=True)
+
+    spec = _write_oas(model_dir)
+    Specification.from_dict(spec)  # raises if connexion would reject the spec at startup
+
+    with open(path_join(bundle_dir, _SPEC), 'w') as file:
+        json.dump(spec, file)
+    with open(path_join(bundle_dir, _METHODS), 'w') as file:
+        json.dump(_methods_from_spec(spec), file)
+    save_parser_tables(path_join(bundle_dir, _PARSER))
+    _compile_scripts(model_dir)
+
+    # the manifest is written last so that an interrupted precompile leaves no usable bundle
+    manifest = {'fingerprint': fingerprint(model_dir), 'parser': _parser_key(), 'python': list(sys.version_info[:2])}
+    with open(path_join(bundle_dir, _MANIFEST), 'w') as file:
+        json.dump(manifest, file)
+    return bundle_dir
+
+
+def _compile_scripts(model_dir):
+    '''Precompiles the byte code of the model script packages'''
+    import compileall
+    import py_compile
+    from zipfile import ZipFile
+
+    model_zip = path_join(model_dir, 'model.zip')
+    extracted_dir = path_join(model_dir, 'model')
+    if isfile(model_zip):
+        # load_model extracts the archive here on every start, so compile the same files
+        with ZipFile(model_zip) as zip_file:
+            zip_file.extractall(extracted_dir)
+    else:
+        extracted_dir = model_dir
+
+    # the archive is re-extracted with new modification times, so byte code is validated by source hash instead
+    mode = getattr(py_compile, 'PycInvalidationMode', None)
+    kwargs = dict() if mode is None else {'invalidation_mode': mode.CHECKED_HASH}
+    for parts in _SCRIPTS_DIRS:
+        scripts_dir = path_join(extracted_dir, *parts)
+        if isdir(scripts_dir):
+            compileall.compile_dir(scripts_dir, quiet=1, **kwargs)
+
+
+def load_bundle(model_dir):
+    '''Returns the Bundle of a model directory, or None if there is no bundle or it is stale
+
+    The parser tables of a stale bundle are still loaded if they match the installed parser, so that
+    regenerating the specification is faster. A current bundle never needs the parser. A bundle built with
+    another Python version is rebuilt, or ignored if the model directory is read-only.
+    '''
+    bundle_dir = path_join(model_dir, BUNDLE_DIR)
+    manifest_path = path_join(bundle_dir, _MANIFEST)
+    if not isfile(manifest_path):
+        return None
+
+    with open(manifest_path) as file:
+        manifest = json.load(file)
+
+    if manifest.get('fingerprint') != fingerprint(model_dir):
+        logger.warning("Ignoring stale startup bundle %s. Run 'acumos_model_runner precompile' again", bundle_dir)
+        if manifest.get('parser') == _parser_key():
+            from acumos_model_runner.proto_parser import load_parser_tables
+            load_parser_tables(path_join(bundle_dir, _PARSER))
+        return None
+
+    if manifest.get('python') != list(sys.version_info[:2]):
+        logger.warning("Rebuilding startup bundle %s, which was built with Python %s", bundle_dir,
+                       '.'.join(map(str, manifest.get('python') or ('?', ))))
+        try:
+            precompile(model_dir)
+        except OSError as err:
+            logger.warning("Ignoring startup bundle %s, which could not be rebuilt: %s", bundle_dir, err)
+            return None
+        return load_bundle(model_dir)
+
+    with open(path_join(bundle_dir, _SPEC)) as file:
+        spec = json.load(file)
+    with open(path_join(bundle_dir, _METHODS)) as file:
+        methods_info = json.load(file)
+    return Bundle(bundle_dir, spec, methods_info)
+
+
+def run_precompile_cli(argv=None):
+    '''CLI entry point for precompiling a model directory'''
+    parser = argparse.ArgumentParser(prog='acumos_model_runner precompile',
+                                     description='Writes a startup bundle so that the model runner starts faster. Run once at image build time')
+    parser.add_argument('model_dir', type=str, help='Directory containing a dumped Acumos Python model')
+    pargs = parser.parse_args(argv)
+
+    bundle_dir = precompile(pargs.model_dir)
+    print("Wrote startup bundle {}".format(bundle_dir))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(run_precompile_cli())
@@ -0,0 +1,174 @@
+# -*- coding: utf-8 -*-
+# ===============LICENSE_START=======================================================
+# Acumos Apache-2.0
+# ===================================================================================
+# Copyright (C) 2017-2018 AT&T Intellectual Property & Tech Mahindra. All rights reserved.
+# ===================================================================================
+# This Acumos software file is distributed by AT&T and Tech Mahindra
+# under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# This file is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ===============LICENSE_END=========================================================
+"""
+Provides calibration that picks the number of workers and threads of a model from measured throughput and latency
+
+Calibration starts the runner with each candidate configuration, sends a mix of sample inputs for every method and
+body type at a fixed client concurrency, and picks the configuration with the highest throughput whose p99 latency
+meets a target. The choice and the measured results are written to a calibration file, which later starts reuse
+as long as the model files, runner version and CPU limit are unchanged.
+"""
+import sys
+import json
+import time
+import logging
+import argparse
+from itertools import cycle, islice
+from os.path import abspath, isfile
+
+from acumos_model_runner.bundle import fingerprint
+from acumos_model_runner.sizing import cpu_limit
+
+
+logger = logging.getLogger(__name__)
+
+_TABLE_COLUMNS = ('workers', 'threads', 'concurrency', 'requests', 'errors', 'rps', 'p50', 'p95', 'p99')
+
+
+class CalibrationError(Exception):
+    pass
+
+
+def default_workers(cpus=None):
+    '''Returns the candidate worker counts: powers of two up to the number of CPUs, and the number of CPUs'''
+    cores = max(1, int(cpu_limit() if cpus is None else cpus))
+    workers = {cores}
+    count = 1
+    while count < cores:
+        workers.add(count)
+        count *= 2
+    return tuple(sorted(workers))
+
+
+def calibrate(model_dir, p99_target, workers=None, threads=(1, 2), concurrency=8, requests=500, warmup_requests=50,
+              samples_dir=None, runner_options=None):
+    '''Measures every combination of `workers` and `threads` and returns a calibration dict
+
+    Parameters
+    ----------
+    model_dir : str
+        Directory containing a dumped Acumos Python model
+    p99_target : float
+        The p99 latency in milliseconds that the chosen configuration must meet
+    workers : tuple of int, optional
+        Candidate numbers of workers. Powers of two up to the number of CPUs if not provided
+    threads : tuple of int, optional
+        Candidate numbers of request threads per worker
+    concurrency : int, optional
+        The number of concurrent clients, i.e. the load the configuration should handle
+    requests : int, optional
+        The number of measured requests per configuration
+    warmup_requests : int, optional
+        The number of unmeasured requests sent to each configuration first
+    samples_dir : str, optional
+        Directory of sample inputs, as for warmup and the bench command. Inputs are synthesized otherwise
+    runner_options : dict, optional
+        Additional command line options of the measured runners
+    '''
+    from acumos_model_runner.bench import RunnerProcess, load_variants
+    from acumos_model_runner.loadgen import LoadRequest, run_load
+
+    model_dir = abspath(model_dir)
+    workers = default_workers() if workers is None else workers
+    mix = [LoadRequest(None, method_name, headers, body) for method_name, _, headers, body in load_variants(model_dir, samples_dir)]
+
+    results = []
+    for num_workers in workers:
+        for num_threads in threads:
+            options = dict(runner_options or dict(), workers=num_workers, threads=num_threads)
+            with RunnerProcess(model_dir, options=options) as runner:
+                run_load(runner.base_url, list(islice(cycle(mix), warmup_requests)), concurrency)
+                stats = run_load(runner.base_url, list(islice(cycle(mix), requests)), concurrency)
+            results.append(dict(stats, workers=num_workers, threads=num_threads, concurrency=concurrency))
+
+    return {'fingerprint': fingerprint(model_dir),
+            'cpus': cpu_limit(),
+            'time': time.time(),
+            'p99_target': p99_target,
+            'choice': choose(results, p99_target),
+            'results': results}
+
+
+def choose(results, p99_target):
+    '''Returns the workers and threads of the result with the highest throughput that meets the p99 target
+
+    Fewer processes and threads win ties. If no result meets the target, the one with the lowest p99 is chosen.
+    '''
+    valid = [r for r in results if not r['errors'] and r['p99'] is not None]
+    if not valid:
+        raise CalibrationError('Every calibration run had errors')
+
+    meeting = [r for r in valid if r['p99'] <= p99_target]
+    if meeting:
+        best = max(meeting, key=lambda r: (r['rps'], -r['workers'] * r['threads']))
+    else:
+        best = min(valid, key=lambda r: r['p99'])
+        logger.warning("No configuration meets the p99 target of %sms. Choosing the lowest p99 of %.1fms", p99_target, best['p99'])
+    return {'workers': best['workers'], 'threads': best['threads'], 'rps': best['rps'], 'p99': best['p99']}
+
+
+def save_calibration(path, calibration):
+    '''Writes a calibration dict to a file'''
+    with open(path, 'w') as file:
+        json.dump(calibration, file, indent=2)
+
+
+def load_calibration(path, model_dir):
+    '''Returns the calibration dict saved at `path`, or None if there is none or it does not match the model or CPUs'''
+    if not isfile(path):
+        return None
+    with open(path) as file:
+        calibration = json.load(file)
+    if calibration.get('fingerprint') != fingerprint(model_dir) or calibration.get('cpus') != cpu_limit():
+        logger.warning("Ignoring stale calibration %s", path)
+        return None
+    return calibration
+
+
+def run_calibrate_cli(argv=None):
+    '''CLI entry point for calibrating the workers and threads of a model'''
+    from acumos_model_runner.bench import _int_list
+    from acumos_model_runner.loadgen import format_table
+
+    parser = argparse.ArgumentParser(prog='acumos_model_runner calibrate',
+                                     description='Picks the workers and threads with the highest throughput that meet a p99 latency target')
+    parser.add_argument('model_dir', type=str, help='Directory containing a dumped Acumos Python model')
+    parser.add_argument('--p99', type=float, required=True, help='The p99 latency target in milliseconds')
+    parser.add_argument('--output', type=str, required=True, help='The calibration file to write, for use with the --calibration runner option')
+    parser.add_argument('--workers', type=_int_list, default=None, help='Comma-separated numbers of workers to try. Powers of two up to the number of CPUs by default')
+    parser.add_argument('--threads', type=_int_list, default=(1, 2), help='Comma-separated numbers of threads per worker to try')
+    parser.add_argument('--concurrency', type=int, default=8, help='The number of concurrent clients to calibrate for')
+    parser.add_argument('--requests', type=int, default=500, help='The number of measured requests per configuration')
+    parser.add_argument('--samples', type=str, default=None, help='Directory of <method>.json, <method>.pb or <method>.bin sample inputs. Inputs are synthesized otherwise')
+
+    pargs = parser.parse_args(argv)
+
+    calibration = calibrate(pargs.model_dir, pargs.p99, pargs.workers, pargs.threads, pargs.concurrency, pargs.requests,
+                            samples_dir=pargs.samples)
+    save_calibration(pargs.output, calibration)
+
+    print(format_table(calibration['results'], _TABLE_COLUMNS))
+    choice = calibration['choice']
+    print("Chose {} workers with {} threads each: {:.1f} requests/s, p99 {:.1f}ms".format(
+        choice['workers'], choice['threads'], choice['rps'], choice['p99']))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(run_calibrate_cli())
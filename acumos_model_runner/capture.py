@@ -0,0 +1,147 @@
+# -*- coding: utf-8 -*-
+# ===============LICENSE_START=======================================================
+# Acumos Apache-2.0
+# ===================================================================================
+# Copyright (C) 2017-2018 AT&T Intellectual Property & Tech Mahindra. All rights reserved.
+# ===================================================================================
+# This Acumos software file is distributed by AT&T and Tech Mahindra
+# under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# This file is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ===============LICENSE_END=========================================================
+"""
+Provides a slow request log that captures request payloads for offline reproduction
+"""
+import os
+import json
+import time
+import random
+import logging
+from collections import namedtuple
+from os.path import join as path_join
+
+
+logger = logging.getLogger('gunicorn.error')
+
+Capture = namedtuple('Capture', 'method, headers, body, timings, timestamp')
+
+_META_EXT = '.json'
+_BODY_EXT = '.bin'
+_CAPTURED_HEADERS = ('Content-Type', 'Accept')
+
+
+class SlowRequestLog(object):
+
+    def __init__(self, threshold, capture_dir=None, sample_rate=1.0, max_bytes=1024 * 1024, max_files=1000):
+        '''Logs requests slower than `threshold` seconds and optionally captures their payloads
+
+        Parameters
+        ----------
+        threshold : float
+            Requests taking longer than this many seconds are logged
+        capture_dir : str, optional
+            Directory to write captured payloads to. Payloads are not captured if not provided
+        sample_rate : float, optional
+            Fraction of slow requests whose payloads are captured
+        max_bytes : int, optional
+            Payloads larger than this many bytes are not captured
+        max_files : int, optional
+            Maximum number of captures kept in `capture_dir`. The oldest captures are removed first
+        '''
+        self.threshold = threshold
+        self.capture_dir = capture_dir
+        self.sample_rate = sample_rate
+        self.max_bytes = max_bytes
+        self.max_files = max_files
+        if capture_dir is not None:
+            os.makedirs(capture_dir, exist_ok=True)
+
+    def observe(self, method_name, headers, body, timings):
+        '''Logs and captures a request if it was slow. `timings` maps phase names to seconds and includes "total"
+
+        `body` is None if the request body was streamed to the method, in which case it is not captured.
+        '''
+        total = timings['total']
+        if total < self.threshold:
+            return False
+
+        phases = " ".join("{}={:.1f}ms".format(phase, seconds * 1000) for phase, seconds in timings.items())
+        logger.warning("Slow request to method '%s' with Content-Type '%s': %s",
+                       method_name, headers.get('Content-Type'), phases)
+
+        if self.capture_dir is not None and random.random() < self.sample_rate:
+            if body is None:
+                logger.info("Not capturing a payload streamed to the method")
+            elif len(body) > self.max_bytes:
+                logger.info("Not capturing %d byte payload larger than %d bytes", len(body), self.max_bytes)
+            else:
+                self._capture(method_name, headers, body, timings)
+        return True
+
+    def _capture(self, method_name, headers, body, timings):
+        '''Writes a payload and its metadata to the capture directory'''
+        timestamp = time.time()
+        name = "{:.6f}-{}-{}".format(timestamp, os.getpid(), method_name)
+        meta = {'method': method_name,
+                'headers': {k: headers[k] for k in _CAPTURED_HEADERS if k in headers},
+                'timings': timings,
+                'timestamp': timestamp}
+
+        with open(path_join(self.capture_dir, name + _BODY_EXT), 'wb') as file:
+            file.write(body)
+        # metadata is written last so that readers never see a capture without a body
+        with open(path_join(self.capture_dir, name + _META_EXT), 'w') as file:
+            json.dump(meta, file)
+
+        self._rotate()
+
+    def _rotate(self):
+        '''Removes the oldest captures beyond `max_files`'''
+        names = sorted(f[:-len(_META_EXT)] for f in os.listdir(self.capture_dir) if f.endswith(_META_EXT))
+        for name in names[:max(0, len(names) - self.max_files)]:
+            for ext in (_META_EXT, _BODY_EXT):
+                try:
+                    os.remove(path_join(self.capture_dir, name + ext))
+                except FileNotFoundError:
+                    pass  # another worker rotated it first
+
+
+def load_captures(capture_dir):
+    '''Yields Capture namedtuples from a capture directory, oldest first'''
+    names = sorted(f[:-len(_META_EXT)] for f in os.listdir(capture_dir) if f.endswith(_META_EXT))
+    for name in names:
+        try:
+            with open(path_join(capture_dir, name + _META_EXT)) as file:
+                meta = json.load(file)
+            with open(path_join(capture_dir, name + _BODY_EXT), 'rb') as file:
+                body = file.read()
+        except FileNotFoundError:
+            continue  # rotated away while reading
+        yield Capture(meta['method'], meta['headers'], body, meta['timings'], meta['timestamp'])
+
+
+def replay_captures(capture_dir, base_url, timeout=60):
+    '''Replays captured requests against a runner at `base_url`. Returns a list of (Capture, status, seconds) tuples'''
+    import urllib.request
+    import urllib.error
+
+    results = []
+    for capture in load_captures(capture_dir):
+        url = "{}/model/methods/{}".format(base_url.rstrip('/'), capture.method)
+        req = urllib.request.Request(url, data=capture.body, headers=capture.headers, method='POST')
+        start = time.perf_counter()
+        try:
+            with urllib.request.urlopen(req, timeout=timeout) as resp:
+                resp.read()
+                status = resp.status
+        except urllib.error.HTTPError as err:
+            status = err.code
+        results.append((capture, status, time.perf_counter() - start))
+    return results
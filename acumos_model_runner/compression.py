@@ -0,0 +1,153 @@
+# -*- coding: utf-8 -*-
+# ===============LICENSE_START=======================================================
+# Acumos Apache-2.0
+# ===================================================================================
+# Copyright (C) 2017-2018 AT&T Intellectual Property & Tech Mahindra. All rights reserved.
+# ===================================================================================
+# This Acumos software file is distributed by AT&T and Tech Mahindra
+# under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# This file is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ===============LICENSE_END=========================================================
+"""
+Provides response compression with gzip, and with zstd or brotli when the optional ``zstandard`` or ``brotli`` packages
+are installed
+
+Compressors share one interface, so that buffered responses are compressed in a single call and streamed responses
+chunk by chunk, without collecting the output first.
+"""
+import zlib
+
+
+GZIP = 'gzip'
+ZSTD = 'zstd'
+BROTLI = 'br'
+
+# encodings in the order they are preferred among those a client accepts equally
+ENCODINGS = (ZSTD, BROTLI, GZIP)
+
+# levels that favor speed, as responses are compressed on the request path
+DEFAULT_LEVELS = {GZIP: 6, ZSTD: 3, BROTLI: 4}
+
+_LEVEL_RANGES = {GZIP: (0, 9), ZSTD: (-7, 22), BROTLI: (0, 11)}
+
+# leading bytes of formats that are already compressed, which are sent as they are
+_COMPRESSED_SIGNATURES = (
+    b'\x1f\x8b',  # gzip
+    b'\x28\xb5\x2f\xfd',  # zstd
+    b'BZh',  # bzip2
+    b'\xfd7zXZ\x00',  # xz
+    b'\x04\x22\x4d\x18',  # lz4 frame
+    b'PK\x03\x04',  # zip
+    b'7z\xbc\xaf\x27\x1c',  # 7z
+    b'\x89PNG\r\n\x1a\n',  # png
+    b'\xff\xd8\xff',  # jpeg
+    b'GIF8',  # gif
+)
+
+
+class CompressionError(Exception):
+    pass
+
+
+def available_encodings():
+    '''Returns the supported encodings whose libraries are installed, in order of preference'''
+    return tuple(encoding for encoding in ENCODINGS if _library(encoding) is not None)
+
+
+def _library(encoding):
+    '''Returns the module that implements an encoding, or None if it is not installed'''
+    try:
+        if encoding == ZSTD:
+            import zstandard
+            return zstandard
+        if encoding == BROTLI:
+            import brotli
+            return brotli
+    except ImportError:
+        return None
+    return zlib
+
+
+def check_levels(levels):
+    '''Returns a dict of the compression level of every supported encoding, with `levels` overriding the defaults'''
+    checked = dict(DEFAULT_LEVELS)
+    for encoding, level in (levels or dict()).items():
+        if encoding not in _LEVEL_RANGES:
+            raise CompressionError("Unknown encoding {}. Must be one of {}".format(encoding, list(ENCODINGS)))
+        low, high = _LEVEL_RANGES[encoding]
+        if not low <= level <= high:
+            raise CompressionError("The {} level must be between {} and {}".format(encoding, low, high))
+        checked[encoding] = level
+    return checked
+
+
+def is_compressed(data):
+    '''Returns True if `data` starts like a format that is already compressed'''
+    head = bytes(data[:8])
+    return head.startswith(_COMPRESSED_SIGNATURES)
+
+
+class Compressor(object):
+
+    def __init__(self, encoding, level):
+        '''Compresses a stream of bytes with one of the supported encodings'''
+        self.encoding = encoding
+        if encoding == GZIP:
+            self._obj = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+            self._compress = self._obj.compress
+        elif encoding == ZSTD:
+            self._obj = _library(ZSTD).ZstdCompressor(level=level).compressobj()
+            self._compress = self._obj.compress
+        elif encoding == BROTLI:
+            self._obj = _library(BROTLI).Compressor(quality=level)
+            self._compress = self._obj.process
+        else:
+            raise CompressionError("Unknown encoding {}".format(encoding))
+
+    def compress(self, data):
+        '''Returns compressed bytes of `data`, which may be held back until a later call'''
+        return self._compress(data)
+
+    def flush(self):
+        '''Returns the compressed bytes held back, so that a client can decompress everything compressed so far'''
+        if self.encoding == GZIP:
+            return self._obj.flush(zlib.Z_SYNC_FLUSH)
+        if self.encoding == ZSTD:
+            return self._obj.flush(_library(ZSTD).COMPRESSOBJ_FLUSH_BLOCK)
+        return self._obj.flush()
+
+    def finish(self):
+        '''Returns the last compressed bytes. The compressor cannot be used afterwards'''
+        return self._obj.finish() if self.encoding == BROTLI else self._obj.flush()
+
+
+def compress(data, encoding, level):
+    '''Returns `data` compressed in one piece'''
+    if encoding == ZSTD:
+        return _library(ZSTD).ZstdCompressor(level=level).compress(data)
+    if encoding == BROTLI:
+        return _library(BROTLI).compress(data, quality=level)
+    compressor = Compressor(encoding, level)
+    return compressor.compress(data) + compressor.finish()
+
+
+def compress_chunks(chunks, encoding, level):
+    '''Yields compressed chunks of a stream of byte chunks as they are produced
+
+    Each chunk is flushed, so that a client can decompress the data of a chunk as soon as it is received.
+    '''
+    compressor = Compressor(encoding, level)
+    for chunk in chunks:
+        if chunk:
+            yield compressor.compress(chunk) + compressor.flush()
+    last = compressor.finish()
+    if last:
+        yield last
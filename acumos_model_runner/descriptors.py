@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+# ===============LICENSE_START=======================================================
+# Acumos Apache-2.0
+# ===================================================================================
+# Copyright (C) 2017-2018 AT&T Intellectual Property & Tech Mahindra. All rights reserved.
+# ===================================================================================
+# This Acumos software file is distributed by AT&T and Tech Mahindra
+# under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# This file is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ===============LICENSE_END=========================================================
+"""
+Provides the protobuf file descriptor of a dumped model
+
+The descriptor is read from the serialized ``FileDescriptorProto`` embedded in the model's generated ``model_pb2``
+module. The module is parsed rather than imported, so that reading the descriptor neither registers the file in
+the default descriptor pool nor depends on the protobuf version the module was generated for.
+"""
+import ast
+from fnmatch import fnmatch
+from glob import glob
+from zipfile import ZipFile
+from os.path import isfile, join as path_join
+
+
+_PB2_PATH = ('scripts', 'acumos_gen', '*', 'model_pb2.py')
+
+
+def load_file_descriptor(model_dir):
+    '''Returns the FileDescriptorProto of a model's generated protobuf module, or None if it cannot be found'''
+    source = _read_pb2_source(model_dir)
+    return None if source is None else parse_pb2_source(source)
+
+
+def _read_pb2_source(model_dir):
+    '''Returns the source of the generated protobuf module, preferring the model archive over extracted files'''
+    model_zip = path_join(model_dir, 'model.zip')
+    if isfile(model_zip):
+        pattern = '/'.join(_PB2_PATH)
+        with ZipFile(model_zip) as zip_file:
+            for name in zip_file.namelist():
+                if fnmatch(name, pattern):
+                    return zip_file.read(name).decode('utf-8')
+
+    for scripts_root in (path_join(model_dir, 'model'), model_dir):
+        for path in glob(path_join(scripts_root, *_PB2_PATH)):
+            with open(path, encoding='utf-8') as file:
+                return file.read()
+    return None
+
+
+def parse_pb2_source(source):
+    '''Returns the FileDescriptorProto serialized in the source of a generated ``*_pb2`` module, or None'''
+    from google.protobuf.descriptor_pb2 import FileDescriptorProto
+
+    serialized = _find_serialized_file(ast.parse(source))
+    return None if serialized is None else FileDescriptorProto.FromString(serialized)
+
+
+def _find_serialized_file(tree):
+    '''Returns the serialized file descriptor passed to the protobuf runtime by a generated module'''
+    for node in ast.walk(tree):
+        if not isinstance(node, ast.Call):
+            continue
+        # protoc >= 3.20 generates ``AddSerializedFile(b'...')``
+        if isinstance(node.func, ast.Attribute) and node.func.attr == 'AddSerializedFile' and node.args:
+            return _literal_bytes(node.args[0])
+        # older protoc generates ``FileDescriptor(..., serialized_pb=_b('...'))`` or ``serialized_pb=b'...'``
+        for keyword in node.keywords:
+            if keyword.arg == 'serialized_pb':
+                return _literal_bytes(keyword.value)
+    return None
+
+
+def _literal_bytes(node):
+    '''Returns the bytes of a literal, unwrapping the latin-1 ``_b('...')`` helper of older generated modules'''
+    if isinstance(node, ast.Call) and len(node.args) == 1:
+        node = node.args[0]
+    value = ast.literal_eval(node)
+    return value.encode('latin-1') if isinstance(value, str) else value
+
+
+def is_repeated(field):
+    '''Returns True if a runtime FieldDescriptor is a repeated or map field, across protobuf versions'''
+    from google.protobuf.descriptor import FieldDescriptor
+
+    # protobuf 7 replaces FieldDescriptor.label with is_repeated
+    repeated = getattr(field, 'is_repeated', None)
+    return field.label == FieldDescriptor.LABEL_REPEATED if repeated is None else repeated
+
+
+def is_map(field):
+    '''Returns True if a runtime FieldDescriptor is a map field'''
+    return field.message_type is not None and field.message_type.GetOptions().map_entry
@@ -0,0 +1,238 @@
+# -*- coding: utf-8 -*-
+# ===============LICENSE_START=======================================================
+# Acumos Apache-2.0
+# ===================================================================================
+# Copyright (C) 2017-2018 AT&T Intellectual Property & Tech Mahindra. All rights reserved.
+# ===================================================================================
+# This Acumos software file is distributed by AT&T and Tech Mahindra
+# under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# This file is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ===============LICENSE_END=========================================================
+"""
+Provides a WSGI dispatcher that loads the app serving a model in the background and swaps it without dropping requests
+"""
+import gc
+import json
+import time
+import logging
+import threading
+
+from werkzeug.wsgi import ClosingIterator
+
+from acumos_model_runner.metrics import CONTENT_TYPE
+
+
+logger = logging.getLogger('gunicorn.error')
+
+RELOAD_PATH = '/admin/reload'
+LIVE_PATH = '/health/live'
+READY_PATH = '/health/ready'
+METRICS_PATH = '/metrics'
+
+
+class _Generation(object):
+
+    def __init__(self, number, app):
+        '''A version of the app and the number of requests it is serving'''
+        self.number = number
+        self.app = app
+        self.in_flight = 0
+
+
+class ModelDispatcher(object):
+
+    def __init__(self, app, build_app, request_reload=None, drain_timeout=30, retry_after=5, metrics=None):
+        '''WSGI app that forwards requests to the current version of a model app
+
+        Liveness and readiness are served at /health/live and /health/ready. Until an app is loaded, other requests
+        are answered with 503 Service Unavailable.
+
+        Parameters
+        ----------
+        app : callable
+            The initial WSGI app, or None if it is loaded later with `load` or `load_async`
+        build_app : callable
+            Returns a new WSGI app built from the model directory. Called by `reload`
+        request_reload : callable, optional
+            Enables POST /admin/reload if provided. Called to trigger a reload, e.g. of every worker
+        drain_timeout : float, optional
+            Seconds to wait for requests to a replaced app to finish before releasing it anyway
+        retry_after : int, optional
+            Seconds that clients are asked to wait before retrying while the app is loading
+        metrics : acumos_model_runner.metrics.Registry, optional
+            Serves the metrics of this registry at /metrics if provided
+        '''
+        self.build_app = build_app
+        self.request_reload = request_reload
+        self.drain_timeout = drain_timeout
+        self.retry_after = retry_after
+        self.metrics = metrics
+        self.load_error = None
+        self._current = None if app is None else _Generation(1, app)
+        self._lock = threading.Lock()
+        self._drained = threading.Condition(self._lock)
+        self._reload_lock = threading.Lock()
+
+    @property
+    def generation(self):
+        '''The number of the app version currently serving new requests, or 0 if no app is loaded yet'''
+        current = self._current
+        return 0 if current is None else current.number
+
+    @property
+    def ready(self):
+        '''True once an app is loaded'''
+        return self._current is not None
+
+    def __call__(self, environ, start_response):
+        path = environ.get('PATH_INFO')
+        if path == LIVE_PATH:
+            return self._handle_live(start_response)
+        if path == READY_PATH:
+            return self._handle_ready(start_response)
+        if self.request_reload is not None and path == RELOAD_PATH:
+            return self._handle_reload(environ, start_response)
+        if self.metrics is not None and path == METRICS_PATH:
+            body = self.metrics.render().encode('utf-8')
+            start_response('200 OK', [('Content-Type', CONTENT_TYPE), ('Content-Length', str(len(body)))])
+            return [body]
+
+        with self._lock:
+            generation = self._current
+            if generation is None:
+                return self._unavailable(start_response)
+            generation.in_flight += 1
+            app = generation.app
+        try:
+            result = app(environ, start_response)
+        except BaseException:
+            self._release(generation)
+            raise
+        # the request is in flight until the server closes the response, which may be streamed
+        return ClosingIterator(result, lambda: self._release(generation))
+
+    def _release(self, generation):
+        '''Marks a request to `generation` as finished'''
+        with self._lock:
+            generation.in_flight -= 1
+            if not generation.in_flight:
+                self._drained.notify_all()
+
+    def _handle_live(self, start_response):
+        '''Responds to liveness probes. Fails once loading the initial app has failed, so that the worker is replaced'''
+        if self.load_error is not None:
+            return _respond_json(start_response, '500 INTERNAL SERVER ERROR', {'status': 'failed', 'error': self.load_error})
+        return _respond_json(start_response, '200 OK', {'status': 'live'})
+
+    def _handle_ready(self, start_response):
+        '''Responds to readiness probes'''
+        if not self.ready:
+            return self._unavailable(start_response)
+        return _respond_json(start_response, '200 OK', {'status': 'ready', 'generation': self.generation})
+
+    def _unavailable(self, start_response):
+        '''Responds with 503 while the app is loading'''
+        status = 'failed' if self.load_error is not None else 'loading'
+        return _respond_json(start_response, '503 SERVICE UNAVAILABLE', {'status': status},
+                             [('Retry-After', str(self.retry_after))])
+
+    def _handle_reload(self, environ, start_response):
+        '''Triggers a reload in response to POST /admin/reload'''
+        if environ.get('REQUEST_METHOD') != 'POST':
+            start_response('405 METHOD NOT ALLOWED', [('Allow', 'POST'), ('Content-Type', 'text/plain')])
+            return [b'Method Not Allowed']
+        self.request_reload()
+        return _respond_json(start_response, '202 ACCEPTED', {'status': 'reloading', 'generation': self.generation})
+
+    def load(self, build_app=None):
+        '''Loads the initial app with `build_app`, or the `build_app` given to the constructor, and starts serving it
+
+        Raises if loading fails, after recording the error for liveness probes.
+        '''
+        with self._reload_lock:
+            start = time.perf_counter()
+            try:
+                app = (self.build_app if build_app is None else build_app)()
+            except Exception as e:
+                self.load_error = "{}: {}".format(type(e).__name__, e)
+                raise
+            with self._lock:
+                self._current = _Generation(1, app)
+        logger.info("Model ready in %.1fms", (time.perf_counter() - start) * 1000)
+
+    def load_async(self, build_app=None):
+        '''Loads the initial app in a background thread, so that probes are answered meanwhile. Returns the thread'''
+        thread = threading.Thread(target=self._load_logged, args=(build_app, ), name='model-load', daemon=True)
+        thread.start()
+        return thread
+
+    def _load_logged(self, build_app):
+        '''Loads the initial app, logging rather than raising errors'''
+        try:
+            self.load(build_app)
+        except Exception:
+            logger.exception("Failed to load the model")
+
+    def reload(self, build_app=None):
+        '''Builds a new app with `build_app`, or the `build_app` given to the constructor, swaps it in for new requests,
+        and releases the old app once its requests finish
+
+        Returns the new generation number. If building the new app fails, the current app keeps serving and the
+        exception is raised.
+        '''
+        with self._reload_lock:
+            start = time.perf_counter()
+            app = (self.build_app if build_app is None else build_app)()
+            with self._lock:
+                old = self._current
+                number = self.generation + 1
+                self._current = _Generation(number, app)
+                self.load_error = None
+            logger.info("Reloaded model as generation %d in %.1fms", number, (time.perf_counter() - start) * 1000)
+            if old is not None:
+                self._drain(old)
+            return number
+
+    def reload_async(self):
+        '''Reloads in a background thread. Returns the thread'''
+        thread = threading.Thread(target=self._reload_logged, name='model-reload', daemon=True)
+        thread.start()
+        return thread
+
+    def _reload_logged(self):
+        '''Reloads, logging rather than raising errors'''
+        try:
+            self.reload()
+        except Exception:
+            logger.exception("Failed to reload the model. Still serving generation %d", self.generation)
+
+    def _drain(self, generation):
+        '''Waits for the requests to a replaced generation to finish, then releases its memory'''
+        deadline = time.monotonic() + self.drain_timeout
+        with self._lock:
+            while generation.in_flight:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    logger.warning("%d requests to generation %d did not finish within %ss", generation.in_flight,
+                                   generation.number, self.drain_timeout)
+                    break
+                self._drained.wait(remaining)
+        # in-flight requests still hold a reference if the drain timed out, so the app is freed when they finish
+        generation.app = None
+        gc.collect()
+        logger.info("Released generation %d", generation.number)
+
+
+def _respond_json(start_response, status, obj, headers=()):
+    '''Starts a JSON response'''
+    body = json.dumps(obj).encode('utf-8')
+    start_response(status, [('Content-Type', 'application/json'), ('Content-Length', str(len(body)))] + list(headers))
+    return [body]
@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+# ===============LICENSE_START=======================================================
+# Acumos Apache-2.0
+# ===================================================================================
+# Copyright (C) 2017-2018 AT&T Intellectual Property & Tech Mahindra. All rights reserved.
+# ===================================================================================
+# This Acumos software file is distributed by AT&T and Tech Mahindra
+# under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# This file is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ===============LICENSE_END=========================================================
+"""
+Provides a gunicorn worker that serves HTTP/2 over cleartext (h2c) as well as HTTP/1.1 with hypercorn
+
+The gunicorn master still manages workers, so reloads, zygote mode, CPU affinity and the memory watchdog work as with
+the default workers. Requires the optional hypercorn dependency: ``pip install acumos_model_runner[http2]``.
+"""
+import os
+import sys
+import asyncio
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor
+
+from gunicorn.workers.base import Worker
+from hypercorn.asyncio import serve
+from hypercorn.config import Config
+from werkzeug.wsgi import ClosingIterator
+
+
+class Http2Worker(Worker):
+    '''Gunicorn worker that serves the WSGI app with hypercorn on the sockets inherited from the master
+
+    Clients may use HTTP/1.1, HTTP/2 with prior knowledge, or upgrade to HTTP/2 with ``Upgrade: h2c``. A single HTTP/2
+    connection carries concurrent requests, which run on up to `threads` threads of the worker.
+    '''
+
+    def run(self):
+        asyncio.run(self._serve())
+
+    async def _serve(self):
+        '''Serves requests until the worker is asked to stop'''
+        asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(max_workers=self.cfg.threads))
+        await serve(self._call_app, self._hypercorn_config(), shutdown_trigger=self._heartbeat, mode='wsgi')
+
+    def _hypercorn_config(self):
+        '''Returns the hypercorn configuration that corresponds to the gunicorn settings'''
+        config = Config()
+        config.bind = ["fd://{}".format(sock.fileno()) for sock in self.sockets]
+        config.keep_alive_timeout = self.cfg.keepalive
+        config.graceful_timeout = self.cfg.graceful_timeout
+        config.backlog = self.cfg.backlog
+        config.wsgi_max_body_size = sys.maxsize  # as with gunicorn, request bodies are not limited
+        if self.cfg.max_requests > 0:
+            config.max_requests = self.cfg.max_requests
+            config.max_requests_jitter = self.cfg.max_requests_jitter
+        config.errorlog = self.log.error_log
+        return config
+
+    def _call_app(self, environ, start_response):
+        '''Calls the WSGI app, and the post_request hook once the response is sent, as gunicorn workers do'''
+        return ClosingIterator(self.wsgi(environ, start_response), partial(self.cfg.post_request, self, None, environ, None))
+
+    async def _heartbeat(self):
+        '''Notifies the master that the worker is alive until the worker is asked to stop, e.g. by SIGTERM'''
+        while self.alive:
+            self.notify()
+            if self.ppid != os.getppid():
+                self.log.info("Parent changed, shutting down: %s", self)
+                return
+            await asyncio.sleep(min(1.0, self.timeout or 1.0))
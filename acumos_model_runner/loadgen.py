@@ -0,0 +1,154 @@
+# -*- coding: utf-8 -*-
+# ===============LICENSE_START=======================================================
+# Acumos Apache-2.0
+# ===================================================================================
+# Copyright (C) 2017-2018 AT&T Intellectual Property & Tech Mahindra. All rights reserved.
+# ===================================================================================
+# This Acumos software file is distributed by AT&T and Tech Mahindra
+# under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# This file is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ===============LICENSE_END=========================================================
+"""
+Provides an HTTP load generator for model runners
+"""
+import math
+import time
+import queue
+import threading
+import http.client
+from collections import namedtuple
+from urllib.parse import urlsplit
+
+
+LoadRequest = namedtuple('LoadRequest', 'offset, method, headers, body')
+
+_PERCENTILES = (50, 90, 95, 99)
+
+
+def percentile(sorted_values, q):
+    '''Returns the `q`-th percentile of already sorted values using the nearest-rank method'''
+    if not sorted_values:
+        return None
+    rank = max(1, int(math.ceil(q / 100. * len(sorted_values))))
+    return sorted_values[rank - 1]
+
+
+def summarize(latencies, errors, elapsed):
+    '''Returns a dict of throughput and latency statistics. Latencies are in seconds, statistics in milliseconds'''
+    latencies = sorted(latencies)
+    stats = {'requests': len(latencies) + errors,
+             'errors': errors,
+             'elapsed': elapsed,
+             'rps': len(latencies) / elapsed if elapsed > 0 else 0.}
+    for q in _PERCENTILES:
+        value = percentile(latencies, q)
+        stats["p{}".format(q)] = None if value is None else value * 1000
+    stats['max'] = latencies[-1] * 1000 if latencies else None
+    return stats
+
+
+def format_table(rows, columns):
+    '''Returns a plain text table of `rows` (dicts) showing `columns`'''
+    def fmt(value):
+        if value is None:
+            return '-'
+        return "{:.2f}".format(value) if isinstance(value, float) else str(value)
+
+    cells = [[fmt(row.get(column)) for column in columns] for row in rows]
+    widths = [max(len(column), *(len(row[i]) for row in cells)) if cells else len(column) for i, column in enumerate(columns)]
+    lines = ["  ".join(column.rjust(width) for column, width in zip(columns, widths))]
+    lines.extend("  ".join(cell.rjust(width) for cell, width in zip(row, widths)) for row in cells)
+    return "\n".join(lines)
+
+
+class _Client(object):
+
+    def __init__(self, base_url, timeout):
+        '''A persistent HTTP/1.1 connection to a model runner'''
+        parts = urlsplit(base_url)
+        self._host = parts.hostname
+        self._port = parts.port
+        self._prefix = parts.path.rstrip('/')
+        self._timeout = timeout
+        self._conn = None
+
+    def post(self, method, headers, body):
+        '''POSTs to a model method and returns the response status'''
+        if self._conn is None:
+            self._conn = http.client.HTTPConnection(self._host, self._port, timeout=self._timeout)
+        try:
+            self._conn.request('POST', "{}/model/methods/{}".format(self._prefix, method), body=body, headers=headers)
+            resp = self._conn.getresponse()
+            resp.read()
+            return resp.status
+        except (OSError, http.client.HTTPException):
+            self.close()
+            raise
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+
+def run_load(base_url, requests, concurrency=1, timeout=60):
+    '''Sends `requests` (LoadRequest namedtuples) to a model runner and returns a dict of statistics
+
+    Requests with an `offset` are sent at that time relative to the start of the run. Their latency is
+    measured from the scheduled time rather than the send time, so that a slow runner is not hidden by
+    the load generator falling behind. Requests without an offset are sent as fast as `concurrency` allows.
+    '''
+    todo = queue.Queue()
+    for req in requests:
+        todo.put(req)
+
+    lock = threading.Lock()
+    latencies = []
+    errors = [0]
+    start = time.perf_counter()
+
+    def work():
+        client = _Client(base_url, timeout)
+        try:
+            while True:
+                try:
+                    req = todo.get_nowait()
+                except queue.Empty:
+                    return
+
+                if req.offset is None:
+                    sent = time.perf_counter()
+                else:
+                    sent = start + req.offset
+                    delay = sent - time.perf_counter()
+                    if delay > 0:
+                        time.sleep(delay)
+                try:
+                    ok = client.post(req.method, req.headers, req.body) < 400
+                except (OSError, http.client.HTTPException):
+                    ok = False
+                latency = time.perf_counter() - sent
+
+                with lock:
+                    if ok:
+                        latencies.append(latency)
+                    else:
+                        errors[0] += 1
+        finally:
+            client.close()
+
+    threads = [threading.Thread(target=work, daemon=True) for _ in range(max(1, concurrency))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    return summarize(latencies, errors[0], time.perf_counter() - start)
@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+# ===============LICENSE_START=======================================================
+# Acumos Apache-2.0
+# ===================================================================================
+# Copyright (C) 2017-2018 AT&T Intellectual Property & Tech Mahindra. All rights reserved.
+# ===================================================================================
+# This Acumos software file is distributed by AT&T and Tech Mahindra
+# under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# This file is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ===============LICENSE_END=========================================================
+"""
+Provides counters and gauges exposed in the Prometheus text format
+
+Metrics are kept per process. Behind gunicorn, each scrape is answered by one worker, so every sample is labeled
+with the worker ``pid``. Metrics registered as shared hold a value common to all workers, e.g. read from a file they
+share, and are rendered without the ``pid`` label, so that the series does not depend on the answering worker and
+summing across workers does not count the value once per worker.
+"""
+import os
+import threading
+from collections import OrderedDict
+
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+class Metric(object):
+
+    def __init__(self, name, kind, description, shared=False):
+        '''A named family of samples distinguished by their labels'''
+        self.name = name
+        self.kind = kind
+        self.description = description
+        self.shared = shared
+        self._samples = OrderedDict()
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        '''Adds `amount` to the sample with `labels`'''
+        key = _label_key(labels)
+        with self._lock:
+            self._samples[key] = self._samples.get(key, 0) + amount
+
+    def set(self, value, **labels):
+        '''Sets the sample with `labels` to `value`'''
+        with self._lock:
+            self._samples[_label_key(labels)] = value
+
+    def remove(self, **labels):
+        '''Removes the sample with `labels`, e.g. when the object it describes no longer exists'''
+        with self._lock:
+            self._samples.pop(_label_key(labels), None)
+
+    def value(self, **labels):
+        '''Returns the value of the sample with `labels`, or None'''
+        with self._lock:
+            return self._samples.get(_label_key(labels))
+
+    def samples(self):
+        '''Returns a list of (labels dict, value) tuples'''
+        with self._lock:
+            return [(dict(key), value) for key, value in self._samples.items()]
+
+
+class Registry(object):
+
+    def __init__(self):
+        '''A collection of metrics that can be rendered for scraping'''
+        self._metrics = OrderedDict()
+        self._collectors = []
+
+    def add_collector(self, collector):
+        '''Registers a callable that updates metrics before they are rendered, e.g. from state shared between workers'''
+        self._collectors.append(collector)
+
+    def counter(self, name, description, shared=False):
+        '''Returns the counter `name`, creating it if needed. A shared counter counts across all workers'''
+        return self._get(name, 'counter', description, shared)
+
+    def gauge(self, name, description, shared=False):
+        '''Returns the gauge `name`, creating it if needed. A shared gauge holds a value common to all workers'''
+        return self._get(name, 'gauge', description, shared)
+
+    def _get(self, name, kind, description, shared=False):
+        '''Returns a registered metric, or registers a new one'''
+        metric = self._metrics.get(name)
+        if metric is None:
+            metric = self._metrics.setdefault(name, Metric(name, kind, description, shared))
+        if metric.kind != kind:
+            raise ValueError("Metric {} is a {}, not a {}".format(name, metric.kind, kind))
+        return metric
+
+    def render(self):
+        '''Returns all metrics in the Prometheus text exposition format'''
+        for collector in self._collectors:
+            collector()
+
+        pid = str(os.getpid())
+        lines = []
+        for metric in self._metrics.values():
+            lines.append("# HELP {} {}".format(metric.name, metric.description))
+            lines.append("# TYPE {} {}".format(metric.name, metric.kind))
+            for labels, value in metric.samples():
+                if not metric.shared:
+                    labels['pid'] = pid
+                lines.append("{}{} {}".format(metric.name, _format_labels(labels), _format_value(value)))
+        return "\n".join(lines) + "\n"
+
+
+def _label_key(labels):
+    '''Returns a hashable key for a labels dict'''
+    return tuple(sorted(labels.items()))
+
+
+def _format_labels(labels):
+    '''Returns labels in the exposition format, e.g. {model="a",pid="1"}, or nothing without labels'''
+    if not labels:
+        return ''
+    return "{" + ",".join('{}="{}"'.format(k, _escape(str(v))) for k, v in sorted(labels.items())) + "}"
+
+
+def _escape(value):
+    '''Escapes a label value'''
+    return value.replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_value(value):
+    '''Formats a sample value, writing integral values without a fraction'''
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
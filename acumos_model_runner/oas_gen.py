@@ -18,15 +18,17 @@
 # limitations under the License.
 # ===============LICENSE_END=========================================================
 """
-Provides utilities for generating an Open API specification from protobuf IDL and model metadata
+Provides utilities for generating an Open API specification from protobuf definitions and model metadata
 """
+import json
 import yaml
+from functools import lru_cache
 from collections import namedtuple
 from jinja2 import Environment, FileSystemLoader
 
 from acumos_model_runner.proto_parser import Message, RepeatedField, MapField, Enum, parse_proto
 from acumos_model_runner.utils import data_path
-from acumos_model_runner.api import _PROTO, _JSON, _OCTET_STREAM, _TEXT
+from acumos_model_runner.content_types import _PROTO, _JSON, _OCTET_STREAM, _TEXT
 
 
 class TemplateError(Exception):
@@ -55,16 +57,56 @@ _PROTO_OAS_MAP = {
     'string': _OasFormat('string'),
     'bytes': _OasFormat('string', 'byte')}
 
-
-def create_oas(metadata, protobuf):
-    '''Returns an OAS YAML string'''
-    top_level = parse_proto(protobuf)
+_SCALAR_SCHEMAS = {name: {k: v for k, v in oas_format._asdict().items() if v is not None}
+                   for name, oas_format in _PROTO_OAS_MAP.items()}
+
+# scalar FieldDescriptorProto.Type values, see google/protobuf/descriptor.proto
+_DESCRIPTOR_SCALARS = {
+    1: 'double',
+    2: 'float',
+    3: 'int64',
+    4: 'uint64',
+    5: 'int32',
+    6: 'fixed64',
+    7: 'fixed32',
+    8: 'bool',
+    9: 'string',
+    12: 'bytes',
+    13: 'uint32',
+    15: 'sfixed32',
+    16: 'sfixed64',
+    17: 'sint32',
+    18: 'sint64'}
+
+_TYPE_MESSAGE = 11
+_TYPE_ENUM = 14
+_LABEL_REPEATED = 3
+
+
+def create_oas(metadata, protobuf, file_descriptor=None):
+    '''Returns an OAS YAML string
+
+    Definitions are built from `file_descriptor`, a FileDescriptorProto or FileDescriptor of the model protobuf
+    file, if provided. Otherwise the `protobuf` IDL string is parsed.
+    '''
+    return create_spec(metadata, protobuf, file_descriptor)[1]
+
+
+def create_spec(metadata, protobuf, file_descriptor=None):
+    '''Returns the OAS as a dict and as a YAML string. Arguments are the same as `create_oas`
+
+    Definitions are embedded in the YAML as JSON, which is valid YAML, and only the small templated part of the
+    specification is parsed to create the dict. Large protobuf files are thus never dumped to or loaded from YAML.
+    '''
     schema = metadata["schema"]
     version = schema[schema.index(":") + 1:]
     current_version = tuple(map(int, version.split('.')))
     version_dir = version
     major_minor = current_version[:2]
-    protobuf_defs = _create_definitions(top_level)
+    if file_descriptor is None:
+        protobuf_defs = _create_definitions(parse_proto(protobuf))
+    else:
+        protobuf_defs = _create_descriptor_definitions(_as_file_proto(file_descriptor))
 
     if major_minor >= (0, 6):
         raw_defs = _create_raw_types_definitions(metadata["methods"])
@@ -79,12 +121,19 @@ def create_oas(metadata, protobuf):
 
     all_defs = {**protobuf_defs, **raw_defs}
 
-    defs_yaml = yaml.dump(all_defs, default_flow_style=False)
     methods = [_format_method(name, method, major_minor) for name, method in metadata['methods'].items()]
-    template_path = data_path('templates', version_dir)
-    env = Environment(loader=FileSystemLoader(template_path), trim_blocks=True)
-    gen_yaml = env.get_template('base.yaml').render(model=metadata, methods=methods, definitions=defs_yaml)
-    return gen_yaml
+    template = _get_template(version_dir)
+    spec = yaml.safe_load(template.render(model=metadata, methods=methods, definitions='{}'))
+    spec['definitions'] = all_defs
+    gen_yaml = template.render(model=metadata, methods=methods, definitions=json.dumps(all_defs, sort_keys=True))
+    return spec, gen_yaml
+
+
+@lru_cache(maxsize=None)
+def _get_template(version_dir):
+    '''Returns the compiled base template of a metadata schema version'''
+    env = Environment(loader=FileSystemLoader(data_path('templates', version_dir)), trim_blocks=True)
+    return env.get_template('base.yaml')
 
 
 def _format_method(name, method, major_minor):
@@ -108,11 +157,98 @@ def _format_method(name, method, major_minor):
 
 
 def _create_definitions(top_level):
-    '''Returns OAS definitions for all protobuf top-level definitions'''
-    refs = {ref for item in top_level for ref in _find_refs(item)}
-    defs = {name: definition for item in top_level for name, definition in _find_definitions(item, refs)}
-    defs_prefixed = {_prefix_name(key): val for key, val in defs.items()}
-    return defs_prefixed
+    '''Returns OAS definitions for all protobuf top-level definitions
+
+    Definitions are built in a single walk over the parsed IDL. Named field types are left as unresolved references
+    and resolved afterwards against the symbol table of all message and enum names collected during the walk.
+    '''
+    symbols = set()
+    unresolved = []
+    defs = dict()
+    for item in top_level:
+        _add_definitions(item, (), symbols, unresolved, defs)
+
+    resolved = dict()
+    for ref, type_name, scope in unresolved:
+        key = (type_name, scope)
+        if key not in resolved:
+            resolved[key] = "#/definitions/{}".format(_prefix_name(_resolve_named_type(type_name, symbols, scope)))
+        ref['$ref'] = resolved[key]
+
+    return {_prefix_name(key): val for key, val in defs.items()}
+
+
+def _as_file_proto(file_descriptor):
+    '''Returns a FileDescriptorProto given a FileDescriptorProto or FileDescriptor'''
+    if not hasattr(file_descriptor, 'CopyToProto'):
+        return file_descriptor
+
+    from google.protobuf.descriptor_pb2 import FileDescriptorProto
+    file_proto = FileDescriptorProto()
+    file_descriptor.CopyToProto(file_proto)
+    return file_proto
+
+
+def _create_descriptor_definitions(file_proto):
+    '''Returns OAS definitions for all messages and enums of a FileDescriptorProto'''
+    type_prefix = ".{}.".format(file_proto.package) if file_proto.package else "."
+    defs = dict()
+    for enum in file_proto.enum_type:
+        defs[enum.name] = _define_descriptor_enum(enum)
+    for message in file_proto.message_type:
+        _add_descriptor_definitions(message, (), type_prefix, dict(), defs)
+    return {_prefix_name(key): val for key, val in defs.items()}
+
+
+def _add_descriptor_definitions(message, prefix, type_prefix, map_values, defs):
+    '''Adds OAS definitions for a message DescriptorProto and its nested types to `defs`'''
+    scope = prefix + (message.name, )
+
+    for nested in message.nested_type:
+        if nested.options.map_entry:
+            # map fields are repeated fields of a generated entry message, which is not a definition of its own
+            map_values[type_prefix + ".".join(scope + (nested.name, ))] = nested.field[1]
+        else:
+            _add_descriptor_definitions(nested, scope, type_prefix, map_values, defs)
+
+    for enum in message.enum_type:
+        defs[".".join(scope + (enum.name, ))] = _define_descriptor_enum(enum)
+
+    properties = {field.name: _define_descriptor_field(field, type_prefix, map_values) for field in message.field}
+    # at most one field of a oneof is set, so oneof fields are not required
+    required = sorted(field.name for field in message.field if not field.HasField('oneof_index'))
+
+    def_obj = {'type': 'object'}
+    if required:
+        def_obj['required'] = required
+    if properties:
+        def_obj['properties'] = properties
+    defs[".".join(scope)] = def_obj
+
+
+def _define_descriptor_enum(enum):
+    '''Returns an OAS object corresponding to an EnumDescriptorProto'''
+    return {'type': 'string', 'enum': [value.name for value in enum.value]}
+
+
+def _define_descriptor_field(field, type_prefix, map_values):
+    '''Returns an OAS object corresponding to a FieldDescriptorProto'''
+    if field.type == _TYPE_MESSAGE and field.type_name in map_values:
+        return {'type': 'object', 'additionalProperties': _resolve_descriptor_type(map_values[field.type_name], type_prefix)}
+    field_type = _resolve_descriptor_type(field, type_prefix)
+    if field.label == _LABEL_REPEATED:
+        return {'type': 'array', 'items': field_type}
+    return field_type
+
+
+def _resolve_descriptor_type(field, type_prefix):
+    '''Returns an OAS object corresponding to the type of a FieldDescriptorProto. Returns a reference for named types'''
+    if field.type in _DESCRIPTOR_SCALARS:
+        return dict(_SCALAR_SCHEMAS[_DESCRIPTOR_SCALARS[field.type]])
+    elif field.type in (_TYPE_MESSAGE, _TYPE_ENUM) and field.type_name.startswith(type_prefix):
+        return {'$ref': "#/definitions/{}".format(_prefix_name(field.type_name[len(type_prefix):]))}
+    else:
+        raise TemplateError("Cannot create a definition for field {} of type {}".format(field.name, field.type_name or field.type))
 
 
 def _create_raw_types_definitions(methods):
@@ -156,38 +292,22 @@ def _create_raw_types_definitions(methods):
     return raw_types
 
 
-def _find_refs(item, root=()):
-    '''Yields tuples representing a hierarchy of custom named types'''
-    yield root + (item.name, )
-    if isinstance(item, Message):
-        child_root = root + (item.name, )
-        for enum in item.enums:
-            yield child_root + (enum.name, )
-        for msg in item.messages:
-            yield from _find_refs(msg, child_root)
-
+def _add_definitions(item, prefix, symbols, unresolved, defs):
+    '''Adds OAS definitions for a protobuf Message or Enum and its nested definitions to `defs`'''
+    scope = prefix + (item.name, )
+    def_name = ".".join(scope)
+    symbols.add(def_name)
 
-def _find_definitions(item, refs, prefix=()):
-    '''Yields OAS definitions contained within a top-level protobuf definition'''
-    if isinstance(item, Message):
-        yield from _find_message_definitions(item, refs, prefix)
-    elif isinstance(item, Enum):
-        yield _define_enum(item, prefix)
-    else:
+    if isinstance(item, Enum):
+        defs[def_name] = {'type': 'string', 'enum': item.enums}
+        return
+    elif not isinstance(item, Message):
         raise TemplateError("Cannot create definition item {}".format(item))
 
+    for nested in item.enums + item.messages:
+        _add_definitions(nested, scope, symbols, unresolved, defs)
 
-def _find_message_definitions(message, refs, prefix):
-    '''Yields OAS definitions contained within to a protobuf message'''
-    scope = prefix + (message.name, )
-
-    for enum in message.enums:
-        yield _define_enum(enum, scope)
-
-    for msg in message.messages:
-        yield from _find_message_definitions(msg, refs, scope)
-
-    properties = {field.name: _define_field(field, refs, scope) for field in message.fields}
+    properties = {field.name: _define_field(field, scope, unresolved) for field in item.fields}
 
     def_obj = {'type': 'object'}
     if properties:
@@ -195,51 +315,36 @@ def _find_message_definitions(message, refs, prefix):
         # only add properties and required if there are fields.
         def_obj['required'] = sorted(properties.keys())
         def_obj['properties'] = properties
-    def_name = ".".join(scope)
-    yield def_name, def_obj
-
+    defs[def_name] = def_obj
 
-def _define_enum(enum, prefix):
-    '''Returns an OAS object corresponding to a protobuf enum'''
-    def_name = ".".join(prefix + (enum.name, ))
-    return def_name, {'type': 'string', 'enum': enum.enums}
 
-
-def _define_field(field, refs, prefix):
+def _define_field(field, scope, unresolved):
     '''Returns an OAS object corresponding to a protobuf field'''
     if isinstance(field, MapField):
-        field_type = _resolve_type(field.val_type, refs, prefix)
-        return {'type': 'object', 'additionalProperties': field_type}
-    else:
-        field_type = _resolve_type(field.type, refs, prefix)
-        if isinstance(field, RepeatedField):
-            return {'type': 'array', 'items': field_type}
-        else:
-            return field_type
-
+        return {'type': 'object', 'additionalProperties': _resolve_type(field.val_type, scope, unresolved)}
+    field_type = _resolve_type(field.type, scope, unresolved)
+    if isinstance(field, RepeatedField):
+        return {'type': 'array', 'items': field_type}
+    return field_type
 
-def _resolve_type(type_name, refs, prefix):
-    '''Returns an OAS object corresponding to a protobuf type. Returns a reference for named types'''
-    if type_name in _PROTO_OAS_MAP:
-        oas_type = _PROTO_OAS_MAP[type_name]
-        return {k: v for k, v in oas_type._asdict().items() if v is not None}
-    else:
-        ref_tuple = _resolve_named_type(type_name, refs, prefix)
-        ref_str = "#/definitions/{}".format(_prefix_name(".".join(ref_tuple)))
-        return {'$ref': ref_str}
 
+def _resolve_type(type_name, scope, unresolved):
+    '''Returns an OAS object corresponding to a protobuf type. Named types get a reference that is resolved later'''
+    if type_name in _SCALAR_SCHEMAS:
+        return dict(_SCALAR_SCHEMAS[type_name])
+    ref = {'$ref': None}
+    unresolved.append((ref, type_name, scope))
+    return ref
 
-def _resolve_named_type(type_name, refs, prefix):
-    '''Returns the full identifier for a given named type'''
-    type_idents = tuple(type_name.split('.'))
 
+def _resolve_named_type(type_name, symbols, scope):
+    '''Returns the full dotted name of a named type as seen from `scope`'''
     # look within the most local scope first, and gradually move towards global scope
-    for i in reversed(range(len(prefix) + 1)):
-        full_ident = prefix[:i] + type_idents
-        if full_ident in refs:
-            return full_ident
-    else:
-        raise TemplateError("Failed to find a reference for named type {}".format('/'.join(prefix + type_idents)))
+    for i in reversed(range(len(scope) + 1)):
+        full_name = ".".join(scope[:i] + (type_name, ))
+        if full_name in symbols:
+            return full_name
+    raise TemplateError("Failed to find a reference for named type {}".format('/'.join(scope + tuple(type_name.split('.')))))
 
 
 def _prefix_name(name):
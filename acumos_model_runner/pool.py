@@ -0,0 +1,310 @@
+# -*- coding: utf-8 -*-
+# ===============LICENSE_START=======================================================
+# Acumos Apache-2.0
+# ===================================================================================
+# Copyright (C) 2017-2018 AT&T Intellectual Property & Tech Mahindra. All rights reserved.
+# ===================================================================================
+# This Acumos software file is distributed by AT&T and Tech Mahindra
+# under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# This file is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ===============LICENSE_END=========================================================
+"""
+Provides a WSGI app that serves many model directories, loading them on first use and evicting idle ones
+
+A models directory contains one dumped model per subdirectory. The model in ``<models_dir>/<name>`` is served under
+``/models/<name>``, e.g. ``/models/<name>/model/methods/<method>``.
+"""
+import os
+import gc
+import json
+import time
+import logging
+import threading
+from collections import OrderedDict
+from os.path import isfile, join as path_join
+
+from werkzeug.wsgi import ClosingIterator
+
+from acumos_model_runner.utils import get_rss
+from acumos_model_runner.metrics import Registry, CONTENT_TYPE
+from acumos_model_runner.dispatcher import RELOAD_PATH, LIVE_PATH, READY_PATH, METRICS_PATH
+
+
+logger = logging.getLogger('gunicorn.error')
+
+MODELS_PATH = '/models'
+
+
+class _Resident(object):
+
+    def __init__(self, name, app, rss):
+        '''A loaded model app, the memory it is charged against the budget and the number of requests it is serving'''
+        self.name = name
+        self.app = app
+        self.rss = rss
+        self.in_flight = 0
+
+
+class ModelPool(object):
+
+    def __init__(self, models_dir, build_app, memory_budget=None, max_models=None, request_reload=None,
+                 metrics=None, rss=get_rss):
+        '''WSGI app that routes /models/<name>/... to the app of the model in `models_dir`/<name>
+
+        Parameters
+        ----------
+        models_dir : str
+            Directory containing one dumped Acumos Python model per subdirectory
+        build_app : callable
+            Returns a WSGI app given a model directory
+        memory_budget : int, optional
+            Idle models are evicted in least recently used order while the loaded models take more bytes than this.
+            The size of a model is the growth of resident memory measured when it was loaded, so the budget is
+            approximate
+        max_models : int, optional
+            Idle models are evicted in least recently used order while more models than this are loaded
+        request_reload : callable, optional
+            Enables POST /admin/reload if provided. Called to trigger a reload, e.g. of every worker
+        metrics : acumos_model_runner.metrics.Registry, optional
+            Registry to record load and eviction metrics in. A new registry is created if not provided
+        rss : callable, optional
+            Returns the resident memory of the process in bytes, used to measure the memory each model takes
+        '''
+        self.models_dir = models_dir
+        self.build_app = build_app
+        self.memory_budget = memory_budget
+        self.max_models = max_models
+        self.request_reload = request_reload
+        self.metrics = Registry() if metrics is None else metrics
+        self._rss = rss
+        self._resident = OrderedDict()  # least recently used first
+        self._sizes = dict()  # model name to (size, measured alone), kept after evictions
+        self._lock = threading.Lock()
+        self._load_locks = dict()
+        self._loading = 0
+        self._load_count = 0
+
+        self._loads = self.metrics.counter('acumos_model_loads_total', 'Models loaded')
+        self._load_failures = self.metrics.counter('acumos_model_load_failures_total', 'Models that failed to load')
+        self._load_seconds = self.metrics.counter('acumos_model_load_seconds_total', 'Time spent loading models')
+        self._evictions = self.metrics.counter('acumos_model_evictions_total', 'Models evicted, by reason')
+        self._resident_models = self.metrics.gauge('acumos_models_resident', 'Models currently loaded')
+        self._resident_bytes = self.metrics.gauge('acumos_model_resident_bytes', 'Resident memory taken by loading each model')
+        self._resident_models.set(0)
+
+    @property
+    def resident(self):
+        '''Names of the loaded models, least recently used first'''
+        with self._lock:
+            return list(self._resident)
+
+    def __call__(self, environ, start_response):
+        path = environ.get('PATH_INFO', '')
+        if path == METRICS_PATH:
+            return _respond(start_response, '200 OK', self.metrics.render().encode('utf-8'), CONTENT_TYPE)
+        if path in (LIVE_PATH, READY_PATH):
+            # models are loaded on their first request, so the pool is ready as soon as it is serving
+            return _respond_json(start_response, '200 OK', {'status': 'ready' if path == READY_PATH else 'live'})
+        if path in (MODELS_PATH, MODELS_PATH + '/'):
+            return _respond_json(start_response, '200 OK', self.describe())
+        if self.request_reload is not None and path == RELOAD_PATH:
+            return self._handle_reload(environ, start_response)
+
+        name, rest = _split_model_path(path)
+        if not self._is_model(name):
+            return _respond_json(start_response, '404 NOT FOUND', {'error': "Model {!r} not found".format(name)})
+
+        try:
+            resident = self._acquire(name)
+        except Exception:
+            logger.exception("Failed to load model %s", name)
+            return _respond_json(start_response, '500 INTERNAL SERVER ERROR', {'error': "Failed to load model {!r}".format(name)})
+
+        environ['SCRIPT_NAME'] = environ.get('SCRIPT_NAME', '') + MODELS_PATH + '/' + name
+        environ['PATH_INFO'] = '/' + rest
+        try:
+            result = resident.app(environ, start_response)
+        except BaseException:
+            self._release(resident)
+            raise
+        # the model is busy until the server closes the response, so it is not evicted mid-request
+        return ClosingIterator(result, lambda: self._release(resident))
+
+    def _is_model(self, name):
+        '''Returns True if `name` is a model subdirectory of the models directory'''
+        if not name or name.startswith('.') or '/' in name or '\\' in name:
+            return False
+        return isfile(path_join(self.models_dir, name, 'metadata.json'))
+
+    def available(self):
+        '''Returns the sorted names of the models in the models directory'''
+        return sorted(name for name in os.listdir(self.models_dir) if self._is_model(name))
+
+    def _acquire(self, name):
+        '''Returns the resident model `name`, loading it if needed, and marks it as serving a request'''
+        with self._lock:
+            resident = self._resident.get(name)
+            if resident is not None:
+                self._resident.move_to_end(name)
+                resident.in_flight += 1
+                return resident
+
+            load_lock = self._load_locks.setdefault(name, threading.Lock())
+
+        # loads of other models go ahead meanwhile
+        with load_lock:
+            with self._lock:
+                resident = self._resident.get(name)
+                if resident is not None:  # loaded by another thread meanwhile
+                    self._resident.move_to_end(name)
+                    resident.in_flight += 1
+                    return resident
+            resident = self._load(name)
+            with self._lock:
+                resident.in_flight += 1
+                self._resident[name] = resident
+                self._resident_models.set(len(self._resident))
+            self._evict(keep=name)
+            return resident
+
+    def _load(self, name):
+        '''Builds the app of model `name`'''
+        with self._lock:
+            self._loading += 1
+            overlapped = self._loading > 1
+            started = self._load_count
+            self._load_count += 1
+        rss = self._rss()
+        start = time.perf_counter()
+        try:
+            app = self.build_app(path_join(self.models_dir, name))
+        except Exception:
+            self._load_failures.inc(model=name)
+            raise
+        finally:
+            with self._lock:
+                self._loading -= 1
+                overlapped = overlapped or self._load_count != started + 1
+        seconds = time.perf_counter() - start
+        end_rss = self._rss()
+        size = self._measured_size(name, None if rss is None or end_rss is None else max(end_rss - rss, 0), overlapped)
+
+        self._loads.inc(model=name)
+        self._load_seconds.inc(seconds, model=name)
+        self._resident_bytes.set(size, model=name)
+        logger.info("Loaded model %s in %.1fms (%.1fMiB)", name, seconds * 1000, size / (1024 * 1024))
+        return _Resident(name, app, size)
+
+    def _measured_size(self, name, delta, overlapped):
+        '''Returns the size to charge model `name` with given the resident memory growth of its latest load
+
+        Loading a model again after an eviction often reuses freed memory without growing the process, so a model
+        keeps the largest size measured while no other model was loading. Growth measured while other models were
+        loading includes theirs, and is only used until the model is measured alone.
+        '''
+        with self._lock:
+            known, alone = self._sizes.get(name, (None, False))
+            if delta is not None and (known is None or (not overlapped and (not alone or delta > known))):
+                known, alone = delta, not overlapped
+                self._sizes[name] = (known, alone)
+        return 0 if known is None else known
+
+    def _release(self, resident):
+        '''Marks a request to a resident model as finished'''
+        with self._lock:
+            resident.in_flight -= 1
+
+    def _over_budget(self):
+        '''Returns the reason to evict a model, or None if the resident models fit the budget'''
+        if self.max_models is not None and len(self._resident) > self.max_models:
+            return 'count'
+        if self.memory_budget is not None and sum(r.rss for r in self._resident.values()) > self.memory_budget:
+            return 'memory'
+        return None
+
+    def _evict(self, keep=None):
+        '''Evicts idle models in least recently used order until the resident models fit the budget'''
+        evicted = []
+        with self._lock:
+            reason = self._over_budget()
+            while reason is not None:
+                victim = next((r for r in self._resident.values() if not r.in_flight and r.name != keep), None)
+                if victim is None:
+                    logger.warning("Over the model budget, but all other resident models are serving requests")
+                    break
+                del self._resident[victim.name]
+                evicted.append((victim, reason))
+                reason = self._over_budget()
+            self._resident_models.set(len(self._resident))
+
+        for victim, reason in evicted:
+            self._forget(victim, reason)
+        if evicted:
+            gc.collect()
+
+    def _forget(self, resident, reason):
+        '''Records the eviction of a model that is no longer resident'''
+        self._evictions.inc(model=resident.name, reason=reason)
+        self._resident_bytes.remove(model=resident.name)
+        logger.info("Evicted model %s (%s)", resident.name, reason)
+        resident.app = None  # requests still in flight keep their own reference
+
+    def describe(self):
+        '''Returns a JSON-serializable description of the resident models'''
+        with self._lock:
+            resident = [{'name': r.name, 'rss': r.rss, 'in_flight': r.in_flight} for r in self._resident.values()]
+        return {'available': self.available(), 'resident': resident, 'memory_budget': self.memory_budget, 'max_models': self.max_models}
+
+    def _handle_reload(self, environ, start_response):
+        '''Triggers a reload in response to POST /admin/reload'''
+        if environ.get('REQUEST_METHOD') != 'POST':
+            start_response('405 METHOD NOT ALLOWED', [('Allow', 'POST'), ('Content-Type', 'text/plain')])
+            return [b'Method Not Allowed']
+        self.request_reload()
+        return _respond_json(start_response, '202 ACCEPTED', {'status': 'reloading'})
+
+    def reload(self):
+        '''Evicts every resident model, so that models are loaded again from disk on their next request
+
+        Requests in flight finish on the model they started on.
+        '''
+        with self._lock:
+            evicted = list(self._resident.values())
+            self._resident.clear()
+            self._resident_models.set(0)
+        for resident in evicted:
+            self._forget(resident, 'reload')
+        gc.collect()
+
+    def reload_async(self):
+        '''Reloads in a background thread, e.g. from a signal handler that may interrupt a thread holding a lock. Returns the thread'''
+        thread = threading.Thread(target=self.reload, name='model-reload', daemon=True)
+        thread.start()
+        return thread
+
+
+def _split_model_path(path):
+    '''Splits /models/<name>/<rest> into the model name and the path within the model app'''
+    if not path.startswith(MODELS_PATH + '/'):
+        return '', ''
+    name, _, rest = path[len(MODELS_PATH) + 1:].partition('/')
+    return name, rest
+
+
+def _respond(start_response, status, body, content_type):
+    '''Starts a response with a complete body'''
+    start_response(status, [('Content-Type', content_type), ('Content-Length', str(len(body)))])
+    return [body]
+
+
+def _respond_json(start_response, status, obj):
+    '''Starts a JSON response'''
+    return _respond(start_response, status, json.dumps(obj).encode('utf-8'), 'application/json')
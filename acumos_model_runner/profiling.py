@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+# ===============LICENSE_START=======================================================
+# Acumos Apache-2.0
+# ===================================================================================
+# Copyright (C) 2017-2018 AT&T Intellectual Property & Tech Mahindra. All rights reserved.
+# ===================================================================================
+# This Acumos software file is distributed by AT&T and Tech Mahindra
+# under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# This file is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ===============LICENSE_END=========================================================
+"""
+Provides startup phase timing
+"""
+import os
+import json
+import time
+import logging
+import contextlib
+from collections import OrderedDict
+
+from acumos_model_runner.utils import get_rss
+
+
+logger = logging.getLogger('gunicorn.error')
+
+_MIB = 1024 * 1024
+
+
+class StartupProfile(object):
+
+    def __init__(self):
+        '''Records the wall time and resident memory delta of named startup phases'''
+        self.phases = OrderedDict()
+        self.memory = OrderedDict()
+        self._start = time.perf_counter()
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        '''Context manager that records the wall time of a phase in seconds and its memory delta in bytes'''
+        rss = get_rss()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = time.perf_counter() - start
+            end_rss = get_rss()
+            self.memory[name] = None if rss is None or end_rss is None else end_rss - rss
+
+    def report(self, process):
+        '''Returns a JSON-serializable report of all phases. `process` describes the process, e.g. "master"'''
+        return {'process': process,
+                'pid': os.getpid(),
+                'time': time.time(),
+                'total_seconds': time.perf_counter() - self._start,
+                'rss': get_rss(),
+                'phases': [{'name': name, 'seconds': seconds, 'rss_delta': self.memory[name]}
+                           for name, seconds in self.phases.items()]}
+
+    def emit(self, path, process):
+        '''Logs the report and appends it to `path` as a JSON line'''
+        report = self.report(process)
+        logger.info("Startup profile of %s %d: %s total=%.1fms", process, report['pid'],
+                    " ".join(_format_phase(phase) for phase in report['phases']), report['total_seconds'] * 1000)
+        if path is not None:
+            with open(path, 'a') as file:
+                file.write(json.dumps(report) + '\n')
+        return report
+
+
+def _format_phase(phase):
+    '''Returns a short description of a phase report'''
+    memory = '' if phase['rss_delta'] is None else " ({:+.1f}MiB)".format(phase['rss_delta'] / _MIB)
+    return "{}={:.1f}ms{}".format(phase['name'], phase['seconds'] * 1000, memory)
@@ -19,9 +19,12 @@
 """
 Provides utilities for parsing protobuf IDL
 """
+import pickle
 from collections import namedtuple
 
 from lark import Lark, Transformer
+from lark.grammar import Rule
+from lark.lexer import TerminalDef
 
 from acumos_model_runner.utils import load_data
 
@@ -32,7 +35,7 @@ Field = namedtuple('Field', 'type, name, number')
 RepeatedField = namedtuple('RepeatedField', 'type, name, number')
 MapField = namedtuple('MapField', 'key_type, val_type, name, number')
 
-_PROTO_GRAMMAR = load_data('proto3.ebnf')
+_parser = None
 
 
 class ProtoTransformer(Transformer):
@@ -84,9 +87,36 @@ class ProtoTransformer(Transformer):
 
 def parse_proto(proto_idl):
     '''Returns a sequence of top-level protobuf definitions, i.e. Message or Enum namedtuples'''
-    parser = Lark(_PROTO_GRAMMAR, start='proto', parser='lalr')
-    tree = parser.parse(proto_idl)
+    tree = _get_parser().parse(proto_idl)
     trans_tree = ProtoTransformer().transform(tree)
     top_level = [child for top_level in trans_tree.find_data('topleveldef')
                  for child in top_level.children if isinstance(child, (Message, Enum))]
     return top_level
+
+
+def _get_parser():
+    '''Returns the protobuf IDL parser, building the LALR tables on first use'''
+    global _parser
+    if _parser is None:
+        _parser = Lark(load_grammar(), start='proto', parser='lalr')
+    return _parser
+
+
+def load_grammar():
+    '''Returns the protobuf IDL grammar'''
+    return load_data('proto3.ebnf')
+
+
+def save_parser_tables(path):
+    '''Serializes the parser tables to `path` so that other processes can skip building them'''
+    data, memo = _get_parser().memo_serialize([TerminalDef, Rule])
+    with open(path, 'wb') as file:
+        pickle.dump((data, memo), file, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def load_parser_tables(path):
+    '''Loads parser tables previously written by `save_parser_tables`'''
+    global _parser
+    with open(path, 'rb') as file:
+        data, memo = pickle.load(file)
+    _parser = Lark.deserialize(data, {'Rule': Rule, 'TerminalDef': TerminalDef}, memo)
@@ -0,0 +1,152 @@
+# -*- coding: utf-8 -*-
+# ===============LICENSE_START=======================================================
+# Acumos Apache-2.0
+# ===================================================================================
+# Copyright (C) 2017-2018 AT&T Intellectual Property & Tech Mahindra. All rights reserved.
+# ===================================================================================
+# This Acumos software file is distributed by AT&T and Tech Mahindra
+# under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# This file is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ===============LICENSE_END=========================================================
+"""
+Provides traffic recording and replay for load testing
+
+A traffic log starts with an 8 byte magic string followed by records of the form::
+
+    arrival time (float64) | method length (uint16) | headers length (uint32) | body length (uint32)
+    method (utf-8) | headers (latin-1, "name: value\\r\\n" pairs) | body
+
+with all integers little-endian.
+"""
+import os
+import sys
+import json
+import fcntl
+import struct
+import argparse
+from collections import namedtuple
+from os.path import isdir
+
+from acumos_model_runner.capture import load_captures
+from acumos_model_runner.loadgen import LoadRequest, run_load, format_table
+
+
+Record = namedtuple('Record', 'arrival, method, headers, body')
+
+_MAGIC = b'AMRTRAF1'
+_RECORD_HEADER = struct.Struct('<dHII')
+_SKIPPED_HEADERS = frozenset(('host', 'content-length', 'connection', 'transfer-encoding'))
+_TABLE_COLUMNS = ('requests', 'errors', 'rps', 'p50', 'p90', 'p95', 'p99', 'max')
+
+
+class RecordingError(Exception):
+    pass
+
+
+class TrafficRecorder(object):
+
+    def __init__(self, path):
+        '''Appends method requests to a traffic log at `path`. Safe to share between gunicorn workers'''
+        self.path = path
+        self._fd = None
+
+    def record(self, arrival, method, headers, body):
+        '''Appends a request to the log. `headers` is an iterable of (name, value) pairs'''
+        header_bytes = "".join("{}: {}\r\n".format(k, v) for k, v in headers
+                               if k.lower() not in _SKIPPED_HEADERS).encode('latin-1')
+        method_bytes = method.encode('utf-8')
+        data = b''.join((_RECORD_HEADER.pack(arrival, len(method_bytes), len(header_bytes), len(body)),
+                         method_bytes, header_bytes, body))
+
+        if self._fd is None:
+            # opened lazily so that each gunicorn worker has its own file descriptor
+            self._fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+
+        fcntl.flock(self._fd, fcntl.LOCK_EX)
+        try:
+            if os.fstat(self._fd).st_size == 0:
+                data = _MAGIC + data
+            _write_all(self._fd, data)
+        finally:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+
+def _write_all(fd, data):
+    '''Writes all of `data` to a file descriptor'''
+    view = memoryview(data)
+    while view:
+        view = view[os.write(fd, view):]
+
+
+def read_records(path):
+    '''Yields Record namedtuples from a traffic log'''
+    with open(path, 'rb') as file:
+        if file.read(len(_MAGIC)) != _MAGIC:
+            raise RecordingError("{} is not a traffic log".format(path))
+
+        while True:
+            header = file.read(_RECORD_HEADER.size)
+            if len(header) < _RECORD_HEADER.size:
+                return  # end of file, or a record truncated by a crash
+            arrival, method_len, headers_len, body_len = _RECORD_HEADER.unpack(header)
+            payload = file.read(method_len + headers_len + body_len)
+            if len(payload) < method_len + headers_len + body_len:
+                return
+
+            method = payload[:method_len].decode('utf-8')
+            header_lines = payload[method_len:method_len + headers_len].decode('latin-1').split('\r\n')
+            headers = dict(line.split(': ', 1) for line in header_lines if line)
+            yield Record(arrival, method, headers, payload[method_len + headers_len:])
+
+
+def load_records(path):
+    '''Returns Record namedtuples sorted by arrival time from a traffic log or a slow request capture directory'''
+    if isdir(path):
+        records = [Record(c.timestamp, c.method, c.headers, c.body) for c in load_captures(path)]
+    else:
+        records = list(read_records(path))
+    return sorted(records, key=lambda record: record.arrival)
+
+
+def schedule(records, rate=1.0):
+    '''Returns LoadRequest namedtuples that replay `records` at `rate` times their original pace, or as fast as possible if `rate` is None'''
+    if not records:
+        return []
+    first = records[0].arrival
+    return [LoadRequest(None if rate is None else (r.arrival - first) / rate, r.method, r.headers, r.body) for r in records]
+
+
+def run_replay_cli(argv=None):
+    '''CLI entry point for replaying traffic logs against a model runner'''
+    parser = argparse.ArgumentParser(prog='acumos_model_runner replay', description='Replays recorded traffic against a model runner')
+    parser.add_argument('logs', nargs='+', help='Traffic logs written with --record, or slow request capture directories')
+    parser.add_argument('--url', type=str, default='http://localhost:3330', help='Base URL of the model runner')
+    pacing = parser.add_mutually_exclusive_group()
+    pacing.add_argument('--rate', type=float, default=1.0, help='Replays at this multiple of the original pace')
+    pacing.add_argument('--fast', action='store_true', help='Replays as fast as possible')
+    parser.add_argument('--concurrency', type=int, default=8, help='The maximum number of concurrent requests')
+    parser.add_argument('--json', type=str, default=None, help='Writes the results as JSON to this file')
+
+    pargs = parser.parse_args(argv)
+
+    records = sorted((r for path in pargs.logs for r in load_records(path)), key=lambda record: record.arrival)
+    requests = schedule(records, None if pargs.fast else pargs.rate)
+    stats = run_load(pargs.url, requests, pargs.concurrency)
+
+    print(format_table([stats], _TABLE_COLUMNS))
+    if pargs.json is not None:
+        with open(pargs.json, 'w') as file:
+            json.dump(stats, file, indent=2)
+    return 0 if stats['errors'] == 0 else 1
+
+
+if __name__ == '__main__':
+    sys.exit(run_replay_cli())
@@ -19,41 +19,118 @@
 '''
 Provides a model runner based on a connexion application and gunicorn server
 '''
+import sys
 import json
 import argparse
-from functools import partial
+import importlib
 from os.path import abspath, join as path_join
 
-from gunicorn.app.base import BaseApplication
-from connexion import App
-from connexion.resolver import Resolver
-from flask import redirect
-from flask_cors import CORS
-from acumos.wrapped import load_model
+from acumos_model_runner.profiling import StartupProfile
+from acumos_model_runner.bundle import Bundle, load_bundle
 
-from acumos_model_runner.api import methods
-from acumos_model_runner.oas_gen import create_oas
+# heavy dependencies are imported where they are used, so that e.g. printing help does not load the serving stack
+_COMMANDS = {'replay': ('acumos_model_runner.recording', 'run_replay_cli'),
+             'bench': ('acumos_model_runner.bench', 'run_bench_cli'),
+             'precompile': ('acumos_model_runner.bundle', 'run_precompile_cli'),
+             'calibrate': ('acumos_model_runner.calibration', 'run_calibrate_cli')}
 
 
-def run_app_cli():
+def run_app_cli(argv=None):
     '''CLI entry point for starting the model runner'''
-    parser = argparse.ArgumentParser()
-    parser.add_argument('model_dir', type=str, help='Directory containing a dumped Acumos Python model')
+    argv = sys.argv[1:] if argv is None else argv
+    if argv and argv[0] in _COMMANDS:
+        module_name, func_name = _COMMANDS[argv[0]]
+        sys.exit(getattr(importlib.import_module(module_name), func_name)(argv[1:]))
+
+    parser = argparse.ArgumentParser(epilog="Other commands: {}. Run 'acumos_model_runner <command> -h' for help".format(', '.join(sorted(_COMMANDS))))
+    parser.add_argument('model_dir', type=str, help='Directory containing a dumped Acumos Python model, or with --multi-model a directory of them')
     parser.add_argument('--host', type=str, default='0.0.0.0', help='The interface to bind to')
     parser.add_argument('--port', type=int, default=3330, help='The port to bind to')
-    parser.add_argument('--workers', type=int, default=1, help='The number of gunicorn workers to spawn')
+    parser.add_argument('--bind', type=str, action='append', default=None, help="An address to bind to instead of --host and --port, e.g. 'unix:/run/model.sock' or 'localhost:3330'. Can be repeated")
+    parser.add_argument('--reuse-port', action='store_true', help='Gives each worker its own listening socket, so that the kernel spreads connections across workers. TCP only')
+    parser.add_argument('--workers', type=_int_or_auto, default=1, help="The number of gunicorn workers to spawn, or 'auto' to fit the container's CPU and memory limits")
+    parser.add_argument('--threads', type=_int_or_auto, default=1, help="The number of request threads per worker, or 'auto' to fit the container's CPU limit")
+    parser.add_argument('--calibration', type=str, default=None, help="Uses the workers and threads of this file written by 'acumos_model_runner calibrate' if it matches the model")
+    parser.add_argument('--calibrate-p99', type=float, default=None, help='Calibrates workers and threads for this p99 latency target in milliseconds at startup if the --calibration file is missing or stale')
+    parser.add_argument('--http2', action='store_true', help='Serves HTTP/2 over cleartext (h2c) as well as HTTP/1.1 with hypercorn workers. Requires hypercorn')
+    parser.add_argument('--cpu-affinity', action='store_true', help='Pins each worker and its native thread pools to a dedicated set of the allowed CPUs. Linux only')
     parser.add_argument('--timeout', type=int, default=120, help='Time to wait (seconds) before a frozen worker is restarted')
     parser.add_argument('--cors', type=str, default=None, help="Enables CORS if provided. Can be a domain, comma-separated list of domains, or '*'")
-
-    pargs = parser.parse_args()
+    parser.add_argument('--trace-exporter', type=str, default=None, help="Enables request tracing if provided. Can be 'file:<path>' or a collector URL")
+    parser.add_argument('--slow-request-threshold', type=float, default=None, help='Logs method requests slower than this many milliseconds if provided')
+    parser.add_argument('--slow-request-capture-dir', type=str, default=None, help='Directory to capture slow request payloads to for offline reproduction')
+    parser.add_argument('--slow-request-sample-rate', type=float, default=1.0, help='Fraction of slow request payloads to capture')
+    parser.add_argument('--slow-request-max-bytes', type=int, default=1024 * 1024, help='Payloads larger than this many bytes are not captured')
+    parser.add_argument('--slow-request-max-files', type=int, default=1000, help='Maximum number of captured payloads to keep')
+    parser.add_argument('--stream-input', choices=('file', 'buffer'), default=None, help='Passes raw binary and text inputs to methods as a file-like object over the request body, or as a memoryview of a single buffer')
+    parser.add_argument('--stream-output-threshold', type=int, default=None, help='Streams JSON method outputs whose protobuf encoding is larger than this many bytes as they are encoded')
+    parser.add_argument('--compression-threshold', type=int, default=None, help='Compresses method responses of at least this many bytes with gzip, zstd or brotli as the client accepts if provided')
+    parser.add_argument('--compression-level', type=_encoding_level, action='append', default=None, help="A compression level for an encoding, e.g. 'gzip=9'. Can be repeated")
+    parser.add_argument('--record', type=str, default=None, help='Records method requests to this traffic log for replay if provided')
+    parser.add_argument('--profile-startup', type=str, default=None, help='Logs startup phase timings and appends JSON reports to this file if provided')
+    parser.add_argument('--reload-endpoint', action='store_true', help='Enables POST /admin/reload, which reloads the model directory like SIGHUP')
+    parser.add_argument('--background-load', action='store_true', help='Loads the model after workers start serving, answering method requests with 503 until it is ready')
+    parser.add_argument('--zygote', action='store_true', help='Loads and warms up the model once in the master, which forks workers with the model already loaded')
+    parser.add_argument('--warmup', action='store_true', help='Sends synthesized inputs through every method before a worker reports ready')
+    parser.add_argument('--warmup-samples', type=str, default=None, help='Directory of <method>.json, <method>.pb or <method>.bin warmup inputs. Implies --warmup')
+    parser.add_argument('--warmup-rounds', type=int, default=3, help='The number of times each method is called per body type during warmup')
+    parser.add_argument('--memory-limit', type=float, default=None, help='Recycles workers whose memory exceeds this many MiB, after their requests finish')
+    parser.add_argument('--memory-measure', choices=('rss', 'uss'), default='rss', help='The memory --memory-limit applies to. USS excludes memory shared with other processes')
+    parser.add_argument('--memory-recycle-interval', type=float, default=30.0, help='Minimum seconds between two memory recycles of any workers')
+    parser.add_argument('--multi-model', action='store_true', help='Serves every model in the subdirectories of model_dir under /models/<name>, loading them on first use')
+    parser.add_argument('--model-memory-budget', type=float, default=None, help='With --multi-model, evicts idle models when the loaded models take more than this many MiB per worker')
+    parser.add_argument('--max-models', type=int, default=None, help='With --multi-model, evicts idle models when more than this many are loaded per worker')
+
+    pargs = parser.parse_args(argv)
+    if pargs.multi_model and (pargs.calibration is not None or pargs.calibrate_p99 is not None):
+        parser.error('--calibration and --calibrate-p99 calibrate a single model and cannot be used with --multi-model')
+    if pargs.http2 and pargs.stream_input is not None:
+        parser.error('--stream-input cannot be used with --http2, which reads whole request bodies before calling methods')
 
     app = create_app(**vars(pargs))
     app.run()
 
 
-def create_app(model_dir, host, port, workers=1, timeout=120, cors=None):
+def _int_or_auto(value):
+    '''Parses a positive integer or "auto"'''
+    if value == 'auto':
+        return value
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError("must be a positive integer or 'auto'")
+    return number
+
+
+def _encoding_level(value):
+    '''Parses an <encoding>=<level> pair and checks the level is supported by the encoding'''
+    from acumos_model_runner.compression import CompressionError, check_levels
+
+    encoding, sep, level = value.partition('=')
+    if not sep or not level.lstrip('-').isdigit():
+        raise argparse.ArgumentTypeError("must be of the form <encoding>=<level>, e.g. 'gzip=9'")
+    level = int(level)
+    try:
+        check_levels({encoding: level})
+    except CompressionError as err:
+        raise argparse.ArgumentTypeError(str(err))
+    return encoding, level
+
+
+def create_app(model_dir, host, port, workers=1, timeout=120, cors=None, trace_exporter=None,
+               slow_request_threshold=None, slow_request_capture_dir=None, slow_request_sample_rate=1.0,
+               slow_request_max_bytes=1024 * 1024, slow_request_max_files=1000, record=None, profile_startup=None,
+               reload_endpoint=False, background_load=False, zygote=False, warmup=False, warmup_samples=None, warmup_rounds=3,
+               memory_limit=None, memory_measure='rss', memory_recycle_interval=30.0, multi_model=False,
+               model_memory_budget=None, max_models=None, threads=1, calibration=None, calibrate_p99=None, cpu_affinity=False,
+               bind=None, reuse_port=False, http2=False, stream_input=None, stream_output_threshold=None,
+               compression_threshold=None, compression_level=None):
     '''Creates and returns the model runner gunicorn application
 
+    Workers serve liveness and readiness probes at /health/live and /health/ready. Sending SIGHUP to the master
+    reloads the model directory in every worker without dropping requests. With `multi_model`, models are instead
+    loaded in each worker on their first request and evicted in least recently used order to stay within the memory
+    budget, and SIGHUP evicts all of them.
+
     Parameters
     ----------
     model_dir : str
@@ -62,85 +139,233 @@ def create_app(model_dir, host, port, workers=1, timeout=120, cors=None):
         The interface to bind to
     port : int
         The port to bind to
-    workers : int, optional
-        The number of gunicorn workers to spawn
+    workers : int or str, optional
+        The number of gunicorn workers to spawn, or 'auto' to fit the container's CPU and memory limits given the
+        measured memory of a worker with the model loaded. Also limits the threads of native libraries in each worker
     timeout : int, optional
         Time to wait (seconds) before a frozen worker is restarted
     cors : str, optional
         Enables CORS if provided. Can be a domain, comma-separated list of domains, or '*'
+    trace_exporter : str, optional
+        Enables request tracing if provided. Can be 'file:<path>' or a collector URL
+    slow_request_threshold : float, optional
+        Logs method requests slower than this many milliseconds if provided
+    slow_request_capture_dir : str, optional
+        Directory to capture slow request payloads to for offline reproduction
+    slow_request_sample_rate : float, optional
+        Fraction of slow request payloads to capture
+    slow_request_max_bytes : int, optional
+        Payloads larger than this many bytes are not captured
+    slow_request_max_files : int, optional
+        Maximum number of captured payloads to keep
+    record : str, optional
+        Records method requests to this traffic log for replay if provided
+    profile_startup : str, optional
+        Logs startup phase timings of the master and each worker, and appends JSON reports to this file if provided
+    reload_endpoint : bool, optional
+        Enables POST /admin/reload, which reloads the model directory like SIGHUP
+    background_load : bool, optional
+        Loads the model after workers start serving if True, answering method requests with 503 until it is ready
+    zygote : bool, optional
+        Loads and warms up the model once in the master if True, which forks workers with the model already loaded.
+        Replacement workers then start in milliseconds, and SIGHUP replaces all workers after reloading the master
+    warmup : bool, optional
+        Sends synthesized inputs through every method before a worker reports ready if True
+    warmup_samples : str, optional
+        Directory of <method>.json, <method>.pb or <method>.bin warmup inputs. Implies `warmup`
+    warmup_rounds : int, optional
+        The number of times each method is called per body type during warmup
+    memory_limit : float, optional
+        Recycles workers whose memory exceeds this many MiB if provided. A worker over the limit finishes its requests,
+        exits and is replaced by the master
+    memory_measure : str, optional
+        The memory `memory_limit` applies to. 'rss' for the resident set size, or 'uss' for the unique set size, which
+        excludes memory shared with other processes
+    memory_recycle_interval : float, optional
+        Minimum seconds between two memory recycles of any workers, so that capacity is never lost all at once
+    multi_model : bool, optional
+        Serves every model in the subdirectories of `model_dir` under /models/<name> if True
+    model_memory_budget : float, optional
+        With `multi_model`, evicts idle models when the loaded models take more than this many MiB per worker
+    max_models : int, optional
+        With `multi_model`, evicts idle models when more than this many are loaded per worker
+    threads : int or str, optional
+        The number of request threads per worker, or 'auto' to fit the container's CPU limit
+    calibration : str, optional
+        Uses the workers and threads of this calibration file instead of `workers` and `threads` if it matches the model
+    calibrate_p99 : float, optional
+        Calibrates workers and threads for this p99 latency target in milliseconds before starting if the `calibration`
+        file is missing or stale, and writes the file. The file defaults to calibration.json in the model directory
+    cpu_affinity : bool, optional
+        Pins each worker, and the threads it starts, to a dedicated set of the CPUs the runner may use if True. The
+        threads of native libraries in each worker are limited to its share of CPUs per request thread. Linux only
+    bind : list of str, optional
+        Addresses to bind to instead of `host` and `port`, e.g. 'unix:/run/model.sock' for a Unix domain socket
+    reuse_port : bool, optional
+        Gives each worker its own listening socket on every address if True. The sockets share the port through
+        SO_REUSEPORT, so that the kernel spreads connections across workers instead of queuing them on one socket.
+        Cannot be used with Unix domain sockets
+    http2 : bool, optional
+        Serves HTTP/2 over cleartext (h2c) as well as HTTP/1.1 if True, so that one client connection can carry many
+        concurrent requests, which run on up to `threads` threads per worker. Requires hypercorn
+    stream_input : str, optional
+        Passes the input of methods with raw application/octet-stream or text/plain inputs without reading the whole
+        request body first if provided. With 'file', a method receives a binary file-like object over the body, or a
+        text file for text/plain. With 'buffer', it receives a memoryview of a single buffer the body is read into, or
+        the decoded text. Inputs streamed as files are neither recorded nor captured. Cannot be used with `http2`
+    stream_output_threshold : int, optional
+        Sends JSON method outputs whose protobuf encoding is larger than this many bytes with chunked transfer encoding
+        as they are encoded if provided, instead of encoding them completely first. Raw outputs that methods return as
+        iterators are always sent as they are produced
+    compression_threshold : int, optional
+        Compresses method responses of at least this many bytes with the encoding the client prefers among gzip, and
+        zstd and brotli if the zstandard and brotli packages are installed, if provided. Streamed responses are always
+        compressed chunk by chunk. Raw outputs that are already compressed, e.g. gzip or PNG data, are sent as they are
+    compression_level : dict or list of tuple, optional
+        Compression levels by encoding, e.g. {'gzip': 9}, overriding the defaults of
+        `acumos_model_runner.compression.DEFAULT_LEVELS`
     '''
+    profile = StartupProfile()
     model_dir = abspath(model_dir)
-    _write_oas(model_dir)
-    return StandaloneApplication(model_dir, host, port, workers, timeout, cors)
+    if trace_exporter is not None:
+        from acumos_model_runner.tracing import create_exporter
+        create_exporter(trace_exporter)  # fail fast in the master rather than in every worker
+    if calibration is not None or calibrate_p99 is not None:
+        if multi_model:
+            raise ValueError('Calibration applies to a single model and cannot be used with multi_model')
+        workers, threads = _calibrated(model_dir, calibration, calibrate_p99, workers, threads)
+
+    sizing_report = None
+    if 'auto' in (workers, threads):
+        from acumos_model_runner.sizing import auto_size, set_blas_threads
+        model_memory = None
+        if multi_model:
+            model_memory = 0 if model_memory_budget is None else int(model_memory_budget * 1024 * 1024)
+        sizing, sizing_report = auto_size(model_dir, None if workers == 'auto' else workers, None if threads == 'auto' else threads, model_memory)
+        workers, threads = sizing.workers, sizing.threads
+        set_blas_threads(sizing.blas_threads)  # before the master or workers load native libraries
+
+    if reuse_port and any(address.startswith('unix:') for address in bind or ()):
+        raise ValueError('Unix domain sockets cannot be shared with reuse_port')
+
+    if cpu_affinity:
+        from acumos_model_runner.affinity import allowed_cpus, layout
+        from acumos_model_runner.sizing import set_blas_threads
+        cpu_affinity = layout(allowed_cpus(), workers)
+        set_blas_threads(max(1, min(len(cpus) for cpus in cpu_affinity) // threads))
+    else:
+        cpu_affinity = None
+
+    compression_levels = None
+    if compression_threshold is not None:
+        from acumos_model_runner.compression import check_levels
+        compression_levels = check_levels(dict(compression_level or ()))
+
+    worker_class = None
+    if http2:
+        if stream_input is not None:
+            raise ValueError('HTTP/2 workers read whole request bodies and cannot be used with stream_input')
+        try:
+            from acumos_model_runner.http2 import Http2Worker
+        except ImportError as e:
+            raise ImportError("HTTP/2 requires hypercorn. Install it with 'pip install acumos_model_runner[http2]'") from e
+        worker_class = Http2Worker
+
+    # imported once thread pool sizes are set, and before workers fork, so that workers inherit the serving stack
+    from acumos_model_runner.server import StandaloneApplication
+
+    model_pool = None
+    if multi_model:
+        # model specifications are generated by the workers that load them
+        bundle = None
+        model_pool = {'memory_budget': None if model_memory_budget is None else int(model_memory_budget * 1024 * 1024),
+                      'max_models': max_models}
+    else:
+        bundle = _load_spec(model_dir, profile)
+
+    slow_request_log = None
+    if slow_request_threshold is not None:
+        from acumos_model_runner.capture import SlowRequestLog
+        slow_request_log = SlowRequestLog(slow_request_threshold / 1000, slow_request_capture_dir, slow_request_sample_rate,
+                                          slow_request_max_bytes, slow_request_max_files)
+
+    traffic_recorder = None
+    if record is not None:
+        from acumos_model_runner.recording import TrafficRecorder
+        traffic_recorder = TrafficRecorder(abspath(record))
+
+    if profile_startup is not None:
+        profile_startup = abspath(profile_startup)
+
+    memory_watchdog = None
+    if memory_limit is not None:
+        memory_watchdog = {'limit': int(memory_limit * 1024 * 1024), 'measure': memory_measure, 'stagger': memory_recycle_interval}
+
+    if warmup_samples is not None:
+        warmup_samples = abspath(warmup_samples)
+    warmup_rounds = warmup_rounds if warmup or warmup_samples is not None else 0
+
+    return StandaloneApplication(model_dir, host, port, workers, timeout, cors, profile_startup, profile, trace_exporter=trace_exporter,
+                                 slow_request_log=slow_request_log, traffic_recorder=traffic_recorder, bundle=bundle,
+                                 warmup_rounds=warmup_rounds, warmup_samples=warmup_samples, stream_input=stream_input,
+                                 stream_output_threshold=stream_output_threshold, compression_threshold=compression_threshold,
+                                 compression_levels=compression_levels,
+                                 reload_endpoint=reload_endpoint, model_pool=model_pool, background_load=background_load,
+                                 zygote=zygote, memory_watchdog=memory_watchdog, threads=threads, cpu_affinity=cpu_affinity,
+                                 bind=bind, reuse_port=reuse_port, worker_class=worker_class, sizing_report=sizing_report)
+
+
+def _calibrated(model_dir, calibration, calibrate_p99, workers, threads):
+    '''Returns the workers and threads of a calibration file, calibrating first if requested and needed'''
+    from acumos_model_runner.calibration import calibrate, load_calibration, save_calibration
+
+    path = abspath(path_join(model_dir, 'calibration.json') if calibration is None else calibration)
+    result = load_calibration(path, model_dir)
+    if result is None and calibrate_p99 is not None:
+        result = calibrate(model_dir, calibrate_p99)
+        save_calibration(path, result)
+    if result is None:
+        return workers, threads
+    return result['choice']['workers'], result['choice']['threads']
+
+
+def _load_spec(model_dir, profile=None, write_oas=True):
+    '''Returns the current startup Bundle of a model directory, or a Bundle without a path holding a generated specification
+
+    Workers are handed the generated specification rather than loading oas.yaml again. If `write_oas` is False,
+    oas.yaml is not written, so that workers reloading a model do not race to write it.
+    '''
+    profile = StartupProfile() if profile is None else profile
+    with profile.phase('load_bundle'):
+        bundle = load_bundle(model_dir)
+    if bundle is None:
+        spec = _write_oas(model_dir, profile) if write_oas else _create_spec(model_dir, profile)[0]
+        bundle = Bundle(None, spec, _methods_from_spec(spec))
+    return bundle
+
+
+def _write_oas(model_dir, profile=None):
+    '''Writes an Open API specification file the model directory and returns the specification as a dict'''
+    spec, oas_yaml = _create_spec(model_dir, profile)
+    with open(path_join(model_dir, 'oas.yaml'), 'w') as file:
+        file.write(oas_yaml)
+    return spec
+
 
+def _create_spec(model_dir, profile=None):
+    '''Returns the Open API specification of a model directory as a dict and as a YAML string'''
+    profile = StartupProfile() if profile is None else profile
 
-def _write_oas(model_dir):
-    '''Writes an Open API specification file the model directory'''
     with open(path_join(model_dir, 'metadata.json')) as file:
         metadata = json.load(file)
 
     with open(path_join(model_dir, 'model.proto')) as file:
         proto = file.read()
 
-    oas_yaml = create_oas(metadata, proto)
-    with open(path_join(model_dir, 'oas.yaml'), 'w') as file:
-        file.write(oas_yaml)
-
-
-class StandaloneApplication(BaseApplication):
-    '''Custom gunicorn app. Modified from http://docs.gunicorn.org/en/stable/custom.html'''
-
-    def __init__(self, model_dir, host, port, workers, timeout, cors):
-        self.model_dir = model_dir
-        self.cors = cors
-        self.options = {'bind': "{}:{}".format(host, port), 'workers': workers, 'timeout': timeout}
-        super().__init__()
-
-    def load_config(self):
-        config = dict([(key, value) for key, value in self.options.items()
-                       if key in self.cfg.settings and value is not None])
-        for key, value in config.items():
-            self.cfg.set(key.lower(), value)
-
-    def load(self):
-        return _build_app(self.model_dir, self.cors)
-
-
-def _build_app(model_dir, cors):
-    '''Builds and returns a Flask app'''
-    connexion_app = App(__name__, specification_dir=model_dir)
-    connexion_app.add_api('oas.yaml', resolver=_CustomResolver())
-
-    flask_app = connexion_app.app
-    flask_app.model = load_model(model_dir)
-    flask_app.model_dir = model_dir
-    flask_app.methods_info = _read_methods(model_dir)
-
-    @flask_app.route('/')
-    def redirect_ui():
-        return redirect('/ui')
-
-    _apply_cors(flask_app, cors)
-
-    return flask_app
-
-
-class _CustomResolver(Resolver):
-
-    def resolve_function_from_operation_id(self, operation_id):
-        '''Routes model methods to a generic handler so that methods can be enumerated in the OAS'''
-        if operation_id.startswith('methods'):
-            _, method_name = operation_id.split('.')
-            return partial(methods, method_name=method_name)
-        else:
-            return super().resolve_function_from_operation_id(operation_id)
-
-
-def _apply_cors(app, cors):
-    '''Configures a Flask app with CORS'''
-    if isinstance(cors, str):
-        origins = cors if cors == '*' else cors.split(',')
-        CORS(app, origins=origins)
+    with profile.phase('create_oas'):
+        from acumos_model_runner.oas_gen import create_spec
+        from acumos_model_runner.descriptors import load_file_descriptor
+        return create_spec(metadata, proto, load_file_descriptor(model_dir))
 
 
 def _read_methods(model_dir: str):
@@ -149,6 +374,11 @@ def _read_methods(model_dir: str):
     import yaml
     with open(os.path.join(model_dir, 'oas.yaml'), "rt") as f:
         oas_dict = yaml.load(f)
+    return _methods_from_spec(oas_dict)
+
+
+def _methods_from_spec(oas_dict: dict):
+    '''Gets methods metadata from an OAS dict'''
     return {
         path.split('/')[-1]: method_info['post']
         for (path, method_info) in oas_dict["paths"].items()
@@ -0,0 +1,187 @@
+# -*- coding: utf-8 -*-
+# ===============LICENSE_START=======================================================
+# Acumos Apache-2.0
+# ===================================================================================
+# Copyright (C) 2017-2018 AT&T Intellectual Property & Tech Mahindra. All rights reserved.
+# ===================================================================================
+# This Acumos software file is distributed by AT&T and Tech Mahindra
+# under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# This file is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ===============LICENSE_END=========================================================
+"""
+Provides sample method inputs, either user-supplied or synthesized from the protobuf descriptors of the loaded model
+
+User-supplied samples are read from a directory containing files named after methods:
+
+- ``<method>.json`` is used as the JSON body, and to derive the protobuf body if there is no ``<method>.pb``
+- ``<method>.pb`` is used as the protobuf body
+- ``<method>.bin`` is used as the body of methods that consume raw data
+"""
+import json
+from os.path import isfile, join as path_join
+
+from google.protobuf.descriptor import FieldDescriptor
+from google.protobuf.json_format import ParseDict
+
+from acumos_model_runner.content_types import _PROTO, _JSON, _TEXT, _OCTET_STREAM
+from acumos_model_runner.descriptors import is_map, is_repeated
+
+
+_MAX_DEPTH = 4
+_REPEATED_LENGTH = 3
+
+_SCALAR_SAMPLES = {
+    FieldDescriptor.TYPE_DOUBLE: 1.5,
+    FieldDescriptor.TYPE_FLOAT: 1.5,
+    FieldDescriptor.TYPE_INT32: 1,
+    FieldDescriptor.TYPE_INT64: 1,
+    FieldDescriptor.TYPE_UINT32: 1,
+    FieldDescriptor.TYPE_UINT64: 1,
+    FieldDescriptor.TYPE_SINT32: -1,
+    FieldDescriptor.TYPE_SINT64: -1,
+    FieldDescriptor.TYPE_FIXED32: 1,
+    FieldDescriptor.TYPE_FIXED64: 1,
+    FieldDescriptor.TYPE_SFIXED32: -1,
+    FieldDescriptor.TYPE_SFIXED64: -1,
+    FieldDescriptor.TYPE_BOOL: True,
+    FieldDescriptor.TYPE_STRING: 'acumos',
+    FieldDescriptor.TYPE_BYTES: 'YWN1bW9z'}  # base64 encoded, as protobuf JSON expects
+
+_RAW_SAMPLES = {
+    _JSON: b'{}',
+    _TEXT: b'The quick brown fox jumps over the lazy dog',
+    _OCTET_STREAM: bytes(range(256)) * 4}
+
+_BODY_LABELS = {_PROTO: 'protobuf', _JSON: 'json'}
+
+
+class SampleError(Exception):
+    pass
+
+
+def create_samples(model, methods_info, samples_dir=None):
+    '''Returns a dict of method name to a dict of request Content-Type to sample body
+
+    Parameters
+    ----------
+    model : acumos.wrapped.WrappedModel
+        The loaded model, whose protobuf input types are used to synthesize and encode messages
+    methods_info : dict
+        Method OAS definitions, as returned by `acumos_model_runner.runner._read_methods`
+    samples_dir : str, optional
+        Directory of user-supplied samples. Samples are synthesized for methods without one
+    '''
+    samples = dict()
+    for method_name, method_info in methods_info.items():
+        pb_input_type = model.methods[method_name].pb_input_type
+        user_samples = _load_user_samples(samples_dir, method_name)
+
+        bodies = dict()
+        for content_type in method_info['consumes']:
+            if content_type in user_samples:
+                body = user_samples[content_type]
+            elif content_type == _PROTO and _JSON in user_samples:
+                body = ParseDict(json.loads(user_samples[_JSON].decode('utf-8')), pb_input_type()).SerializeToString()
+            elif pb_input_type is None:
+                body = _RAW_SAMPLES[content_type]
+            else:
+                msg_dict = synthesize_message(pb_input_type.DESCRIPTOR)
+                body = _encode(msg_dict, content_type, pb_input_type)
+            bodies[content_type] = body
+        samples[method_name] = bodies
+    return samples
+
+
+def request_variants(methods_info, samples):
+    '''Yields (method, body label, headers, body) for every way of calling every method
+
+    Bodies of methods with raw inputs are labelled 'raw', including application/json ones.
+    '''
+    for method_name, method_info in sorted(methods_info.items()):
+        produces = method_info['produces']
+        input_is_raw = _PROTO not in method_info['consumes']
+        for content_type, body in samples[method_name].items():
+            if content_type in _BODY_LABELS and not input_is_raw:
+                label = _BODY_LABELS[content_type]
+                accept = content_type if content_type in produces else produces[0]
+            else:
+                label = 'raw'
+                accept = _JSON if _JSON in produces else produces[0]
+            yield method_name, label, {'Content-Type': content_type, 'Accept': accept}, body
+
+
+def _load_user_samples(samples_dir, method_name):
+    '''Returns a dict of Content-Type to user-supplied body for a method'''
+    if samples_dir is None:
+        return dict()
+
+    user_samples = dict()
+    for ext, content_types in (('.json', (_JSON, )), ('.pb', (_PROTO, )), ('.bin', (_OCTET_STREAM, _TEXT))):
+        path = path_join(samples_dir, method_name + ext)
+        if isfile(path):
+            with open(path, 'rb') as file:
+                body = file.read()
+            for content_type in content_types:
+                user_samples.setdefault(content_type, body)
+    return user_samples
+
+
+def _encode(msg_dict, content_type, pb_input_type):
+    '''Returns a request body for a message dict'''
+    if content_type == _PROTO:
+        return ParseDict(msg_dict, pb_input_type()).SerializeToString()
+    elif content_type == _JSON:
+        return json.dumps(msg_dict).encode('utf-8')
+    else:
+        raise SampleError("Cannot encode a protobuf message as {}".format(content_type))
+
+
+def synthesize_message(descriptor, depth=0):
+    '''Returns a protobuf JSON compatible dict with a value for every field of a message, given its descriptor
+
+    Only the first field of each oneof is set.
+    '''
+    if depth >= _MAX_DEPTH:
+        return dict()  # recursive messages are truncated
+
+    msg_dict = dict()
+    oneofs = set()
+    for field in descriptor.fields:
+        if field.containing_oneof is not None:
+            if field.containing_oneof.name in oneofs:
+                continue
+            oneofs.add(field.containing_oneof.name)
+
+        if is_map(field):
+            key_field, val_field = field.message_type.fields_by_name['key'], field.message_type.fields_by_name['value']
+            msg_dict[field.name] = {_map_key(key_field): _synthesize_value(val_field, depth)}
+        elif is_repeated(field):
+            msg_dict[field.name] = [_synthesize_value(field, depth)] * _REPEATED_LENGTH
+        else:
+            msg_dict[field.name] = _synthesize_value(field, depth)
+    return msg_dict
+
+
+def _synthesize_value(field, depth):
+    '''Returns a sample value for a field'''
+    if field.enum_type is not None:
+        return field.enum_type.values[0].name
+    if field.message_type is not None:
+        return synthesize_message(field.message_type, depth + 1)
+    if field.type not in _SCALAR_SAMPLES:
+        raise SampleError("Cannot synthesize field {} of type {}".format(field.full_name, field.type))
+    return _SCALAR_SAMPLES[field.type]
+
+
+def _map_key(key_field):
+    '''Returns a sample map key. Protobuf JSON map keys are always strings'''
+    value = _SCALAR_SAMPLES[key_field.type]
+    return str(value).lower() if isinstance(value, bool) else str(value)
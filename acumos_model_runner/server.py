@@ -0,0 +1,382 @@
+# -*- coding: utf-8 -*-
+# ===============LICENSE_START=======================================================
+# Acumos Apache-2.0
+# ===================================================================================
+# Copyright (C) 2017-2018 AT&T Intellectual Property & Tech Mahindra. All rights reserved.
+# ===================================================================================
+# This Acumos software file is distributed by AT&T and Tech Mahindra
+# under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# This file is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ===============LICENSE_END=========================================================
+'''
+Provides the gunicorn application and Flask app that serve a model
+
+Unlike `acumos_model_runner.runner`, this module imports the serving stack at module scope. The runner imports
+it in the gunicorn master before workers are forked, so that workers inherit the loaded modules instead of each
+importing them again.
+'''
+import os
+import gc
+import fcntl
+import sys
+import signal
+import socket
+import tempfile
+from functools import partial
+from os.path import basename, isdir, isfile, join as path_join
+
+from gunicorn.app.base import BaseApplication
+from gunicorn.arbiter import Arbiter
+from gunicorn.sock import TCPSocket, TCP6Socket
+from connexion import App
+from connexion.resolver import Resolver
+from flask import redirect, request
+from flask_cors import CORS
+from acumos.wrapped import load_model
+
+from acumos_model_runner.api import methods, stream_raw_input
+from acumos_model_runner.tracing import Tracer, create_exporter
+from acumos_model_runner.profiling import StartupProfile
+from acumos_model_runner.dispatcher import ModelDispatcher
+from acumos_model_runner.pool import ModelPool
+from acumos_model_runner.metrics import Registry
+from acumos_model_runner.watchdog import MemoryWatchdog
+from acumos_model_runner.affinity import format_cpus, format_layout, free_slot, pin
+from acumos_model_runner.compression import available_encodings
+from acumos_model_runner.runner import _read_methods, _load_spec
+
+# sent by the master to workers, whose gunicorn signal handling leaves it unused
+_WORKER_RELOAD_SIGNAL = signal.SIGUSR2
+
+
+class StandaloneApplication(BaseApplication):
+    '''Custom gunicorn app. Modified from http://docs.gunicorn.org/en/stable/custom.html'''
+
+    def __init__(self, model_dir, host, port, workers, timeout, cors, profile_startup=None, master_profile=None,
+                 reload_endpoint=False, model_pool=None, background_load=False, zygote=False, memory_watchdog=None,
+                 threads=1, cpu_affinity=None, bind=None, reuse_port=False, worker_class=None, sizing_report=None,
+                 **app_options):
+        self.model_dir = model_dir
+        self.cors = cors
+        self.profile_startup = profile_startup
+        self.master_profile = master_profile
+        self.reload_endpoint = reload_endpoint
+        self.model_pool = model_pool
+        self.background_load = background_load
+        self.zygote = zygote
+        self.memory_watchdog = memory_watchdog
+        self.cpu_affinity = cpu_affinity
+        self.reuse_port = reuse_port
+        self.sizing_report = sizing_report
+        self.app_options = app_options
+        self.metrics = None
+        self.watchdog = None
+        self.worker = None
+        self._reload_pending = False
+        # with preload_app, the master loads the app once and every worker is forked with it already loaded
+        self.options = {'bind': bind or ["{}:{}".format(host, port)], 'workers': workers, 'threads': threads, 'timeout': timeout,
+                        'preload_app': zygote, 'reuse_port': reuse_port, 'worker_class': worker_class,
+                        'post_worker_init': self._init_worker}
+        if profile_startup is not None:
+            self.options['when_ready'] = self._emit_master_profile
+        if memory_watchdog is not None:
+            fd, state_path = tempfile.mkstemp(prefix='acumos-model-runner-', suffix='.recycles')
+            os.close(fd)
+            self.memory_watchdog = dict(memory_watchdog, state_path=state_path)
+            self.options['post_request'] = self._check_memory
+            self.options['on_exit'] = self._remove_watchdog_state
+        if sizing_report is not None or cpu_affinity is not None:
+            self.options['on_starting'] = self._report_sizing
+        if cpu_affinity is not None:
+            self.options['pre_fork'] = self._assign_cpus
+        self.options['post_fork'] = self._init_forked_worker
+        super().__init__()
+
+    def run(self):
+        try:
+            _ReloadingArbiter(self).run()
+        except RuntimeError as e:
+            print("\nError: %s\n" % e, file=sys.stderr)
+            sys.stderr.flush()
+            sys.exit(1)
+
+    def load_config(self):
+        config = dict([(key, value) for key, value in self.options.items()
+                       if key in self.cfg.settings and value is not None])
+        for key, value in config.items():
+            self.cfg.set(key.lower(), value)
+
+    def load(self):
+        if self.worker is not None:
+            # gunicorn resets the signal handlers of a worker just before it loads the app
+            signal.signal(_WORKER_RELOAD_SIGNAL, self._handle_reload_signal)
+        self.metrics = Registry()
+        request_reload = self._request_reload if self.reload_endpoint else None
+        if self.model_pool is not None:
+            return ModelPool(self.model_dir, self._build_model_app, request_reload=request_reload, metrics=self.metrics,
+                             **self.model_pool)
+
+        dispatcher = ModelDispatcher(None, self._rebuild_app, request_reload, drain_timeout=self.cfg.graceful_timeout,
+                                     metrics=self.metrics)
+        if self.zygote:
+            dispatcher.load(self._load_app)
+            _freeze()
+        elif self.background_load:
+            dispatcher.load_async(self._load_app)  # the worker answers probes with 503 until the model is ready
+        else:
+            dispatcher.load(self._load_app)
+        return dispatcher
+
+    def _request_reload(self):
+        '''Asks the master to reload the model directory, as SIGHUP does
+
+        In zygote mode the app is loaded in the master, so the master is looked up when a worker handles the request.
+        '''
+        os.kill(self.worker.ppid, signal.SIGHUP)
+
+    def _load_app(self):
+        '''Builds the initial Flask app of a worker from the specification generated by the master'''
+        profile = StartupProfile()
+        app = _build_app(self.model_dir, self.cors, profile=profile, **self.app_options)
+        if self.profile_startup is not None:
+            profile.emit(self.profile_startup, 'zygote' if self.zygote else 'worker')
+        return app
+
+    def _rebuild_app(self):
+        '''Builds a Flask app from the current contents of the model directory'''
+        return self._build_model_app(self.model_dir)
+
+    def _build_model_app(self, model_dir):
+        '''Builds a Flask app from the current contents of a model directory'''
+        app_options = dict(self.app_options, bundle=_load_spec(model_dir, write_oas=False))
+        warmup_samples = app_options.get('warmup_samples')
+        if self.model_pool is not None and warmup_samples is not None:
+            # the warmup inputs of each model are in a subdirectory named after it
+            model_samples = path_join(warmup_samples, basename(model_dir))
+            app_options['warmup_samples'] = model_samples if isdir(model_samples) else None
+        return _build_app(model_dir, self.cors, **app_options)
+
+    def reload_model(self):
+        '''Regenerates the specification in the master, so that workers spawned after a reload serve the new model
+
+        In zygote mode, the master also reloads the model that replacement workers are forked with.
+        '''
+        if self.model_pool is None:
+            self.app_options['bundle'] = _load_spec(self.model_dir)
+        if self.zygote:
+            if hasattr(gc, 'unfreeze'):
+                gc.unfreeze()  # so that the cycles of the old app can be collected
+            if self.model_pool is None:
+                self.callable.reload(self._load_app)
+            else:
+                self.callable.reload()
+            _freeze()
+
+    def _init_worker(self, worker):
+        '''Gunicorn hook that reloads the model in the background when the master forwards a reload, and starts the
+        memory watchdog of the worker
+
+        A reload forwarded while the worker was loading the app is carried out now.
+        '''
+        signal.signal(_WORKER_RELOAD_SIGNAL, self._handle_reload_signal)
+        if self._reload_pending:
+            self._reload_pending = False
+            worker.wsgi.reload_async()
+        if self.memory_watchdog is not None:
+            self.watchdog = MemoryWatchdog(metrics=self.metrics, **self.memory_watchdog)
+
+    def _handle_reload_signal(self, signum, frame):
+        '''Reloads the model of the worker in the background, or once the worker has loaded the app'''
+        wsgi = getattr(self.worker, 'wsgi', None)
+        if wsgi is None:
+            self._reload_pending = True
+        else:
+            wsgi.reload_async()
+
+    def _check_memory(self, worker, req, environ, resp):
+        '''Gunicorn hook that stops a worker over the memory limit from accepting requests'''
+        if self.watchdog is not None and self.watchdog.should_recycle():
+            # as with max_requests, the worker exits once its requests are finished and the master replaces it
+            worker.alive = False
+
+    def _remove_watchdog_state(self, server):
+        '''Gunicorn hook that removes the state file shared by the memory watchdogs of the workers'''
+        try:
+            os.unlink(self.memory_watchdog['state_path'])
+        except OSError:
+            pass
+
+    def _report_sizing(self, server):
+        '''Gunicorn hook that logs the automatic sizing decision and the CPUs of each worker slot at startup'''
+        if self.sizing_report is not None:
+            server.log.info(self.sizing_report)
+        if self.cpu_affinity is not None:
+            server.log.info("Pinning workers to CPUs by slot: %s", format_layout(self.cpu_affinity))
+
+    def _assign_cpus(self, server, worker):
+        '''Gunicorn hook that gives a new worker the lowest slot whose CPUs no live worker has, so that a replacement
+        worker takes over the CPUs of the worker it replaces'''
+        used = set(getattr(w, 'cpu_slot', None) for w in server.WORKERS.values())
+        worker.cpu_slot = free_slot(used, len(self.cpu_affinity))
+
+    def _init_forked_worker(self, server, worker):
+        '''Gunicorn hook that pins a new worker to its CPUs and opens its own listening sockets, before it loads the app'''
+        self.worker = worker
+        if self.cpu_affinity is not None:
+            self._pin_worker(server, worker)
+        if self.reuse_port:
+            self._open_worker_sockets(server, worker)
+
+    def _pin_worker(self, server, worker):
+        '''Pins a new worker, and the threads it starts, to the CPUs of its slot'''
+        cpus = self.cpu_affinity[worker.cpu_slot % len(self.cpu_affinity)]
+        pin(cpus)
+        server.log.info("Pinned worker %d (slot %d) to CPUs %s", worker.pid, worker.cpu_slot, format_cpus(cpus))
+
+    def _open_worker_sockets(self, server, worker):
+        '''Opens a listening socket of the worker's own on the address of each TCP listener of the master
+
+        Gunicorn 24 and later open the sockets of each worker themselves with reuse_port, and the master does not
+        listen. Before, the master listens with SO_REUSEPORT, so the worker adds its own sockets on the same ports and
+        keeps accepting from the shared ones, which receive a share of connections too.
+        '''
+        if not server.LISTENERS:
+            return
+        own = []
+        for listener in worker.sockets:
+            if listener.family in (socket.AF_INET, socket.AF_INET6):
+                socket_class = TCP6Socket if listener.family == socket.AF_INET6 else TCPSocket
+                own.append(socket_class(listener.getsockname(), self.cfg, server.log))
+        worker.sockets = worker.sockets + own
+
+    def _emit_master_profile(self, server):
+        '''Gunicorn hook that reports master startup once the server is listening'''
+        if self.master_profile is not None:
+            self.master_profile.emit(self.profile_startup, 'master')
+
+
+class _ReloadingArbiter(Arbiter):
+    '''Gunicorn arbiter that reloads the model on SIGHUP instead of restarting workers'''
+
+    def handle_hup(self):
+        self.log.info("Reloading model directory %s", self.app.model_dir)
+        try:
+            self.app.reload_model()
+        except Exception:
+            self.log.exception("Failed to reload the model directory. Workers keep serving the current model")
+            return
+        if self.app.zygote:
+            self.replace_workers()
+            return
+        for pid in list(self.WORKERS):
+            self.kill_worker(pid, _WORKER_RELOAD_SIGNAL)
+
+    def replace_workers(self):
+        '''Forks a new set of workers, then gracefully stops the old ones, which finish their requests first'''
+        for _ in range(self.num_workers):
+            self.spawn_worker()
+        self.manage_workers()  # sends SIGTERM to the oldest workers beyond the number of workers
+
+
+def _freeze():
+    '''Moves all objects to a permanent generation ignored by the garbage collector
+
+    Forked workers then share the pages of the loaded model with the master, instead of copying them when a
+    collection touches the objects' reference counts and GC headers.
+    '''
+    gc.collect()
+    if hasattr(gc, 'freeze'):  # Python 3.7+
+        gc.freeze()
+
+
+def _load_model(model_dir):
+    '''Loads the model of `model_dir`, holding a lock on the directory if the model is archived
+
+    load_model extracts the model archive into the model directory, so workers reloading at once would otherwise read
+    files that another worker is rewriting.
+    '''
+    if not isfile(path_join(model_dir, 'model.zip')):
+        return load_model(model_dir)
+    fd = os.open(model_dir, os.O_RDONLY)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        return load_model(model_dir)
+    finally:
+        os.close(fd)  # releases the lock
+
+
+def _build_app(model_dir, cors, trace_exporter=None, slow_request_log=None, traffic_recorder=None, profile=None, bundle=None,
+               warmup_rounds=0, warmup_samples=None, stream_input=None, stream_output_threshold=None,
+               compression_threshold=None, compression_levels=None):
+    '''Builds and returns a Flask app. Uses the specification and method table of `bundle` if provided
+
+    `bundle` is a precompiled startup bundle, or a Bundle without a path holding the specification generated by the master.
+    If `warmup_rounds` is positive, sample inputs from `warmup_samples` or synthesized ones are sent through every method
+    that many times before the app is returned, and hence before the worker reports ready. If `stream_input` is 'file'
+    or 'buffer', methods with raw binary or text inputs are called on the streamed request body, see
+    `acumos_model_runner.api.stream_raw_input`. JSON outputs whose protobuf encoding is larger than
+    `stream_output_threshold` bytes are encoded as they are sent. Method responses of at least `compression_threshold`
+    bytes are compressed with the installed encoding the client prefers, at the levels of `compression_levels`.
+    '''
+    profile = StartupProfile() if profile is None else profile
+
+    with profile.phase('add_api'):
+        connexion_app = App(__name__, specification_dir=model_dir)
+        connexion_app.add_api('oas.yaml' if bundle is None else bundle.spec, resolver=_CustomResolver())
+
+    flask_app = connexion_app.app
+    with profile.phase('load_model'):
+        flask_app.model = _load_model(model_dir)
+    flask_app.model_dir = model_dir
+    with profile.phase('read_methods'):
+        flask_app.methods_info = _read_methods(model_dir) if bundle is None else bundle.methods_info
+    flask_app.startup_profile = profile
+    flask_app.tracer = Tracer(create_exporter(trace_exporter) if trace_exporter else None)
+    flask_app.slow_request_log = slow_request_log
+    flask_app.traffic_recorder = traffic_recorder
+    flask_app.stream_input = stream_input
+    flask_app.stream_output_threshold = stream_output_threshold
+    flask_app.compression_threshold = compression_threshold
+    flask_app.compression_levels = compression_levels
+    flask_app.compression_encodings = () if compression_threshold is None else available_encodings()
+    if stream_input is not None:
+        flask_app.before_request(stream_raw_input)
+
+    @flask_app.route('/')
+    def redirect_ui():
+        return redirect(request.script_root + '/ui')
+
+    _apply_cors(flask_app, cors)
+
+    if warmup_rounds > 0:
+        with profile.phase('warmup'):
+            from acumos_model_runner.warmup import warm_up
+            warm_up(flask_app, warmup_samples, warmup_rounds)
+
+    return flask_app
+
+
+class _CustomResolver(Resolver):
+
+    def resolve_function_from_operation_id(self, operation_id):
+        '''Routes model methods to a generic handler so that methods can be enumerated in the OAS'''
+        if operation_id.startswith('methods'):
+            _, method_name = operation_id.split('.')
+            return partial(methods, method_name=method_name)
+        else:
+            return super().resolve_function_from_operation_id(operation_id)
+
+
+def _apply_cors(app, cors):
+    '''Configures a Flask app with CORS'''
+    if isinstance(cors, str):
+        origins = cors if cors == '*' else cors.split(',')
+        CORS(app, origins=origins)
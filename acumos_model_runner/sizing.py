@@ -0,0 +1,165 @@
+# -*- coding: utf-8 -*-
+# ===============LICENSE_START=======================================================
+# Acumos Apache-2.0
+# ===================================================================================
+# Copyright (C) 2017-2018 AT&T Intellectual Property & Tech Mahindra. All rights reserved.
+# ===================================================================================
+# This Acumos software file is distributed by AT&T and Tech Mahindra
+# under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# This file is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ===============LICENSE_END=========================================================
+"""
+Provides automatic sizing of gunicorn workers and threads from the container's CPU and memory limits
+
+The CPU quota and memory limit are read from cgroup v2 or v1 files, falling back to the CPUs the process may run on
+and the physical memory of the host. The memory of a worker is measured by loading the model in a subprocess, so that
+the master does not initialize native libraries before their thread counts are set.
+"""
+import os
+import sys
+import json
+import subprocess
+from collections import namedtuple
+from os.path import join as path_join
+
+from acumos_model_runner.utils import get_rss
+
+
+CGROUP_ROOT = '/sys/fs/cgroup'
+
+# environment variables that set the size of the thread pools of native numeric libraries
+BLAS_THREAD_VARS = ('OMP_NUM_THREADS', 'OPENBLAS_NUM_THREADS', 'MKL_NUM_THREADS', 'VECLIB_MAXIMUM_THREADS',
+                    'NUMEXPR_NUM_THREADS')
+
+# fraction of the memory limit that workers and the master may use, leaving room for request buffers and growth
+_MEMORY_HEADROOM = 0.9
+
+# cgroup v1 reports no memory limit as a very large number rather than "max"
+_UNLIMITED_MEMORY = 1 << 60
+
+_MIB = 1024 * 1024
+
+Sizing = namedtuple('Sizing', 'workers, threads, blas_threads')
+
+
+def cpu_limit(cgroup_root=CGROUP_ROOT):
+    '''Returns the number of CPUs the process may use, which may be fractional under a cgroup CPU quota'''
+    cpus = len(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else (os.cpu_count() or 1)
+
+    quota = _read_cgroup(cgroup_root, 'cpu.max')  # v2: "<quota> <period>" or "max <period>"
+    if quota is not None:
+        fields = quota.split()
+        if fields[0] != 'max':
+            cpus = min(cpus, int(fields[0]) / int(fields[1]))
+        return cpus
+
+    quota = _read_cgroup(cgroup_root, 'cpu', 'cpu.cfs_quota_us')  # v1: -1 without a quota
+    period = _read_cgroup(cgroup_root, 'cpu', 'cpu.cfs_period_us')
+    if quota is not None and period is not None and int(quota) > 0:
+        cpus = min(cpus, int(quota) / int(period))
+    return cpus
+
+
+def memory_limit(cgroup_root=CGROUP_ROOT):
+    '''Returns the memory limit of the process in bytes, or the physical memory of the host without a cgroup limit'''
+    limit = _read_cgroup(cgroup_root, 'memory.max')  # v2
+    if limit is None:
+        limit = _read_cgroup(cgroup_root, 'memory', 'memory.limit_in_bytes')  # v1
+    if limit is not None and limit != 'max' and int(limit) < _UNLIMITED_MEMORY:
+        return int(limit)
+    try:
+        return os.sysconf('SC_PHYS_PAGES') * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        return None
+
+
+def _read_cgroup(cgroup_root, *path):
+    '''Returns the stripped contents of a cgroup file, or None if it does not exist'''
+    try:
+        with open(path_join(cgroup_root, *path)) as file:
+            return file.read().strip()
+    except OSError:
+        return None
+
+
+def measure_worker_memory(model_dir=None):
+    '''Returns the resident memory in bytes of a worker before loading a model and the memory the model adds
+
+    The model is loaded in a subprocess. If `model_dir` is None, e.g. because models are loaded on demand, only the
+    memory of the serving stack is measured and the model memory is 0.
+    '''
+    cmd = [sys.executable, '-m', 'acumos_model_runner.sizing']
+    if model_dir is not None:
+        cmd.append(model_dir)
+    output = subprocess.run(cmd, stdout=subprocess.PIPE, check=True).stdout
+    measured = json.loads(output.decode('utf-8').strip().splitlines()[-1])
+    return measured['base'], measured['model']
+
+
+def _measure():
+    '''Prints the memory of the serving stack and of the model given on the command line as JSON'''
+    import acumos_model_runner.server  # noqa: F401
+    base = get_rss()
+    model = 0
+    if len(sys.argv) > 1:
+        from acumos.wrapped import load_model
+        load_model(sys.argv[1])
+        model = get_rss() - base
+    print(json.dumps({'base': base, 'model': model}))
+
+
+def plan(cpus, memory, base_rss, model_rss, workers=None, threads=None):
+    '''Returns the Sizing that fits the CPU and memory limits
+
+    One worker is planned per whole CPU, fewer if their memory would exceed the limit. When memory limits the number
+    of workers, each worker gets several request threads so that the CPUs are still used. The remaining CPUs per
+    thread are given to native libraries as BLAS threads. `workers` and `threads` fix those values if provided.
+    '''
+    cores = max(1, int(cpus))
+    if workers is None:
+        workers = cores
+        if memory is not None:
+            # the master holds the serving stack, and the model too if it was loaded there
+            available = memory * _MEMORY_HEADROOM - base_rss - model_rss
+            workers = min(workers, int(available // (base_rss + model_rss)))
+        workers = max(1, workers)
+    if threads is None:
+        threads = max(1, cores // workers)
+    blas_threads = max(1, cores // (workers * threads))
+    return Sizing(workers, threads, blas_threads)
+
+
+def auto_size(model_dir=None, workers=None, threads=None, model_memory=None, cgroup_root=CGROUP_ROOT):
+    '''Returns the Sizing for a model directory given the limits of the current container, and a description of the
+    decision for the gunicorn master to log at startup
+
+    `model_memory` is the memory in bytes that models take per worker. It is measured by loading `model_dir` if None.
+    '''
+    cpus = cpu_limit(cgroup_root)
+    memory = memory_limit(cgroup_root)
+    base_rss, model_rss = measure_worker_memory(model_dir if model_memory is None else None)
+    if model_memory is not None:
+        model_rss = model_memory
+    sizing = plan(cpus, memory, base_rss, model_rss, workers, threads)
+    report = "Auto sizing for {:.1f} CPUs and {} of memory with {:.1f}MiB per worker: {} workers with {} threads each, " \
+             "{} BLAS threads per worker".format(cpus, "unknown" if memory is None else "{:.1f}MiB".format(memory / _MIB),
+                                                 (base_rss + model_rss) / _MIB, *sizing)
+    return sizing, report
+
+
+def set_blas_threads(blas_threads, environ=os.environ):
+    '''Limits the thread pools of native libraries loaded afterwards, unless already configured. Workers inherit them'''
+    for name in BLAS_THREAD_VARS:
+        environ.setdefault(name, str(blas_threads))
+
+
+if __name__ == '__main__':
+    _measure()
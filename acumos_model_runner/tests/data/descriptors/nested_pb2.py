@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+# Generated by the protocol buffer compiler.  DO NOT EDIT!
+# source: nested.proto
+"""Generated protocol buffer code."""
+from google.protobuf.internal import builder as _builder
+from google.protobuf import descriptor as _descriptor
+from google.protobuf import descriptor_pool as _descriptor_pool
+from google.protobuf import symbol_database as _symbol_database
+# @@protoc_insertion_point(imports)
+
+_sym_db = _symbol_database.Default()
+
+
+
+
+DESCRIPTOR = _descriptor_pool.Default().AddSerializedFile(b'\n\x0cnested.proto\x12\x06nested\"\x83\x04\n\x05Outer\x12$\n\x06middle\x18\x01 \x01(\x0b\x32\x14.nested.Outer.Middle\x12*\n\x06inners\x18\x02 \x03(\x0b\x32\x1a.nested.Outer.Middle.Inner\x12)\n\x06levels\x18\x03 \x03(\x0b\x32\x19.nested.Outer.LevelsEntry\x12\x1c\n\x05level\x18\x04 \x01(\x0e\x32\r.nested.Level\x12\x0c\n\x04\x64\x61ta\x18\x05 \x01(\x0c\x1a\xfc\x01\n\x06Middle\x12)\n\x05inner\x18\x01 \x01(\x0b\x32\x1a.nested.Outer.Middle.Inner\x12<\n\rinner_by_name\x18\x02 \x03(\x0b\x32%.nested.Outer.Middle.InnerByNameEntry\x1a\x39\n\x05Inner\x12 \n\x04kind\x18\x01 \x01(\x0e\x32\x12.nested.Outer.Kind\x12\x0e\n\x06values\x18\x02 \x03(\x01\x1aN\n\x10InnerByNameEntry\x12\x0b\n\x03key\x18\x01 \x01(\t\x12)\n\x05value\x18\x02 \x01(\x0b\x32\x1a.nested.Outer.Middle.Inner:\x02\x38\x01\x1a<\n\x0bLevelsEntry\x12\x0b\n\x03key\x18\x01 \x01(\x03\x12\x1c\n\x05value\x18\x02 \x01(\x0e\x32\r.nested.Level:\x02\x38\x01\"\x14\n\x04Kind\x12\x05\n\x01\x41\x10\x00\x12\x05\n\x01\x42\x10\x01\"A\n\x06\x43hoice\x12\x0e\n\x04text\x18\x01 \x01(\tH\x00\x12\x1e\n\x05outer\x18\x02 \x01(\x0b\x32\r.nested.OuterH\x00\x42\x07\n\x05value*\x1a\n\x05Level\x12\x07\n\x03LOW\x10\x00\x12\x08\n\x04HIGH\x10\x01\x62\x06proto3')
+
+_builder.BuildMessageAndEnumDescriptors(DESCRIPTOR, globals())
+_builder.BuildTopDescriptorsAndMessages(DESCRIPTOR, 'nested_pb2', globals())
+if _descriptor._USE_C_DESCRIPTORS == False:
+
+  DESCRIPTOR._options = None
+  _OUTER_MIDDLE_INNERBYNAMEENTRY._options = None
+  _OUTER_MIDDLE_INNERBYNAMEENTRY._serialized_options = b'8\001'
+  _OUTER_LEVELSENTRY._options = None
+  _OUTER_LEVELSENTRY._serialized_options = b'8\001'
+  _LEVEL._serialized_start=609
+  _LEVEL._serialized_end=635
+  _OUTER._serialized_start=25
+  _OUTER._serialized_end=540
+  _OUTER_MIDDLE._serialized_start=204
+  _OUTER_MIDDLE._serialized_end=456
+  _OUTER_MIDDLE_INNER._serialized_start=319
+  _OUTER_MIDDLE_INNER._serialized_end=376
+  _OUTER_MIDDLE_INNERBYNAMEENTRY._serialized_start=378
+  _OUTER_MIDDLE_INNERBYNAMEENTRY._serialized_end=456
+  _OUTER_LEVELSENTRY._serialized_start=458
+  _OUTER_LEVELSENTRY._serialized_end=518
+  _OUTER_KIND._serialized_start=520
+  _OUTER_KIND._serialized_end=540
+  _CHOICE._serialized_start=542
+  _CHOICE._serialized_end=607
+# @@protoc_insertion_point(module_scope)
@@ -0,0 +1,37 @@
+# -*- coding: utf-8 -*-
+# Generated by the protocol buffer compiler.  DO NOT EDIT!
+# source: sample.proto
+"""Generated protocol buffer code."""
+from google.protobuf.internal import builder as _builder
+from google.protobuf import descriptor as _descriptor
+from google.protobuf import descriptor_pool as _descriptor_pool
+from google.protobuf import symbol_database as _symbol_database
+# @@protoc_insertion_point(imports)
+
+_sym_db = _symbol_database.Default()
+
+
+
+
+DESCRIPTOR = _descriptor_pool.Default().AddSerializedFile(b'\n\x0csample.proto\" \n\x08MessageA\x12\t\n\x01x\x18\x01 \x01(\t\x12\t\n\x01y\x18\x02 \x01(\x05\"r\n\x08MessageB\x12\r\n\x05texts\x18\x01 \x03(\t\x12\'\n\x07\x63ounter\x18\x02 \x03(\x0b\x32\x16.MessageB.CounterEntry\x1a.\n\x0c\x43ounterEntry\x12\x0b\n\x03key\x18\x01 \x01(\t\x12\r\n\x05value\x18\x02 \x01(\x05:\x02\x38\x01\"8\n\x05Outer\x12\x1b\n\x05inner\x18\x01 \x01(\x0b\x32\x0c.Outer.Inner\x1a\x12\n\x05Inner\x12\t\n\x01x\x18\x01 \x01(\x05*\x1c\n\x05\x45numA\x12\x05\n\x01x\x10\x00\x12\x05\n\x01y\x10\x01\x12\x05\n\x01z\x10\x02\x62\x06proto3')
+
+_builder.BuildMessageAndEnumDescriptors(DESCRIPTOR, globals())
+_builder.BuildTopDescriptorsAndMessages(DESCRIPTOR, 'sample_pb2', globals())
+if _descriptor._USE_C_DESCRIPTORS == False:
+
+  DESCRIPTOR._options = None
+  _MESSAGEB_COUNTERENTRY._options = None
+  _MESSAGEB_COUNTERENTRY._serialized_options = b'8\001'
+  _ENUMA._serialized_start=224
+  _ENUMA._serialized_end=252
+  _MESSAGEA._serialized_start=16
+  _MESSAGEA._serialized_end=48
+  _MESSAGEB._serialized_start=50
+  _MESSAGEB._serialized_end=164
+  _MESSAGEB_COUNTERENTRY._serialized_start=118
+  _MESSAGEB_COUNTERENTRY._serialized_end=164
+  _OUTER._serialized_start=166
+  _OUTER._serialized_end=222
+  _OUTER_INNER._serialized_start=204
+  _OUTER_INNER._serialized_end=222
+# @@protoc_insertion_point(module_scope)
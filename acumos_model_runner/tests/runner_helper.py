@@ -39,7 +39,15 @@ class Api(object):
     def __init__(self, config, model_dir):
         '''Helper class that invokes the model runner's APIs'''
         self._config = config
-        self._model = load_model(model_dir)
+        self._model_dir = model_dir
+        self._loaded_model = None
+
+    @property
+    def _model(self):
+        '''The model, loaded on first use so that a directory of models can be run too'''
+        if self._loaded_model is None:
+            self._loaded_model = load_model(self._model_dir)
+        return self._loaded_model
 
     def method(self, method_name, json=None, proto=None, headers=None):
         '''Invokes a model method with data'''
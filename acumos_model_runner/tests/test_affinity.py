@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+# ===============LICENSE_START=======================================================
+# Acumos Apache-2.0
+# ===================================================================================
+# Copyright (C) 2017-2018 AT&T Intellectual Property & Tech Mahindra. All rights reserved.
+# ===================================================================================
+# This Acumos software file is distributed by AT&T and Tech Mahindra
+# under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# This file is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ===============LICENSE_END=========================================================
+'''
+Provides tests for CPU affinity layouts
+'''
+import os
+
+import pytest
+
+from acumos_model_runner.affinity import allowed_cpus, layout, format_cpus, format_layout, free_slot
+
+
+@pytest.mark.parametrize('cpus, workers, expected', [
+    ([0, 1, 2, 3, 4, 5, 6, 7], 4, [(0, 1), (2, 3), (4, 5), (6, 7)]),
+    ([0, 1, 2, 3, 4, 5, 6], 3, [(0, 1, 2), (3, 4), (5, 6)]),
+    ([2, 3, 8, 9], 1, [(2, 3, 8, 9)]),
+    ([0, 1], 3, [(0, ), (1, ), (0, )]),
+])
+def test_layout(cpus, workers, expected):
+    '''Tests that CPUs are split into contiguous groups, and shared round-robin by more workers than CPUs'''
+    assert layout(cpus, workers) == expected
+
+
+def test_format():
+    '''Tests that CPU ranges are described compactly'''
+    assert format_cpus([3, 0, 1, 2, 8, 10, 11]) == '0-3,8,10-11'
+    assert format_layout([(0, 1), (2, )]) == '0:0-1 1:2'
+
+
+def test_free_slot():
+    '''Tests that new workers take the lowest slot no live worker holds'''
+    assert free_slot(set(), 2) == 0
+    assert free_slot({0, 2}, 3) == 1
+    assert free_slot({0, 1, None}, 2) == 2
+    assert free_slot({2}, 2) == 1
+
+
+def test_free_slot_after_reload():
+    '''Tests that a worker replacing one started by a reload takes the CPUs no live worker has'''
+    workers = 2
+    used = set()
+    for _ in range(workers):
+        used.add(free_slot(used, workers))
+    assert used == {0, 1}
+
+    # a reload starts new workers before it stops the old ones
+    for _ in range(workers):
+        used.add(free_slot(used, workers))
+    assert used == {0, 1, 2, 3}
+    used -= {0, 1}
+
+    # a new worker dies and is replaced
+    used.remove(3)
+    used.add(free_slot(used, workers))
+    assert set(slot % workers for slot in used) == {0, 1}
+
+
+def test_allowed_cpus():
+    '''Tests that the allowed CPUs are those the process may run on'''
+    assert allowed_cpus() == sorted(os.sched_getaffinity(0))
+
+
+if __name__ == '__main__':
+    '''Test area'''
+    pytest.main([__file__, ])
@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+# ===============LICENSE_START=======================================================
+# Acumos Apache-2.0
+# ===================================================================================
+# Copyright (C) 2017-2018 AT&T Intellectual Property & Tech Mahindra. All rights reserved.
+# ===================================================================================
+# This Acumos software file is distributed by AT&T and Tech Mahindra
+# under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# This file is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ===============LICENSE_END=========================================================
+'''
+Provides tests for concurrency calibration
+'''
+import pytest
+
+from acumos_model_runner.calibration import choose, default_workers, save_calibration, load_calibration, CalibrationError
+from acumos_model_runner.bundle import fingerprint
+from acumos_model_runner.sizing import cpu_limit
+from acumos_model_runner.runner import run_app_cli, create_app
+
+
+def _result(workers, threads, rps, p99, errors=0):
+    return {'workers': workers, 'threads': threads, 'rps': rps, 'p99': p99, 'errors': errors}
+
+
+def test_choose():
+    '''Tests that the highest throughput meeting the p99 target is chosen'''
+    results = [_result(1, 1, 100., 10.), _result(2, 1, 180., 20.), _result(4, 1, 300., 80.), _result(4, 2, 400., 30., errors=1)]
+    assert choose(results, 50) == {'workers': 2, 'threads': 1, 'rps': 180., 'p99': 20.}
+    assert choose(results, 100)['workers'] == 4
+
+    # ties go to fewer processes and threads, and the lowest p99 is chosen if none meets the target
+    assert choose([_result(2, 2, 100., 10.), _result(2, 1, 100., 10.)], 50)['threads'] == 1
+    assert choose(results, 5)['workers'] == 1
+
+    with pytest.raises(CalibrationError):
+        choose([_result(1, 1, 0., None, errors=5)], 50)
+
+
+def test_default_workers():
+    '''Tests that candidate worker counts are powers of two up to the number of CPUs'''
+    assert default_workers(1) == (1, )
+    assert default_workers(6) == (1, 2, 4, 6)
+    assert default_workers(8.5) == (1, 2, 4, 8)
+
+
+def test_load_calibration(tmpdir):
+    '''Tests that a calibration is only reused for the same model files and CPUs'''
+    model_dir = tmpdir.mkdir('model')
+    model_dir.join('metadata.json').write('{}')
+    model_dir.join('model.proto').write('syntax = "proto3";')
+    path = str(tmpdir.join('calibration.json'))
+
+    assert load_calibration(path, str(model_dir)) is None
+
+    calibration = {'fingerprint': fingerprint(str(model_dir)), 'cpus': cpu_limit(), 'choice': {'workers': 2, 'threads': 1}}
+    save_calibration(path, calibration)
+    assert load_calibration(path, str(model_dir)) == calibration
+
+    save_calibration(path, dict(calibration, cpus=calibration['cpus'] + 1))
+    assert load_calibration(path, str(model_dir)) is None
+
+    save_calibration(path, calibration)
+    model_dir.join('model.proto').write('syntax = "proto3"; message A {}')
+    assert load_calibration(path, str(model_dir)) is None
+
+
+def test_multi_model_rejected(tmpdir, capsys):
+    '''Tests that calibration, which fingerprints a single model, cannot be combined with multiple models'''
+    for option in (['--calibration', 'calibration.json'], ['--calibrate-p99', '100']):
+        with pytest.raises(SystemExit) as exc_info:
+            run_app_cli([str(tmpdir), '--multi-model'] + option)
+        assert exc_info.value.code == 2
+        assert 'cannot be used with --multi-model' in capsys.readouterr().err
+
+    with pytest.raises(ValueError):
+        create_app(str(tmpdir), 'localhost', 3330, multi_model=True, calibration='calibration.json')
+
+
+if __name__ == '__main__':
+    '''Test area'''
+    pytest.main([__file__, ])
@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+# ===============LICENSE_START=======================================================
+# Acumos Apache-2.0
+# ===================================================================================
+# Copyright (C) 2017-2018 AT&T Intellectual Property & Tech Mahindra. All rights reserved.
+# ===================================================================================
+# This Acumos software file is distributed by AT&T and Tech Mahindra
+# under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# This file is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ===============LICENSE_END=========================================================
+'''
+Provides tests for the slow request log
+'''
+import os
+from tempfile import TemporaryDirectory
+
+import pytest
+
+from acumos_model_runner.capture import SlowRequestLog, load_captures, replay_captures
+
+from testing_utils import recording_server
+
+
+_HEADERS = {'Content-Type': 'application/json', 'Accept': 'application/json', 'User-Agent': 'test'}
+
+
+def _timings(total):
+    return {'decode': 0.0, 'compute': total, 'encode': 0.0, 'total': total}
+
+
+def test_slow_request_log():
+    '''Tests that only slow requests are captured'''
+    with TemporaryDirectory() as tdir:
+        log = SlowRequestLog(0.5, tdir)
+        assert not log.observe('add', _HEADERS, b'{"x": 1}', _timings(0.1))
+        assert log.observe('add', _HEADERS, b'{"x": 2}', _timings(1.0))
+
+        captures = list(load_captures(tdir))
+        assert len(captures) == 1
+        capture = captures[0]
+        assert capture.method == 'add'
+        assert capture.body == b'{"x": 2}'
+        assert capture.headers == {'Content-Type': 'application/json', 'Accept': 'application/json'}
+        assert capture.timings == _timings(1.0)
+
+
+def test_slow_request_log_limits():
+    '''Tests payload size caps, sampling and rotation'''
+    with TemporaryDirectory() as tdir:
+        log = SlowRequestLog(0., tdir, max_bytes=4, max_files=2)
+        log.observe('add', _HEADERS, b'too large', _timings(1.0))
+        assert list(load_captures(tdir)) == []
+
+        for body in (b'1', b'2', b'3'):
+            log.observe('add', _HEADERS, body, _timings(1.0))
+        assert [c.body for c in load_captures(tdir)] == [b'2', b'3']
+        assert len(os.listdir(tdir)) == 4
+
+        unsampled = SlowRequestLog(0., tdir, sample_rate=0.)
+        assert unsampled.observe('add', _HEADERS, b'4', _timings(1.0))
+        assert len(list(load_captures(tdir))) == 2
+
+    # without a capture directory, slow requests are only logged
+    assert SlowRequestLog(0.).observe('add', _HEADERS, b'1', _timings(1.0))
+
+
+def test_replay_captures():
+    '''Tests that captures are replayed with their original headers and body'''
+    with recording_server() as (base_url, received):
+        with TemporaryDirectory() as tdir:
+            log = SlowRequestLog(0., tdir)
+            log.observe('add', _HEADERS, b'{"x": 1}', _timings(1.0))
+            results = replay_captures(tdir, base_url)
+
+    assert [(path, headers['Content-Type'], body) for path, headers, body in received] == [('/model/methods/add', 'application/json', b'{"x": 1}')]
+    assert [status for _, status, _ in results] == [200]
+
+
+if __name__ == '__main__':
+    '''Test area'''
+    pytest.main([__file__, ])
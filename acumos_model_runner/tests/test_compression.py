@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+# ===============LICENSE_START=======================================================
+# Acumos Apache-2.0
+# ===================================================================================
+# Copyright (C) 2017-2018 AT&T Intellectual Property & Tech Mahindra. All rights reserved.
+# ===================================================================================
+# This Acumos software file is distributed by AT&T and Tech Mahindra
+# under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# This file is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ===============LICENSE_END=========================================================
+'''
+Provides tests for response compression
+'''
+import gzip
+import zlib
+
+import pytest
+
+from acumos_model_runner.runner import run_app_cli
+from acumos_model_runner.compression import (available_encodings, check_levels, compress, compress_chunks, is_compressed,
+                                             CompressionError, DEFAULT_LEVELS, ENCODINGS, GZIP)
+
+
+@pytest.mark.parametrize('encoding', available_encodings())
+def test_compress(encoding):
+    '''Tests that buffered and streamed data is compressed with every installed encoding'''
+    data = b'acumos ' * 10000
+    compressed = compress(data, encoding, DEFAULT_LEVELS[encoding])
+    assert len(compressed) < len(data)
+    assert len(b''.join(compress_chunks(iter([data[:100], b'', data[100:]]), encoding, DEFAULT_LEVELS[encoding]))) < len(data)
+    if encoding == GZIP:
+        assert gzip.decompress(compressed) == data
+
+
+def test_compress_chunks():
+    '''Tests that every compressed chunk can be decompressed as soon as it is received'''
+    decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    chunks = compress_chunks(iter([b'abc', b'def']), GZIP, 6)
+    assert decompressor.decompress(next(chunks)) == b'abc'
+    assert decompressor.decompress(next(chunks)) == b'def'
+    assert decompressor.decompress(b''.join(chunks)) == b''
+    assert decompressor.eof
+
+
+def test_available_encodings():
+    '''Tests that gzip is always available, and encodings are listed in order of preference'''
+    encodings = available_encodings()
+    assert GZIP in encodings
+    assert list(encodings) == [encoding for encoding in ENCODINGS if encoding in encodings]
+
+
+def test_check_levels():
+    '''Tests that levels override the defaults and are validated'''
+    assert check_levels(None) == DEFAULT_LEVELS
+    assert check_levels({GZIP: 9})[GZIP] == 9
+    with pytest.raises(CompressionError):
+        check_levels({GZIP: 10})
+    with pytest.raises(CompressionError):
+        check_levels({'lzma': 1})
+
+
+@pytest.mark.parametrize('level', ['gzip=10', 'lzma=1', 'gzip', 'gzip=fast'])
+def test_level_option(tmpdir, capsys, level):
+    '''Tests that invalid --compression-level values are usage errors'''
+    with pytest.raises(SystemExit) as exc_info:
+        run_app_cli([str(tmpdir), '--compression-threshold', '1024', '--compression-level', level])
+    assert exc_info.value.code == 2
+    assert 'argument --compression-level' in capsys.readouterr().err
+
+
+def test_is_compressed():
+    '''Tests that already compressed formats are recognized'''
+    assert is_compressed(gzip.compress(b'acumos'))
+    assert is_compressed(memoryview(b'\x89PNG\r\n\x1a\n' + b'\0' * 10))
+    assert not is_compressed(b'acumos')
+    assert not is_compressed(b'')
+
+
+if __name__ == '__main__':
+    '''Test area'''
+    pytest.main([__file__, ])
@@ -0,0 +1,182 @@
+# -*- coding: utf-8 -*-
+# ===============LICENSE_START=======================================================
+# Acumos Apache-2.0
+# ===================================================================================
+# Copyright (C) 2017-2018 AT&T Intellectual Property & Tech Mahindra. All rights reserved.
+# ===================================================================================
+# This Acumos software file is distributed by AT&T and Tech Mahindra
+# under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# This file is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ===============LICENSE_END=========================================================
+'''
+Provides tests for the model dispatcher
+'''
+import gc
+import threading
+import weakref
+
+import pytest
+from werkzeug.test import Client, EnvironBuilder
+
+from acumos_model_runner.metrics import Registry
+from acumos_model_runner.dispatcher import ModelDispatcher
+
+
+class _App(object):
+
+    def __init__(self, body, release=None):
+        '''WSGI app that responds with `body`, optionally only once `release` is set'''
+        self.body = body
+        self.release = release
+
+    def __call__(self, environ, start_response):
+        start_response('200 OK', [('Content-Type', 'text/plain')])
+        return self._iter()
+
+    def _iter(self):
+        if self.release is not None:
+            self.release.wait(10)
+        yield self.body
+
+
+def _get(dispatcher, path='/'):
+    '''Returns the response body of a GET request'''
+    resp = Client(dispatcher).get(path)
+    resp.close()  # as WSGI servers do, which ends the request for the dispatcher
+    return resp.get_data()
+
+
+def test_reload():
+    '''Tests that a reload swaps the app for new requests'''
+    dispatcher = ModelDispatcher(_App(b'1'), lambda: _App(b'2'))
+    assert _get(dispatcher) == b'1'
+    assert dispatcher.reload() == 2
+    assert dispatcher.generation == 2
+    assert _get(dispatcher) == b'2'
+    assert dispatcher.reload(lambda: _App(b'3')) == 3
+    assert _get(dispatcher) == b'3'
+
+
+def test_reload_drains_in_flight():
+    '''Tests that in-flight requests finish on the old app, which is released afterwards'''
+    release = threading.Event()
+    old_app = _App(b'old', release)
+    old_ref = weakref.ref(old_app)
+    dispatcher = ModelDispatcher(old_app, lambda: _App(b'new'))
+    del old_app
+
+    statuses = []
+    in_flight = dispatcher(EnvironBuilder('/').get_environ(), lambda status, headers: statuses.append(status))
+
+    thread = dispatcher.reload_async()
+    thread.join(0.2)
+    assert thread.is_alive()  # waiting for the in-flight request to drain
+    assert _get(dispatcher) == b'new'
+
+    release.set()
+    assert b''.join(in_flight) == b'old'
+    in_flight.close()
+    thread.join(5)
+    assert not thread.is_alive()
+
+    del in_flight
+    gc.collect()
+    assert old_ref() is None
+
+
+def test_failed_reload():
+    '''Tests that the current app keeps serving if building a new one fails'''
+    def build_app():
+        raise RuntimeError('broken model')
+
+    dispatcher = ModelDispatcher(_App(b'1'), build_app)
+    with pytest.raises(RuntimeError):
+        dispatcher.reload()
+    dispatcher.reload_async().join(5)
+    assert dispatcher.generation == 1
+    assert _get(dispatcher) == b'1'
+
+
+def test_reload_endpoint():
+    '''Tests that POST /admin/reload requests a reload only if enabled'''
+    requests = []
+    dispatcher = ModelDispatcher(_App(b'1'), lambda: _App(b'2'), request_reload=lambda: requests.append(True))
+    client = Client(dispatcher)
+
+    resp = client.post('/admin/reload')
+    assert resp.status_code == 202
+    assert resp.get_json() == {'status': 'reloading', 'generation': 1}
+    assert requests == [True]
+    assert client.get('/admin/reload').status_code == 405
+
+    disabled = ModelDispatcher(_App(b'1'), lambda: _App(b'2'))
+    assert Client(disabled).post('/admin/reload').get_data() == b'1'
+
+
+def test_background_load():
+    '''Tests that probes are answered while the app loads, and other requests are refused until it is ready'''
+    release = threading.Event()
+
+    def build_app():
+        release.wait(10)
+        return _App(b'1')
+
+    dispatcher = ModelDispatcher(None, build_app, retry_after=3)
+    thread = dispatcher.load_async()
+    client = Client(dispatcher)
+
+    assert client.get('/health/live').status_code == 200
+    assert client.get('/health/ready').status_code == 503
+    resp = client.get('/model/methods/add')
+    assert resp.status_code == 503
+    assert resp.headers['Retry-After'] == '3'
+    assert resp.get_json() == {'status': 'loading'}
+    assert dispatcher.generation == 0
+
+    release.set()
+    thread.join(5)
+    assert client.get('/health/ready').get_json() == {'status': 'ready', 'generation': 1}
+    assert _get(dispatcher) == b'1'
+
+
+def test_failed_load():
+    '''Tests that liveness fails once loading fails, and that a reload can still recover'''
+    def build_app():
+        raise RuntimeError('broken model')
+
+    dispatcher = ModelDispatcher(None, build_app)
+    dispatcher.load_async().join(5)
+    client = Client(dispatcher)
+
+    resp = client.get('/health/live')
+    assert resp.status_code == 500
+    assert resp.get_json() == {'status': 'failed', 'error': 'RuntimeError: broken model'}
+    assert client.get('/health/ready').status_code == 503
+    assert client.get('/').get_json() == {'status': 'failed'}
+
+    dispatcher.build_app = lambda: _App(b'1')
+    assert dispatcher.reload() == 1
+    assert client.get('/health/live').status_code == 200
+    assert _get(dispatcher) == b'1'
+
+
+def test_metrics_endpoint():
+    '''Tests that metrics are served only if a registry is provided'''
+    registry = Registry()
+    registry.counter('requests_total', 'Requests').inc()
+    dispatcher = ModelDispatcher(_App(b'1'), lambda: _App(b'2'), metrics=registry)
+    assert b'requests_total{pid=' in _get(dispatcher, '/metrics')
+    assert _get(ModelDispatcher(_App(b'1'), lambda: _App(b'2')), '/metrics') == b'1'
+
+
+if __name__ == '__main__':
+    '''Test area'''
+    pytest.main([__file__, ])
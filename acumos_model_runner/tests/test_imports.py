@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+# ===============LICENSE_START=======================================================
+# Acumos Apache-2.0
+# ===================================================================================
+# Copyright (C) 2017-2018 AT&T Intellectual Property & Tech Mahindra. All rights reserved.
+# ===================================================================================
+# This Acumos software file is distributed by AT&T and Tech Mahindra
+# under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# This file is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ===============LICENSE_END=========================================================
+'''
+Provides tests that keep heavy dependencies off the import paths that do not need them
+'''
+import sys
+import json
+import subprocess
+
+import pytest
+
+
+_SERVING = ('gunicorn', 'connexion', 'flask', 'flask_cors', 'acumos')
+_OAS = ('yaml', 'jinja2', 'lark')
+
+# generous so that slow CI machines pass, while an accidental import of the serving stack, which takes several hundred
+# milliseconds, does not. Importing the runner takes about 15ms
+_RUNNER_IMPORT_BUDGET_MS = 100
+
+# runs `code` after setting sys.argv, and reports the imported modules on stderr, as --help prints to stdout
+_REPORT_MODULES = """
+import sys, json
+sys.argv = {argv!r}
+try:
+    {code}
+except SystemExit:
+    pass
+sys.stderr.write(json.dumps(sorted(sys.modules)))
+"""
+
+
+def _imported(code, argv=()):
+    '''Runs `code` in a new interpreter and returns the top-level packages it imported'''
+    script = _REPORT_MODULES.format(argv=['-c'] + list(argv), code=code)
+    proc = subprocess.run([sys.executable, '-c', script], stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                          universal_newlines=True, check=True)
+    return {name.split('.')[0] for name in json.loads(proc.stderr)}
+
+
+def _import_times(*args):
+    '''Runs the interpreter with `-X importtime` and returns a dict of imported module name to cumulative milliseconds'''
+    proc = subprocess.run([sys.executable, '-X', 'importtime'] + list(args), stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                          universal_newlines=True, check=True)
+    times = dict()
+    for line in proc.stderr.splitlines():
+        if line.startswith('import time:') and not line.endswith('| imported package'):
+            _, cumulative, name = line[len('import time:'):].split('|')
+            times[name.strip()] = int(cumulative) / 1000
+    return times
+
+
+def _loaded(imported, packages):
+    '''Returns the packages of `packages` that were imported'''
+    return sorted(imported & set(packages))
+
+
+def test_cli_help_imports():
+    '''Tests that printing CLI help loads neither the serving stack nor the OAS generator'''
+    imported = _imported("import runpy; runpy.run_module('acumos_model_runner.runner', run_name='__main__')", ['--help'])
+    assert 'acumos_model_runner' in imported
+    assert _loaded(imported, _SERVING + _OAS) == []
+
+
+def test_runner_imports():
+    '''Tests that importing the runner module loads neither the serving stack nor the OAS generator'''
+    assert _loaded(_imported('import acumos_model_runner.runner'), _SERVING + _OAS) == []
+
+
+@pytest.mark.skipif(sys.version_info < (3, 7), reason='-X importtime requires Python 3.7+')
+def test_runner_import_budget():
+    '''Tests that importing the runner module is cheap'''
+    times = _import_times('-c', 'import acumos_model_runner.runner')
+    assert times['acumos_model_runner.runner'] < _RUNNER_IMPORT_BUDGET_MS
+
+
+def test_server_imports():
+    '''Tests that the server module, which masters and workers import, does not load the proto parser, which only
+    --warmup uses'''
+    imported = _imported('import acumos_model_runner.server')
+    assert 'gunicorn' in imported
+    assert _loaded(imported, ('lark', )) == []
+
+
+def test_warmup_imports():
+    '''Tests that warmup synthesizes inputs without the proto parser'''
+    assert _loaded(_imported('import acumos_model_runner.warmup'), _SERVING + _OAS) == []
+
+
+def test_oas_imports():
+    '''Tests that generating an OAS does not load the serving stack'''
+    assert _loaded(_imported('import acumos_model_runner.oas_gen'), _SERVING) == []
+
+
+def test_command_imports():
+    '''Tests that commands which do not serve a model do not load the serving stack'''
+    for module in ('acumos_model_runner.recording', 'acumos_model_runner.bench', 'acumos_model_runner.bundle'):
+        assert _loaded(_imported("import {}".format(module)), _SERVING + _OAS) == [], module
+
+
+if __name__ == '__main__':
+    '''Test area'''
+    pytest.main([__file__, ])
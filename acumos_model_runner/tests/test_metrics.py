@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+# ===============LICENSE_START=======================================================
+# Acumos Apache-2.0
+# ===================================================================================
+# Copyright (C) 2017-2018 AT&T Intellectual Property & Tech Mahindra. All rights reserved.
+# ===================================================================================
+# This Acumos software file is distributed by AT&T and Tech Mahindra
+# under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# This file is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ===============LICENSE_END=========================================================
+'''
+Provides tests for metrics
+'''
+import os
+
+import pytest
+
+from acumos_model_runner.metrics import Registry
+
+
+def test_render():
+    '''Tests that metrics are rendered in the Prometheus text format'''
+    registry = Registry()
+    loads = registry.counter('loads_total', 'Models loaded')
+    loads.inc(model='a')
+    loads.inc(2, model='a')
+    loads.inc(0.5, model='b"\n')
+    registry.gauge('resident', 'Models loaded').set(3)
+
+    assert registry.counter('loads_total', 'Models loaded') is loads
+    assert loads.value(model='a') == 3
+
+    pid = os.getpid()
+    assert registry.render() == ('# HELP loads_total Models loaded\n'
+                                 '# TYPE loads_total counter\n'
+                                 'loads_total{{model="a",pid="{0}"}} 3\n'
+                                 'loads_total{{model="b\\"\\n",pid="{0}"}} 0.5\n'
+                                 '# HELP resident Models loaded\n'
+                                 '# TYPE resident gauge\n'
+                                 'resident{{pid="{0}"}} 3\n').format(pid)
+
+    loads.remove(model='a')
+    assert loads.value(model='a') is None
+
+
+def test_shared():
+    '''Tests that metrics shared by all workers are rendered without the pid label'''
+    registry = Registry()
+    registry.counter('recycles_total', 'Workers recycled', shared=True).set(2)
+    registry.counter('recycles_total', 'Workers recycled', shared=True).inc(model='a')
+    assert registry.render() == ('# HELP recycles_total Workers recycled\n'
+                                 '# TYPE recycles_total counter\n'
+                                 'recycles_total 2\n'
+                                 'recycles_total{model="a"} 1\n')
+
+
+def test_kind_mismatch():
+    '''Tests that a name cannot be registered as two kinds of metric'''
+    registry = Registry()
+    registry.counter('loads_total', 'Models loaded')
+    with pytest.raises(ValueError):
+        registry.gauge('loads_total', 'Models loaded')
+
+
+if __name__ == '__main__':
+    '''Test area'''
+    pytest.main([__file__, ])
@@ -20,15 +20,23 @@
 Provides tests for OAS generation
 '''
 import json
+import os
+from glob import glob
 
 import pytest
+import yaml
+from google.protobuf.descriptor_pool import DescriptorPool
 
 from acumos_model_runner.proto_parser import parse_proto
-from acumos_model_runner.oas_gen import _create_definitions
+from acumos_model_runner.oas_gen import create_spec, _create_definitions, _create_descriptor_definitions, _as_file_proto
+from acumos_model_runner.descriptors import load_file_descriptor, parse_pb2_source
 
 from testing_utils import load_testing_data
 
 
+_DATA_DIR = os.path.join(os.path.dirname(__file__), 'data')
+
+
 def test_oas_defs():
     '''Tests correct generation of oas definitions'''
     proto = load_testing_data('sample.proto')
@@ -37,6 +45,67 @@ def test_oas_defs():
     assert oas_defs == load_testing_data('sample.json', loader=json.load)
 
 
+def _load_descriptor(name):
+    '''Returns the FileDescriptorProto of a test protobuf module generated by protoc'''
+    with open(os.path.join(_DATA_DIR, 'descriptors', "{}_pb2.py".format(name))) as file:
+        return parse_pb2_source(file.read())
+
+
+def test_descriptor_defs():
+    '''Tests that definitions built from a file descriptor match the expected definitions'''
+    oas_defs = _create_descriptor_definitions(_load_descriptor('sample'))
+    assert oas_defs == load_testing_data('sample.json', loader=json.load)
+
+
+def test_descriptor_defs_nested():
+    '''Tests that descriptor definitions match parsed IDL definitions for nested types, enums and maps'''
+    with open(os.path.join(_DATA_DIR, 'descriptors', 'nested.proto')) as file:
+        idl_defs = _create_definitions(parse_proto(file.read()))
+    oas_defs = _create_descriptor_definitions(_load_descriptor('nested'))
+
+    # the IDL parser does not support oneof fields
+    choice = oas_defs.pop('Model.Choice')
+    assert idl_defs.pop('Model.Choice') == {'type': 'object'}
+    assert choice == {'type': 'object', 'properties': {'text': {'type': 'string'}, 'outer': {'$ref': '#/definitions/Model.Outer'}}}
+
+    assert oas_defs == idl_defs
+    assert oas_defs['Model.Outer.Middle']['properties']['inner_by_name'] == {
+        'type': 'object', 'additionalProperties': {'$ref': '#/definitions/Model.Outer.Middle.Inner'}}
+    assert oas_defs['Model.Outer.Middle.Inner']['properties']['kind'] == {'$ref': '#/definitions/Model.Outer.Kind'}
+
+
+def test_descriptor_defs_file_descriptor():
+    '''Tests that definitions can be built from a FileDescriptor as well as a FileDescriptorProto'''
+    file_proto = _load_descriptor('nested')
+    pool = DescriptorPool()
+    pool.Add(file_proto)
+    file_descriptor = pool.FindFileByName(file_proto.name)
+    assert _create_descriptor_definitions(_as_file_proto(file_descriptor)) == _create_descriptor_definitions(file_proto)
+
+
+@pytest.mark.parametrize('model_dir', sorted(glob(os.path.join(_DATA_DIR, 'backward_compatible_models', '*'))))
+def test_load_file_descriptor(model_dir):
+    '''Tests that the file descriptor of a dumped model is found and matches its IDL'''
+    file_proto = load_file_descriptor(model_dir)
+    with open(os.path.join(model_dir, 'model.proto')) as file:
+        idl_defs = _create_definitions(parse_proto(file.read()))
+    assert _create_descriptor_definitions(file_proto) == idl_defs
+
+
+@pytest.mark.parametrize('model_dir', sorted(glob(os.path.join(_DATA_DIR, 'backward_compatible_models', '*'))))
+def test_create_spec(model_dir):
+    '''Tests that the specification dict matches its YAML string without a YAML round trip of the definitions'''
+    with open(os.path.join(model_dir, 'metadata.json')) as file:
+        metadata = json.load(file)
+    with open(os.path.join(model_dir, 'model.proto')) as file:
+        proto = file.read()
+
+    spec, oas_yaml = create_spec(metadata, proto)
+    assert spec == yaml.safe_load(oas_yaml)
+    assert spec['definitions']['Model.AddIn']['required'] == ['x', 'y']
+    assert spec['paths']['/model/methods/add']['post']['operationId'] == 'methods.add'
+
+
 if __name__ == '__main__':
     '''Test area'''
     pytest.main([__file__, ])
@@ -0,0 +1,213 @@
+# -*- coding: utf-8 -*-
+# ===============LICENSE_START=======================================================
+# Acumos Apache-2.0
+# ===================================================================================
+# Copyright (C) 2017-2018 AT&T Intellectual Property & Tech Mahindra. All rights reserved.
+# ===================================================================================
+# This Acumos software file is distributed by AT&T and Tech Mahindra
+# under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# This file is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ===============LICENSE_END=========================================================
+'''
+Provides tests for the multi-model pool
+'''
+import os
+import json
+import threading
+
+import pytest
+from werkzeug.test import Client, EnvironBuilder
+
+from acumos_model_runner.pool import ModelPool
+
+
+class _App(object):
+
+    def __init__(self, model_dir):
+        '''WSGI app that responds with the name of its model and the path it was called with'''
+        self.name = os.path.basename(model_dir)
+
+    def __call__(self, environ, start_response):
+        start_response('200 OK', [('Content-Type', 'text/plain')])
+        return ["{} {} {}".format(self.name, environ['SCRIPT_NAME'], environ['PATH_INFO']).encode('utf-8')]
+
+
+class _Builder(object):
+
+    def __init__(self, size=100):
+        '''Builds _App instances, pretending that each one takes `size` bytes'''
+        self.size = size
+        self.rss = 0
+        self.built = []
+
+    def __call__(self, model_dir):
+        self.built.append(os.path.basename(model_dir))
+        self.rss += self.size
+        return _App(model_dir)
+
+
+@pytest.fixture
+def models_dir(tmpdir):
+    '''Returns a directory of three fake models'''
+    for name in ('a', 'b', 'c'):
+        tmpdir.mkdir(name).join('metadata.json').write('{}')
+    tmpdir.mkdir('not-a-model')
+    return str(tmpdir)
+
+
+def _pool(models_dir, **kwargs):
+    '''Returns a pool of fake models and its builder'''
+    builder = _Builder()
+    return ModelPool(models_dir, builder, rss=lambda: builder.rss, **kwargs), builder
+
+
+def _get(pool, path):
+    '''Returns the response of a GET request'''
+    resp = Client(pool).get(path)
+    resp.close()  # as WSGI servers do, which ends the request for the pool
+    return resp
+
+
+def test_routing(models_dir):
+    '''Tests that models are loaded on first use and served under their name'''
+    pool, builder = _pool(models_dir)
+    assert builder.built == []
+
+    assert _get(pool, '/models/a/model/methods/add').get_data() == b'a /models/a /model/methods/add'
+    assert _get(pool, '/models/a/ui').get_data() == b'a /models/a /ui'
+    assert builder.built == ['a']
+
+    for path in ('/models/d/ui', '/models/not-a-model/ui', '/models/../a/ui', '/models//ui', '/other'):
+        assert _get(pool, path).status_code != 200
+    assert builder.built == ['a']
+
+    description = json.loads(_get(pool, '/models').get_data())
+    assert description['available'] == ['a', 'b', 'c']
+    assert [model['name'] for model in description['resident']] == ['a']
+
+
+def test_max_models(models_dir):
+    '''Tests that the least recently used model is evicted when too many are loaded'''
+    pool, builder = _pool(models_dir, max_models=2)
+    for name in ('a', 'b', 'a', 'c'):
+        _get(pool, "/models/{}/ui".format(name))
+    assert pool.resident == ['a', 'c']
+
+    _get(pool, '/models/b/ui')
+    assert pool.resident == ['c', 'b']
+    assert builder.built == ['a', 'b', 'c', 'b']
+
+
+def test_memory_budget(models_dir):
+    '''Tests that idle models are evicted when the loaded models exceed the memory budget'''
+    pool, builder = _pool(models_dir, memory_budget=250)
+    for name in ('a', 'b', 'c'):
+        _get(pool, "/models/{}/ui".format(name))
+    assert pool.resident == ['b', 'c']
+
+    metrics = _get(pool, '/metrics').get_data().decode('utf-8')
+    pid = os.getpid()
+    assert 'acumos_model_loads_total{{model="c",pid="{}"}} 1'.format(pid) in metrics
+    assert 'acumos_model_evictions_total{{model="a",pid="{}",reason="memory"}} 1'.format(pid) in metrics
+    assert 'acumos_model_resident_bytes{{model="b",pid="{}"}} 100'.format(pid) in metrics
+    assert 'acumos_model_resident_bytes{{model="a"' not in metrics
+    assert 'acumos_models_resident{{pid="{}"}} 2'.format(pid) in metrics
+
+
+def test_memory_budget_after_eviction(models_dir):
+    '''Tests that a model loaded again without growing the process, as freed memory is reused, keeps its size'''
+    builder = _Builder()
+    grown = set()
+
+    def rss():
+        return 100 * len(grown)
+
+    def build_app(model_dir):
+        grown.add(os.path.basename(model_dir))  # memory freed by an eviction is reused by the next load
+        return builder(model_dir)
+
+    pool = ModelPool(models_dir, build_app, memory_budget=250, rss=rss)
+    for name in ('a', 'b', 'c', 'a'):
+        _get(pool, "/models/{}/ui".format(name))
+    assert pool.resident == ['c', 'a']
+    assert [model['rss'] for model in pool.describe()['resident']] == [100, 100]
+
+
+def test_concurrent_loads(models_dir):
+    '''Tests that a slow model load does not hold up the loads of other models'''
+    loading = threading.Event()
+    release = threading.Event()
+
+    def build_app(model_dir):
+        if os.path.basename(model_dir) == 'a':
+            loading.set()
+            assert release.wait(10)
+        return _App(model_dir)
+
+    pool = ModelPool(models_dir, build_app)
+    slow = threading.Thread(target=_get, args=(pool, '/models/a/ui'))
+    slow.start()
+    try:
+        assert loading.wait(10)
+        assert _get(pool, '/models/b/ui').get_data() == b'b /models/b /ui'
+        assert pool.resident == ['b']
+    finally:
+        release.set()
+        slow.join(10)
+    assert pool.resident == ['b', 'a']
+
+
+def test_busy_models_not_evicted(models_dir):
+    '''Tests that models serving a request are not evicted'''
+    pool, builder = _pool(models_dir, max_models=1)
+    in_flight = pool(EnvironBuilder('/models/a/ui').get_environ(), lambda status, headers: None)
+
+    _get(pool, '/models/b/ui')
+    assert pool.resident == ['a', 'b']  # over the budget, but 'a' is busy
+
+    in_flight.close()
+    _get(pool, '/models/c/ui')
+    assert pool.resident == ['c']
+
+
+def test_load_failure(models_dir):
+    '''Tests that a model that fails to load responds with an error and is retried'''
+    def build_app(model_dir):
+        raise Exception('broken model')
+
+    pool = ModelPool(models_dir, build_app)
+    assert _get(pool, '/models/a/ui').status_code == 500
+    assert _get(pool, '/models/a/ui').status_code == 500
+    assert pool.metrics.counter('acumos_model_load_failures_total', '').value(model='a') == 2
+    assert pool.resident == []
+
+
+def test_reload(models_dir):
+    '''Tests that a reload evicts all models, and that the reload endpoint is opt-in'''
+    requested = threading.Event()
+    pool, builder = _pool(models_dir, request_reload=requested.set)
+    _get(pool, '/models/a/ui')
+
+    assert Client(pool).post('/admin/reload').status_code == 202
+    assert requested.is_set()
+
+    pool.reload_async().join(10)
+    assert pool.resident == []
+    _get(pool, '/models/a/ui')
+    assert builder.built == ['a', 'a']
+
+    pool, builder = _pool(models_dir)
+    assert Client(pool).post('/admin/reload').status_code == 404
+
+
+if __name__ == '__main__':
+    '''Test area'''
+    pytest.main([__file__, ])
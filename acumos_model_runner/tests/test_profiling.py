@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+# ===============LICENSE_START=======================================================
+# Acumos Apache-2.0
+# ===================================================================================
+# Copyright (C) 2017-2018 AT&T Intellectual Property & Tech Mahindra. All rights reserved.
+# ===================================================================================
+# This Acumos software file is distributed by AT&T and Tech Mahindra
+# under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# This file is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ===============LICENSE_END=========================================================
+'''
+Provides tests for startup profiling
+'''
+import json
+import os
+from tempfile import TemporaryDirectory
+
+import pytest
+
+from acumos_model_runner.profiling import StartupProfile
+from acumos_model_runner.utils import get_rss
+
+
+def test_startup_profile():
+    '''Tests that phase times and memory deltas are reported'''
+    profile = StartupProfile()
+    with profile.phase('allocate'):
+        data = bytearray(32 * 1024 * 1024)
+    with profile.phase('noop'):
+        pass
+
+    with TemporaryDirectory() as tdir:
+        path = os.path.join(tdir, 'startup.jsonl')
+        profile.emit(path, 'worker')
+        profile.emit(path, 'worker')
+        with open(path) as file:
+            reports = [json.loads(line) for line in file]
+
+    assert len(reports) == 2
+    report = reports[0]
+    assert report['process'] == 'worker'
+    assert report['pid'] == os.getpid()
+    assert [phase['name'] for phase in report['phases']] == ['allocate', 'noop']
+    assert all(phase['seconds'] >= 0 for phase in report['phases'])
+    assert report['total_seconds'] >= sum(phase['seconds'] for phase in report['phases'])
+
+    if get_rss() is not None:
+        assert report['phases'][0]['rss_delta'] >= len(data) // 2
+    del data
+
+
+def test_startup_profile_error():
+    '''Tests that failed phases are still recorded'''
+    profile = StartupProfile()
+    with pytest.raises(RuntimeError):
+        with profile.phase('load_model'):
+            raise RuntimeError()
+    assert 'load_model' in profile.phases
+
+
+if __name__ == '__main__':
+    '''Test area'''
+    pytest.main([__file__, ])
@@ -19,9 +19,14 @@
 '''
 Provides tests for protobuf parsing
 '''
+import os
+from tempfile import TemporaryDirectory
+
 import pytest
 
-from acumos_model_runner.proto_parser import Message, RepeatedField, MapField, Enum, Field, parse_proto
+from acumos_model_runner import proto_parser
+from acumos_model_runner.proto_parser import (Message, RepeatedField, MapField, Enum, Field, parse_proto,
+                                              save_parser_tables, load_parser_tables)
 
 from testing_utils import load_testing_data
 
@@ -40,6 +45,21 @@ def test_proto_parser():
     assert top_level == [msg_a, msg_b, msg_outer, enum_a]
 
 
+def test_parser_tables():
+    '''Tests that serialized parser tables parse like freshly built ones'''
+    proto = load_testing_data('sample.proto')
+    expected = parse_proto(proto)
+
+    with TemporaryDirectory() as tdir:
+        path = os.path.join(tdir, 'parser.pickle')
+        save_parser_tables(path)
+        proto_parser._parser = None
+        load_parser_tables(path)
+
+    assert proto_parser._parser is not None
+    assert parse_proto(proto) == expected
+
+
 if __name__ == '__main__':
     '''Test area'''
     pytest.main([__file__, ])
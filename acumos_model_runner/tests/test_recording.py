@@ -0,0 +1,146 @@
+# -*- coding: utf-8 -*-
+# ===============LICENSE_START=======================================================
+# Acumos Apache-2.0
+# ===================================================================================
+# Copyright (C) 2017-2018 AT&T Intellectual Property & Tech Mahindra. All rights reserved.
+# ===================================================================================
+# This Acumos software file is distributed by AT&T and Tech Mahindra
+# under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# This file is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ===============LICENSE_END=========================================================
+'''
+Provides tests for traffic recording and replay
+'''
+import os
+from tempfile import TemporaryDirectory
+
+import pytest
+
+from acumos_model_runner.capture import SlowRequestLog
+from acumos_model_runner.loadgen import LoadRequest, run_load, percentile, summarize
+from acumos_model_runner.recording import (TrafficRecorder, RecordingError, read_records, load_records,
+                                           schedule, run_replay_cli)
+
+from testing_utils import recording_server
+
+
+_HEADERS = [('Host', 'localhost:3330'), ('Content-Type', 'application/json'), ('Accept', 'application/json'),
+            ('Content-Length', '8')]
+
+
+def test_traffic_log():
+    '''Tests that recorded requests are read back in order'''
+    with TemporaryDirectory() as tdir:
+        path = os.path.join(tdir, 'traffic.log')
+        recorder = TrafficRecorder(path)
+        recorder.record(10.0, 'add', _HEADERS, b'{"x": 1}')
+        recorder.record(10.5, 'rotate_image', [('Content-Type', 'application/octet-stream')], b'\x00\xff' * 100)
+
+        # a second writer, e.g. another gunicorn worker, appends to the same log
+        TrafficRecorder(path).record(11.0, 'add', _HEADERS, b'')
+
+        # a partially written record is ignored
+        with open(path, 'ab') as file:
+            file.write(b'\x00\x01')
+
+        records = list(read_records(path))
+
+    assert [(r.arrival, r.method) for r in records] == [(10.0, 'add'), (10.5, 'rotate_image'), (11.0, 'add')]
+    assert records[0].headers == {'Content-Type': 'application/json', 'Accept': 'application/json'}
+    assert records[0].body == b'{"x": 1}'
+    assert records[1].body == b'\x00\xff' * 100
+    assert records[2].body == b''
+
+
+def test_traffic_log_invalid():
+    '''Tests that other files are rejected'''
+    with TemporaryDirectory() as tdir:
+        path = os.path.join(tdir, 'traffic.log')
+        with open(path, 'wb') as file:
+            file.write(b'not a log')
+        with pytest.raises(RecordingError):
+            list(read_records(path))
+
+
+def test_load_records_captures():
+    '''Tests that slow request captures can be replayed like traffic logs'''
+    with TemporaryDirectory() as tdir:
+        log = SlowRequestLog(0., tdir)
+        log.observe('add', dict(_HEADERS), b'{"x": 1}', {'total': 1.})
+        records = load_records(tdir)
+    assert [(r.method, r.body) for r in records] == [('add', b'{"x": 1}')]
+
+
+def test_schedule():
+    '''Tests original, scaled and unpaced schedules'''
+    with TemporaryDirectory() as tdir:
+        path = os.path.join(tdir, 'traffic.log')
+        recorder = TrafficRecorder(path)
+        for arrival in (100., 101., 103.):
+            recorder.record(arrival, 'add', _HEADERS, b'{}')
+        records = load_records(path)
+
+    assert [r.offset for r in schedule(records)] == [0., 1., 3.]
+    assert [r.offset for r in schedule(records, 2.)] == [0., .5, 1.5]
+    assert [r.offset for r in schedule(records, None)] == [None] * 3
+    assert schedule([]) == []
+
+
+def test_statistics():
+    '''Tests latency percentiles and throughput'''
+    values = [float(v) for v in range(1, 101)]
+    assert percentile(values, 50) == 50.
+    assert percentile(values, 99) == 99.
+    assert percentile(values, 100) == 100.
+    assert percentile([], 50) is None
+
+    stats = summarize([.002, .001, .003, .004], 1, 2.)
+    assert stats['requests'] == 5
+    assert stats['errors'] == 1
+    assert stats['rps'] == 2.
+    assert stats['p50'] == 2.
+    assert stats['max'] == 4.
+
+
+def test_run_load():
+    '''Tests that the load generator sends every request'''
+    requests = [LoadRequest(None, 'add', {'Content-Type': 'application/json'}, b'{"x": 1}')] * 20
+    with recording_server() as (base_url, received):
+        stats = run_load(base_url, requests, concurrency=4)
+    assert stats['requests'] == 20
+    assert stats['errors'] == 0
+    assert len(received) == 20
+    assert all(path == '/model/methods/add' and body == b'{"x": 1}' for path, _, body in received)
+
+    with recording_server(status=500) as (base_url, received):
+        stats = run_load(base_url, requests[:2])
+    assert stats['errors'] == 2
+
+
+def test_replay_cli():
+    '''Tests the replay command'''
+    with TemporaryDirectory() as tdir:
+        path = os.path.join(tdir, 'traffic.log')
+        json_path = os.path.join(tdir, 'results.json')
+        recorder = TrafficRecorder(path)
+        for arrival in (100., 100.01):
+            recorder.record(arrival, 'add', _HEADERS, b'{"x": 1}')
+
+        with recording_server() as (base_url, received):
+            assert run_replay_cli([path, '--url', base_url, '--fast', '--json', json_path]) == 0
+        assert os.path.isfile(json_path)
+    assert len(received) == 2
+    assert received[0][1]['Accept'] == 'application/json'
+
+
+if __name__ == '__main__':
+    '''Test area'''
+    pytest.main([__file__, ])
@@ -19,18 +19,31 @@
 '''
 Provides tests for the model runner
 '''
+import gzip
 import json
 import os
+import hashlib
+import time
+import shutil
+import signal
+import socket
 import contextlib
+import subprocess
 from tempfile import TemporaryDirectory
 from collections import Counter
+from typing import NamedTuple
 
 import pytest
 import requests
 from acumos.session import AcumosSession
 from acumos.modeling import Model, List, Dict, new_type
 
+from acumos_model_runner.runner import run_app_cli
 from acumos_model_runner.api import _JSON, _PROTO, _TEXT, _OCTET_STREAM
+from acumos_model_runner.capture import load_captures, replay_captures
+from acumos_model_runner.recording import read_records, run_replay_cli
+from acumos_model_runner.bench import run_bench
+from acumos_model_runner.bundle import load_bundle, run_precompile_cli
 
 from runner_helper import ModelRunner
 
@@ -327,6 +340,534 @@ def test_cors(model):
         assert headers['Access-Control-Allow-Origin'] == 'foobar.com'
 
 
+def test_tracing(model):
+    '''Tests that request spans are exported and continue the caller's trace'''
+    trace_id = '4bf92f3577b34da6a3ce929d0e0e4736'
+    traceparent = '00-{}-00f067aa0ba902b7-01'.format(trace_id)
+
+    with TemporaryDirectory() as tdir:
+        spans_path = os.path.join(tdir, 'spans.jsonl')
+        with _run_model(model, options={'trace-exporter': "file:{}".format(spans_path)}) as runner:
+            headers = {'Content-Type': _JSON, 'Accept': _JSON, 'traceparent': traceparent}
+            resp_json = runner.api._post_json('add', {'x': 1, 'y': 2}, headers)
+            assert int(resp_json['value']) == 3
+
+        with open(spans_path) as file:
+            spans = {span['name']: span for span in map(json.loads, file)}
+
+    assert set(spans) == {'request', 'decode', 'compute', 'encode'}
+    assert all(span['trace_id'] == trace_id for span in spans.values())
+    assert spans['request']['parent_id'] == '00f067aa0ba902b7'
+    assert spans['compute']['parent_id'] == spans['request']['span_id']
+    assert spans['request']['attributes']['method'] == 'add'
+
+
+def test_slow_request_capture(model):
+    '''Tests that slow requests are captured and can be replayed'''
+    with TemporaryDirectory() as tdir:
+        options = {'slow-request-threshold': 0, 'slow-request-capture-dir': tdir}
+        with _run_model(model, options=options) as runner:
+            runner.api.method('add', json={'x': 1, 'y': 2})
+            runner.api.method('count', proto={'strings': ['a', 'b']})
+
+            captures = list(load_captures(tdir))
+            assert [capture.method for capture in captures] == ['add', 'count']
+            assert captures[0].headers == {'Content-Type': _JSON, 'Accept': _JSON}
+            assert json.loads(captures[0].body.decode()) == {'x': 1, 'y': 2}
+            assert set(captures[1].timings) == {'decode', 'compute', 'encode', 'total'}
+
+            results = replay_captures(tdir, runner.config.base_url)
+            assert [status for _, status, _ in results] == [200] * len(results)
+
+
+def test_record_and_replay(model):
+    '''Tests that recorded traffic can be replayed against a runner'''
+    with TemporaryDirectory() as tdir:
+        log_path = os.path.join(tdir, 'traffic.log')
+        with _run_model(model, options={'record': log_path}) as runner:
+            runner.api.method('add', json={'x': 1, 'y': 2})
+            runner.api._post_octet_stream('rotate_image', data=b'image')
+
+        records = list(read_records(log_path))
+        assert [r.method for r in records] == ['add', 'rotate_image']
+        assert records[0].headers['Content-Type'] == _JSON
+        assert records[1].body == b'image'
+
+        with _run_model(model) as runner:
+            assert run_replay_cli([log_path, '--url', runner.config.base_url, '--rate', '10']) == 0
+
+
+def test_bench(model):
+    '''Tests that the benchmark covers every method and body type'''
+    with _dumped_model(model) as model_dir:
+        results = run_bench(model_dir, workers=(1, 2), concurrency=(1, 2), requests=5, warmup_requests=1)
+
+    assert all(row['errors'] == 0 and row['requests'] == 5 for row in results)
+    assert {(row['method'], row['body']) for row in results} == {
+        ('add', 'json'), ('add', 'protobuf'), ('count', 'json'), ('count', 'protobuf'), ('empty', 'json'), ('empty', 'protobuf'),
+        ('rotate_image', 'raw'), ('handle_dict', 'raw'), ('count_words', 'raw'), ('create_words', 'json'), ('create_words', 'protobuf')}
+    assert {(row['workers'], row['concurrency']) for row in results} == {(1, 1), (1, 2), (2, 1), (2, 2)}
+
+
+def test_calibrate(model):
+    '''Tests that calibration measures every configuration and is reused by later starts'''
+    from acumos_model_runner.calibration import calibrate, save_calibration, load_calibration
+
+    with _dumped_model(model) as model_dir:
+        calibration = calibrate(model_dir, 1000, workers=(1, 2), threads=(1, 2), concurrency=2, requests=10, warmup_requests=2)
+        assert {(row['workers'], row['threads']) for row in calibration['results']} == {(1, 1), (1, 2), (2, 1), (2, 2)}
+        assert all(row['errors'] == 0 for row in calibration['results'])
+
+        path = os.path.join(model_dir, 'calibration.json')
+        save_calibration(path, calibration)
+        assert load_calibration(path, model_dir)['choice'] == calibration['choice']
+
+        with ModelRunner(model_dir, options={'calibration': path}) as runner:
+            assert int(runner.api.method('add', json={'x': 1, 'y': 2})['value']) == 3
+
+
+def test_profile_startup(model):
+    '''Tests that the master and workers report their startup phases'''
+    with TemporaryDirectory() as tdir:
+        path = os.path.join(tdir, 'startup.jsonl')
+        with _run_model(model, options={'profile-startup': path, 'workers': 2}) as runner:
+            runner.api.method('add', json={'x': 1, 'y': 2})
+            for _ in range(50):
+                with open(path) as file:
+                    reports = [json.loads(line) for line in file]
+                if len(reports) == 3:
+                    break
+                time.sleep(0.1)
+
+    phases = {report['process']: [phase['name'] for phase in report['phases']] for report in reports}
+    assert sorted(report['process'] for report in reports) == ['master', 'worker', 'worker']
+    assert phases['master'] == ['load_bundle', 'create_oas']
+    assert phases['worker'] == ['add_api', 'load_model', 'read_methods']
+
+
+def test_precompile(model):
+    '''Tests that a precompiled model skips specification generation and still works'''
+    with _dumped_model(model) as model_dir:
+        assert run_precompile_cli([model_dir]) == 0
+        bundle = load_bundle(model_dir)
+        assert set(bundle.methods_info) == set(model.methods)
+        assert bundle.spec['paths']['/model/methods/add']['post']['consumes'] == [_JSON, _PROTO]
+
+        # byte code is compiled for the generated protobuf module
+        pyc_files = [f for _, _, files in os.walk(os.path.join(model_dir, 'model', 'scripts', 'acumos_gen')) for f in files if f.endswith('.pyc')]
+        assert pyc_files
+
+        with TemporaryDirectory() as tdir:
+            path = os.path.join(tdir, 'startup.jsonl')
+            with ModelRunner(model_dir, options={'profile-startup': path}) as runner:
+                assert int(runner.api.method('add', json={'x': 1, 'y': 2})['value']) == 3
+                assert runner.api._post_octet_stream('rotate_image', data=b'image') == b'image'
+
+            with open(path) as file:
+                master = [report for report in map(json.loads, file) if report['process'] == 'master'][0]
+            assert [phase['name'] for phase in master['phases']] == ['load_bundle']
+
+        # a bundle built with another Python version is rebuilt
+        manifest_path = os.path.join(bundle.path, 'manifest.json')
+        with open(manifest_path) as file:
+            manifest = json.load(file)
+        with open(manifest_path, 'w') as file:
+            json.dump(dict(manifest, python=[2, 7]), file)
+        assert load_bundle(model_dir).methods_info == bundle.methods_info
+        with open(manifest_path) as file:
+            assert json.load(file) == manifest
+
+        # a changed model invalidates the bundle
+        with open(os.path.join(model_dir, 'model.proto'), 'a') as file:
+            file.write('\n')
+        assert load_bundle(model_dir) is None
+
+
+def _replace_model(model_dir, model):
+    '''Overwrites the files of a dumped model with those of another model'''
+    with _dumped_model(model) as new_dir:
+        for name in os.listdir(new_dir):
+            path = os.path.join(new_dir, name)
+            if os.path.isfile(path):
+                shutil.copy(path, os.path.join(model_dir, name))
+
+
+@pytest.mark.parametrize('trigger', ['signal', 'endpoint', 'zygote', 'zygote-endpoint'])
+def test_reload(model, trigger):
+    '''Tests that the model directory is reloaded without restarting the runner'''
+    def add(x: int, y: int) -> int:
+        return x + y + 100
+
+    options = {'workers': 2}
+    if trigger.endswith('endpoint'):
+        options['reload-endpoint'] = ''
+    if trigger.startswith('zygote'):
+        options['zygote'] = ''
+
+    # the runner master is a child of this process, which must not be signalled instead of the master
+    misdirected = []
+    previous_handler = signal.signal(signal.SIGHUP, lambda signum, frame: misdirected.append(signum))
+    try:
+        with _dumped_model(model) as model_dir:
+            with ModelRunner(model_dir, options=options) as runner:
+                assert int(runner.api.method('add', json={'x': 1, 'y': 2})['value']) == 3
+                _replace_model(model_dir, Model(add=add))
+
+                if trigger in ('signal', 'zygote'):
+                    os.kill(runner._child.pid, signal.SIGHUP)
+                else:
+                    resp = requests.post(runner.api._full_url('/admin/reload'))
+                    assert resp.status_code == 202
+
+                for _ in range(100):
+                    values = {int(runner.api.method('add', json={'x': 1, 'y': 2})['value']) for _ in range(10)}
+                    if values == {103}:
+                        break
+                    time.sleep(0.1)
+                assert values == {103}
+
+                # methods removed from the new version are no longer routed
+                resp = requests.post(runner.api.resolve_method('count'), json={'strings': ['a']})
+                assert resp.status_code == 404
+    finally:
+        signal.signal(signal.SIGHUP, previous_handler)
+    assert misdirected == []
+
+
+def test_reload_while_loading():
+    '''Tests that a reload forwarded to a worker that is still loading the model is carried out once it has loaded'''
+    def add(x: int, y: int) -> int:
+        time.sleep(0.2)
+        return x + y
+
+    def new_add(x: int, y: int) -> int:
+        return x + y + 100
+
+    with _dumped_model(Model(add=add)) as model_dir:
+        with ModelRunner(model_dir, options={'warmup': '', 'warmup-rounds': 10}) as runner:
+            workers = _worker_pids(runner._child.pid)
+            _replace_model(model_dir, Model(add=new_add))
+            os.kill(runner._child.pid, signal.SIGHUP)  # the worker is still warming up the model
+
+            for _ in range(200):
+                try:
+                    value = int(runner.api.method('add', json={'x': 1, 'y': 2})['value'])
+                except requests.RequestException:
+                    value = None
+                if value == 103:
+                    break
+                time.sleep(0.1)
+            assert value == 103
+            assert _worker_pids(runner._child.pid) == workers  # the worker was not killed by the forwarded signal
+
+
+@pytest.mark.parametrize('options', [None, {'background-load': ''}, {'background-load': '', 'warmup': ''}])
+def test_health(model, options):
+    '''Tests that workers report readiness once the model is loaded'''
+    with _run_model(model, options=options) as runner:
+        assert runner.api.get('/health/live').json() == {'status': 'live'}
+        for _ in range(100):
+            resp = requests.get(runner.api._full_url('/health/ready'))
+            if resp.status_code == 200:
+                break
+            assert resp.status_code == 503
+            assert 'Retry-After' in resp.headers
+            time.sleep(0.1)
+        assert resp.json() == {'status': 'ready', 'generation': 1}
+        assert int(runner.api.method('add', json={'x': 1, 'y': 2})['value']) == 3
+
+
+def test_warmup(model, tmpdir):
+    '''Tests that warmup calls every method with every body type without recording traffic'''
+    from acumos_model_runner.runner import _write_oas
+    from acumos_model_runner.server import _build_app
+    from acumos_model_runner.warmup import warm_up
+    from acumos_model_runner.recording import TrafficRecorder
+
+    log_path = str(tmpdir.join('traffic.log'))
+    samples_dir = tmpdir.mkdir('samples')
+    samples_dir.join('add.json').write('{"x": 1, "y": 2}')
+
+    with _dumped_model(model) as model_dir:
+        _write_oas(model_dir)
+        app = _build_app(model_dir, None, traffic_recorder=TrafficRecorder(log_path))
+        results = warm_up(app, str(samples_dir), rounds=2)
+
+    assert {(r['method'], r['body']) for r in results} >= {('add', 'json'), ('add', 'protobuf'), ('rotate_image', 'raw')}
+    assert all(len(r['timings']) == 2 for r in results)
+    assert all(r['status'] == 200 for r in results if r['method'] == 'add')
+    assert not os.path.exists(log_path)
+    assert app.traffic_recorder is not None
+
+
+def _worker_pids(master_pid):
+    '''Returns the set of worker process ids of a runner'''
+    output = subprocess.run(['pgrep', '-P', str(master_pid)], stdout=subprocess.PIPE).stdout
+    return set(int(pid) for pid in output.split())
+
+
+def test_zygote(model):
+    '''Tests that workers forked from the zygote serve the model immediately, including replacement workers'''
+    with _run_model(model, options={'zygote': '', 'workers': 2}) as runner:
+        assert runner.api.get('/health/ready').json() == {'status': 'ready', 'generation': 1}
+        for _ in range(100):  # gunicorn spawns workers a moment apart
+            workers = _worker_pids(runner._child.pid)
+            if len(workers) == 2:
+                break
+            time.sleep(0.05)
+        assert len(workers) == 2
+
+        killed = workers.pop()
+        os.kill(killed, signal.SIGKILL)
+        for _ in range(100):
+            replaced = _worker_pids(runner._child.pid)
+            if len(replaced) == 2 and killed not in replaced:
+                break
+            time.sleep(0.05)
+        assert len(replaced) == 2 and killed not in replaced
+
+        for _ in range(10):
+            assert int(runner.api.method('add', json={'x': 1, 'y': 2})['value']) == 3
+
+
+def test_memory_watchdog(model):
+    '''Tests that workers over the memory limit are replaced without failing requests'''
+    options = {'workers': 2, 'memory-limit': 1, 'memory-recycle-interval': 0}
+    with _run_model(model, options=options) as runner:
+        workers = _worker_pids(runner._child.pid)
+        for _ in range(20):
+            assert int(runner.api.method('add', json={'x': 1, 'y': 2})['value']) == 3
+            time.sleep(0.1)
+
+        assert not workers & _worker_pids(runner._child.pid)
+        assert '\nacumos_worker_memory_recycles_total ' in runner.api.get('/metrics').text
+
+
+def test_multi_model(model):
+    '''Tests that a directory of models is served under /models/<name> with models loaded on first use'''
+    def add(x: int, y: int) -> int:
+        return x + y + 100
+
+    with TemporaryDirectory() as models_dir:
+        session = AcumosSession()
+        session.dump(model, 'first', models_dir)
+        session.dump(Model(add=add), 'second', models_dir)
+
+        with ModelRunner(models_dir, options={'multi-model': '', 'max-models': 1}) as runner:
+            def call_add(name):
+                resp = requests.post(runner.api._full_url("/models/{}/model/methods/add".format(name)), json={'x': 1, 'y': 2},
+                                     headers={'Accept': _JSON})
+                resp.raise_for_status()
+                return int(resp.json()['value'])
+
+            assert runner.api.get('/models').json()['resident'] == []
+            assert call_add('first') == 3
+            assert call_add('second') == 103
+            assert call_add('first') == 3
+
+            resident = runner.api.get('/models').json()['resident']
+            assert [m['name'] for m in resident] == ['first']
+
+            metrics = runner.api.get('/metrics').text
+            assert 'acumos_model_evictions_total{model="first"' in metrics
+            assert requests.get(runner.api._full_url('/models/missing/model/methods/add')).status_code == 404
+
+
+@pytest.mark.skipif(not hasattr(os, 'sched_getaffinity'), reason='CPU affinity requires Linux')
+def test_cpu_affinity(model):
+    '''Tests that each worker is pinned to its own group of the allowed CPUs'''
+    cpus = sorted(os.sched_getaffinity(0))
+    workers = max(1, min(2, len(cpus)))
+    with _run_model(model, options={'cpu-affinity': '', 'workers': workers}) as runner:
+        assert int(runner.api.method('add', json={'x': 1, 'y': 2})['value']) == 3
+        groups = [os.sched_getaffinity(pid) for pid in _worker_pids(runner._child.pid)]
+
+    assert len(groups) == workers
+    assert all(groups) and set().union(*groups) == set(cpus)
+    assert sum(len(group) for group in groups) == len(cpus)  # disjoint
+
+
+def test_unix_socket(model):
+    '''Tests that the runner serves on a Unix domain socket with --bind'''
+    with TemporaryDirectory() as tdir:
+        path = os.path.join(tdir, 'model.sock')
+        with _run_model(model, options={'bind': "unix:{}".format(path)}):
+            time.sleep(0.5)
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+                sock.connect(path)
+                sock.sendall(b'GET /health/ready HTTP/1.0\r\n\r\n')
+                status_line = sock.makefile('rb').readline()
+
+    assert status_line.split()[1] == b'200'
+
+
+def _listening_sockets(port):
+    '''Returns the number of IPv4 sockets listening on a port'''
+    with open('/proc/net/tcp') as file:
+        next(file)
+        return sum(1 for line in file if line.split()[1].endswith(":{:04X}".format(port)) and line.split()[3] == '0A')
+
+
+@pytest.mark.skipif(not os.path.exists('/proc/net/tcp'), reason='Requires Linux')
+def test_reuse_port(model):
+    '''Tests that each worker listens on its own socket, and that connections are served'''
+    with _run_model(model, options={'reuse-port': '', 'workers': 2}) as runner:
+        time.sleep(0.5)
+        for _ in range(20):
+            resp = requests.post(runner.api.resolve_method('add'), json={'x': 1, 'y': 2},
+                                 headers={'Accept': _JSON, 'Connection': 'close'})
+            assert int(resp.json()['value']) == 3
+        assert _listening_sockets(runner.config.port) >= 2  # one per worker, and the master's with gunicorn < 24
+
+
+def test_http2(model):
+    '''Tests that method requests are served over HTTP/2 with prior knowledge, and over HTTP/1.1'''
+    pytest.importorskip('hypercorn')
+    httpx = pytest.importorskip('httpx')
+    with _run_model(model, options={'http2': '', 'threads': 4}) as runner:
+        time.sleep(0.5)
+        with httpx.Client(http1=False, http2=True) as client:
+            for _ in range(3):
+                resp = client.post(runner.api.resolve_method('add'), json={'x': 1, 'y': 2}, headers={'Accept': _JSON})
+                assert resp.http_version == 'HTTP/2'
+                assert int(resp.json()['value']) == 3
+
+            resp = client.post(runner.api.resolve_method('rotate_image'), content=b'image',
+                               headers={'Content-Type': _OCTET_STREAM, 'Accept': _OCTET_STREAM})
+            assert resp.content == b'image'
+
+        assert int(runner.api.method('add', json={'x': 1, 'y': 2})['value']) == 3
+
+
+def test_http2_stream_input_rejected(tmpdir, capsys):
+    '''Tests that streamed inputs, which HTTP/2 workers cannot provide, are rejected with --http2'''
+    with pytest.raises(SystemExit) as exc_info:
+        run_app_cli([str(tmpdir), '--http2', '--stream-input', 'file'])
+    assert exc_info.value.code == 2
+    assert '--stream-input cannot be used with --http2' in capsys.readouterr().err
+
+
+@pytest.mark.parametrize('mode', ['file', 'buffer'])
+def test_stream_input(mode):
+    '''Tests that raw binary and text inputs are passed to methods as streams or buffers'''
+    Image = new_type(raw_type=bytes, name="Image")
+    Text = new_type(str, 'Text')
+
+    def checksum(img: Image) -> Image:
+        return hashlib.sha256(img.read() if mode == 'file' else bytes(img)).digest()
+
+    def count_words(text: Text) -> int:
+        return len((text.read() if mode == 'file' else text).split(u' '))
+
+    image = bytes(range(256)) * 4096
+    with _run_model(Model(checksum=checksum, count_words=count_words), options={'stream-input': mode}) as runner:
+        assert runner.api._post_octet_stream('checksum', image) == hashlib.sha256(image).digest()
+        words = runner.api._post_text_stream('count_words', " ".join(["éééé"] * 100).encode('utf-8'), accept=_JSON)
+        assert json.loads(words.decode())['value'] == '100'
+
+
+def test_stream_input_length():
+    '''Tests that a buffered input grows with the body received rather than with the Content-Length announced'''
+    Image = new_type(raw_type=bytes, name="Image")
+
+    def checksum(img: Image) -> Image:
+        return hashlib.sha256(bytes(img)).digest()
+
+    with _run_model(Model(checksum=checksum), options={'stream-input': 'buffer'}) as runner:
+        with socket.create_connection(('localhost', runner.config.port)) as sock:
+            sock.sendall(b'POST /model/methods/checksum HTTP/1.0\r\nContent-Type: application/octet-stream\r\n'
+                         b'Accept: application/octet-stream\r\nContent-Length: 1000000000000\r\n\r\n' + b'x' * 10)
+            sock.shutdown(socket.SHUT_WR)
+            status_line = sock.makefile('rb').readline()
+        assert status_line.split()[1] == b'400'
+
+        # the worker was not killed by the request
+        assert runner.api._post_octet_stream('checksum', b'abc') == hashlib.sha256(b'abc').digest()
+
+
+def test_stream_output():
+    '''Tests that raw outputs returned as iterators and large JSON outputs are streamed'''
+    Image = new_type(raw_type=bytes, name="Image")
+
+    def chunks(n: int) -> Image:
+        return (bytes([i]) * 1024 for i in range(n))
+
+    def count(strings: List[str]) -> Dict[str, int]:
+        return Counter(strings)
+
+    strings = ["word{}".format(i) for i in range(10000)]
+    with _run_model(Model(chunks=chunks, count=count), options={'stream-output-threshold': 1024}) as runner:
+        resp = requests.post(runner.api.resolve_method('chunks'), json={'n': 3}, headers={'Accept': _OCTET_STREAM}, stream=True)
+        assert resp.headers.get('Transfer-Encoding') == 'chunked'
+        assert resp.content == b''.join(bytes([i]) * 1024 for i in range(3))
+
+        resp = requests.post(runner.api.resolve_method('count'), json={'strings': strings}, headers={'Accept': _JSON})
+        assert resp.headers.get('Transfer-Encoding') == 'chunked'
+        assert {k: int(v) for k, v in resp.json()['value'].items()} == {s: 1 for s in strings}
+
+        resp_json = runner.api.method('count', json={'strings': ['a', 'b', 'a']})
+        assert {k: int(v) for k, v in resp_json['value'].items()} == {'a': 2, 'b': 1}
+
+
+def test_stream_output_json():
+    '''Tests that a streamed JSON output is encoded as the buffered JSON output of the same message'''
+    Inner = NamedTuple('Inner', [('name', str), ('scale', float)])
+    Summary = NamedTuple('Summary', [('inner', Inner), ('values', List[int]), ('labels', Dict[str, Inner])])
+
+    def count(strings: List[str]) -> Dict[str, int]:
+        return Counter(strings)
+
+    def summarize(n: int) -> Summary:
+        return Summary(Inner('values', 0.5), list(range(n)), {str(i): Inner(str(i), i / 2) for i in range(n // 10)})
+
+    strings = ["word{}".format(i % 3000) for i in range(10000)]
+    responses = []
+    for options in ({'stream-output-threshold': 1024}, None):
+        with _run_model(Model(count=count, summarize=summarize), options=options) as runner:
+            responses.append([requests.post(runner.api.resolve_method('count'), json={'strings': strings},
+                                            headers={'Accept': _JSON}),
+                              requests.post(runner.api.resolve_method('summarize'), json={'n': 10000},
+                                            headers={'Accept': _JSON})])
+    for streamed, buffered in zip(*responses):
+        assert streamed.status_code == buffered.status_code == 200
+        assert streamed.headers.get('Transfer-Encoding') == 'chunked'
+        assert buffered.headers.get('Transfer-Encoding') is None
+        assert streamed.json() == buffered.json()
+
+
+def test_compression():
+    '''Tests that large method responses are compressed with the negotiated encoding and compressed outputs are not'''
+    Image = new_type(raw_type=bytes, name="Image")
+
+    def count(strings: List[str]) -> Dict[str, int]:
+        return Counter(strings)
+
+    def archive(n: int) -> Image:
+        return gzip.compress(b'x' * n)
+
+    strings = ["word{}".format(i) for i in range(10000)]
+    options = {'compression-threshold': 1024, 'compression-level': 'gzip=9'}
+    with _run_model(Model(count=count, archive=archive), options=options) as runner:
+        resp = requests.post(runner.api.resolve_method('count'), json={'strings': strings},
+                             headers={'Accept': _JSON, 'Accept-Encoding': 'gzip'})
+        assert resp.headers['Content-Encoding'] == 'gzip'
+        assert 'Accept-Encoding' in resp.headers['Vary']
+        assert {k: int(v) for k, v in resp.json()['value'].items()} == {s: 1 for s in strings}
+
+        resp = requests.post(runner.api.resolve_method('count'), json={'strings': strings},
+                             headers={'Accept': _JSON, 'Accept-Encoding': 'identity'})
+        assert 'Content-Encoding' not in resp.headers
+
+        resp = requests.post(runner.api.resolve_method('count'), json={'strings': ['a']},
+                             headers={'Accept': _JSON, 'Accept-Encoding': 'gzip'})
+        assert 'Content-Encoding' not in resp.headers  # below the threshold
+
+        resp = requests.post(runner.api.resolve_method('archive'), json={'n': 10000},
+                             headers={'Accept': _OCTET_STREAM, 'Accept-Encoding': 'gzip'})
+        assert 'Content-Encoding' not in resp.headers
+        assert gzip.decompress(resp.content) == b'x' * 10000
+
+
 if __name__ == '__main__':
     '''Test area'''
     pytest.main([__file__, ])
@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+# ===============LICENSE_START=======================================================
+# Acumos Apache-2.0
+# ===================================================================================
+# Copyright (C) 2017-2018 AT&T Intellectual Property & Tech Mahindra. All rights reserved.
+# ===================================================================================
+# This Acumos software file is distributed by AT&T and Tech Mahindra
+# under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# This file is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ===============LICENSE_END=========================================================
+'''
+Provides tests for sample input synthesis
+'''
+import os
+
+import pytest
+from google.protobuf.descriptor_pb2 import DescriptorProto
+from google.protobuf.descriptor_pool import DescriptorPool
+from google.protobuf.json_format import ParseDict
+
+from acumos_model_runner.descriptors import parse_pb2_source
+from acumos_model_runner.samples import synthesize_message
+
+
+_DESCRIPTORS_DIR = os.path.join(os.path.dirname(__file__), 'data', 'descriptors')
+
+
+def _load_pool(*names):
+    '''Returns a descriptor pool with the files of the generated test modules `names`'''
+    pool = DescriptorPool()
+    for name in names:
+        with open(os.path.join(_DESCRIPTORS_DIR, "{}_pb2.py".format(name))) as file:
+            pool.Add(parse_pb2_source(file.read()))
+    return pool
+
+
+def test_synthesize_sample_proto():
+    '''Tests synthesis of flat, repeated, map and nested fields'''
+    pool = _load_pool('sample')
+    assert synthesize_message(pool.FindMessageTypeByName('MessageA')) == {'x': 'acumos', 'y': 1}
+    assert synthesize_message(pool.FindMessageTypeByName('MessageB')) == {'texts': ['acumos'] * 3, 'counter': {'acumos': 1}}
+    assert synthesize_message(pool.FindMessageTypeByName('Outer')) == {'inner': {'x': 1}}
+    assert synthesize_message(pool.FindMessageTypeByName('Outer.Inner')) == {'x': 1}
+
+
+def test_synthesize_nested_and_oneof():
+    '''Tests enums, maps of messages and that a single field of each oneof is set'''
+    pool = _load_pool('nested')
+    choice = pool.FindMessageTypeByName('nested.Choice')
+    msg_dict = synthesize_message(choice)
+    assert msg_dict == {'text': 'acumos'}
+
+    outer = pool.FindMessageTypeByName('nested.Outer')
+    msg_dict = synthesize_message(outer)
+    assert msg_dict['levels'] == {'1': 'LOW'}
+    assert msg_dict['middle']['inner_by_name']['acumos'] == {'kind': 'A', 'values': [1.5] * 3}
+    assert msg_dict['inners'] == [{'kind': 'A', 'values': [1.5] * 3}] * 3
+
+
+def test_synthesize_recursive():
+    '''Tests truncation of recursive messages'''
+    msg_dict = synthesize_message(DescriptorProto.DESCRIPTOR)
+    ParseDict(msg_dict, DescriptorProto())
+
+    depth = 0
+    while msg_dict:
+        msg_dict = msg_dict['nested_type'][0]
+        depth += 1
+    assert depth == 4
+
+
+if __name__ == '__main__':
+    '''Test area'''
+    pytest.main([__file__, ])
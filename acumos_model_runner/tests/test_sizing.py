@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+# ===============LICENSE_START=======================================================
+# Acumos Apache-2.0
+# ===================================================================================
+# Copyright (C) 2017-2018 AT&T Intellectual Property & Tech Mahindra. All rights reserved.
+# ===================================================================================
+# This Acumos software file is distributed by AT&T and Tech Mahindra
+# under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# This file is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ===============LICENSE_END=========================================================
+'''
+Provides tests for automatic worker sizing
+'''
+import os
+
+import pytest
+
+from acumos_model_runner.sizing import cpu_limit, memory_limit, measure_worker_memory, plan, set_blas_threads, Sizing
+
+_MIB = 1024 * 1024
+
+
+def _cgroup(tmpdir, files):
+    '''Writes cgroup files and returns the cgroup root'''
+    for path, content in files.items():
+        tmpdir.join(path).write(content, ensure=True)
+    return str(tmpdir)
+
+
+@pytest.mark.parametrize('files, expected', [
+    ({'cpu.max': '150000 100000\n'}, 1.5),
+    ({'cpu/cpu.cfs_quota_us': '50000\n', 'cpu/cpu.cfs_period_us': '100000\n'}, 0.5),
+])
+def test_cpu_quota(tmpdir, files, expected):
+    '''Tests that cgroup v2 and v1 CPU quotas below the available CPUs are applied'''
+    if len(os.sched_getaffinity(0)) < 2:
+        expected = min(expected, 1)
+    assert cpu_limit(_cgroup(tmpdir, files)) == expected
+
+
+@pytest.mark.parametrize('files', [
+    {'cpu.max': 'max 100000\n'},
+    {'cpu/cpu.cfs_quota_us': '-1\n', 'cpu/cpu.cfs_period_us': '100000\n'},
+    {},
+])
+def test_cpu_unlimited(tmpdir, files):
+    '''Tests that the CPUs the process may run on are used without a quota'''
+    assert cpu_limit(_cgroup(tmpdir, files)) == len(os.sched_getaffinity(0))
+
+
+def test_memory_limit(tmpdir):
+    '''Tests that cgroup v2 and v1 memory limits are read, and that unlimited cgroups fall back to physical memory'''
+    physical = os.sysconf('SC_PHYS_PAGES') * os.sysconf('SC_PAGE_SIZE')
+    assert memory_limit(_cgroup(tmpdir.mkdir('v2'), {'memory.max': '1073741824\n'})) == 1024 * _MIB
+    assert memory_limit(_cgroup(tmpdir.mkdir('v1'), {'memory/memory.limit_in_bytes': '536870912\n'})) == 512 * _MIB
+    assert memory_limit(_cgroup(tmpdir.mkdir('v2max'), {'memory.max': 'max\n'})) == physical
+    assert memory_limit(_cgroup(tmpdir.mkdir('v1max'), {'memory/memory.limit_in_bytes': '9223372036854771712\n'})) == physical
+
+
+def test_plan():
+    '''Tests that workers fit the CPUs and memory, and that spare CPUs go to request and BLAS threads'''
+    assert plan(4, None, 100 * _MIB, 100 * _MIB) == Sizing(4, 1, 1)
+    assert plan(0.5, None, 100 * _MIB, 100 * _MIB) == Sizing(1, 1, 1)
+    # 1000MiB * 0.9 - 200MiB for the master leaves room for 3 workers of 200MiB
+    assert plan(8, 1000 * _MIB, 100 * _MIB, 100 * _MIB) == Sizing(3, 2, 1)
+    assert plan(8, 100 * _MIB, 100 * _MIB, 100 * _MIB) == Sizing(1, 8, 1)
+    assert plan(8, None, 100 * _MIB, 100 * _MIB, workers=2, threads=1) == Sizing(2, 1, 4)
+
+
+def test_set_blas_threads():
+    '''Tests that thread counts are set for native libraries unless already configured'''
+    environ = {'MKL_NUM_THREADS': '3'}
+    set_blas_threads(2, environ)
+    assert environ['OMP_NUM_THREADS'] == environ['OPENBLAS_NUM_THREADS'] == '2'
+    assert environ['MKL_NUM_THREADS'] == '3'
+
+
+def test_measure_worker_memory():
+    '''Tests that the memory of the serving stack is measured in a subprocess'''
+    base, model = measure_worker_memory()
+    assert base > 10 * _MIB
+    assert model == 0
+
+
+if __name__ == '__main__':
+    '''Test area'''
+    pytest.main([__file__, ])
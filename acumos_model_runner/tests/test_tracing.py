@@ -0,0 +1,156 @@
+# -*- coding: utf-8 -*-
+# ===============LICENSE_START=======================================================
+# Acumos Apache-2.0
+# ===================================================================================
+# Copyright (C) 2017-2018 AT&T Intellectual Property & Tech Mahindra. All rights reserved.
+# ===================================================================================
+# This Acumos software file is distributed by AT&T and Tech Mahindra
+# under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# This file is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ===============LICENSE_END=========================================================
+'''
+Provides tests for request tracing
+'''
+import json
+import os
+import threading
+from tempfile import TemporaryDirectory
+
+import pytest
+
+from acumos_model_runner.tracing import (Tracer, SpanContext, InMemoryExporter, FileExporter, CollectorExporter,
+                                         parse_traceparent, format_traceparent, inject, create_exporter, _ThreadLocalVar)
+
+
+_TRACE_ID = '4bf92f3577b34da6a3ce929d0e0e4736'
+_SPAN_ID = '00f067aa0ba902b7'
+_TRACEPARENT = '00-{}-{}-01'.format(_TRACE_ID, _SPAN_ID)
+
+
+def test_parse_traceparent():
+    '''Tests parsing of valid and invalid traceparent headers'''
+    assert parse_traceparent(_TRACEPARENT) == SpanContext(_TRACE_ID, _SPAN_ID, 1, None)
+    assert parse_traceparent(_TRACEPARENT, 'k=v').tracestate == 'k=v'
+    assert format_traceparent(parse_traceparent(_TRACEPARENT)) == _TRACEPARENT
+
+    # future versions may append fields
+    assert parse_traceparent('01-{}-{}-00-extra'.format(_TRACE_ID, _SPAN_ID)).flags == 0
+
+    for invalid in (None, '', 'garbage', _TRACEPARENT + '-extra',
+                    'ff-{}-{}-01'.format(_TRACE_ID, _SPAN_ID),
+                    '00-{}-{}-01'.format('0' * 32, _SPAN_ID),
+                    '00-{}-{}-01'.format(_TRACE_ID, '0' * 16)):
+        assert parse_traceparent(invalid) is None
+
+
+def test_span_hierarchy():
+    '''Tests that nested spans share a trace and are exported in completion order'''
+    exporter = InMemoryExporter()
+    tracer = Tracer(exporter)
+
+    with tracer.span('request', _TRACEPARENT, method='add') as request:
+        with tracer.span('decode'):
+            pass
+        with tracer.span('compute') as compute:
+            headers = inject({'Accept': 'application/json'})
+
+    assert [span.name for span in exporter.spans] == ['decode', 'compute', 'request']
+    assert all(span.context.trace_id == _TRACE_ID for span in exporter.spans)
+    assert request.parent_id == _SPAN_ID
+    assert compute.parent_id == request.context.span_id
+    assert request.attributes == {'method': 'add'}
+    assert all(span.duration >= 0 for span in exporter.spans)
+
+    # outgoing calls made during a span continue the same trace
+    assert headers['traceparent'] == format_traceparent(compute.context)
+    assert inject() == {}
+
+
+def test_span_new_trace():
+    '''Tests that a missing or invalid traceparent starts a new trace'''
+    exporter = InMemoryExporter()
+    tracer = Tracer(exporter)
+
+    with tracer.span('request', 'invalid') as span:
+        pass
+    assert span.parent_id is None
+    assert span.context.trace_id != _TRACE_ID
+
+
+def test_span_unsampled():
+    '''Tests that unsampled spans are propagated but not exported'''
+    exporter = InMemoryExporter()
+    tracer = Tracer(exporter)
+
+    with tracer.span('request', '00-{}-{}-00'.format(_TRACE_ID, _SPAN_ID)):
+        assert inject()['traceparent'].endswith('-00')
+    assert exporter.spans == []
+
+
+def test_span_error():
+    '''Tests that errors are recorded on spans'''
+    exporter = InMemoryExporter()
+    tracer = Tracer(exporter)
+
+    with pytest.raises(ValueError):
+        with tracer.span('compute'):
+            raise ValueError('bad input')
+    assert exporter.spans[0].error == 'ValueError: bad input'
+
+
+def test_file_exporter():
+    '''Tests that the file exporter writes JSON lines'''
+    with TemporaryDirectory() as tdir:
+        path = os.path.join(tdir, 'spans.jsonl')
+        tracer = Tracer(create_exporter("file:{}".format(path)))
+        with tracer.span('request', _TRACEPARENT):
+            with tracer.span('compute'):
+                pass
+
+        with open(path) as file:
+            spans = [json.loads(line) for line in file]
+
+    assert [span['name'] for span in spans] == ['compute', 'request']
+    assert spans[1]['parent_id'] == _SPAN_ID
+
+
+def test_thread_local_var():
+    '''Tests that the Python 3.6 stand-in for ContextVar nests values and keeps them per thread'''
+    var = _ThreadLocalVar('span', default=None)
+    token = var.set('request')
+    inner = var.set('compute')
+    assert var.get() == 'compute'
+    var.reset(inner)
+    assert var.get() == 'request'
+
+    seen = []
+    thread = threading.Thread(target=lambda: seen.append(var.get()))
+    thread.start()
+    thread.join()
+    assert seen == [None]
+
+    var.reset(token)
+    assert var.get() is None
+
+
+def test_create_exporter():
+    '''Tests exporter specs'''
+    assert isinstance(create_exporter('file:/tmp/spans.jsonl'), FileExporter)
+    assert isinstance(create_exporter('http://localhost:4318/spans'), CollectorExporter)
+
+    for spec in ('zipkin', 'memory'):
+        with pytest.raises(ValueError):
+            create_exporter(spec)
+
+
+if __name__ == '__main__':
+    '''Test area'''
+    pytest.main([__file__, ])
@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+# ===============LICENSE_START=======================================================
+# Acumos Apache-2.0
+# ===================================================================================
+# Copyright (C) 2017-2018 AT&T Intellectual Property & Tech Mahindra. All rights reserved.
+# ===================================================================================
+# This Acumos software file is distributed by AT&T and Tech Mahindra
+# under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# This file is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ===============LICENSE_END=========================================================
+'''
+Provides tests for the memory watchdog
+'''
+import pytest
+
+from acumos_model_runner.metrics import Registry
+from acumos_model_runner.watchdog import MemoryWatchdog
+
+
+def _watchdog(state_path, memory, **kwargs):
+    '''Returns a watchdog with a limit of 100 bytes that measures `memory` bytes'''
+    watchdog = MemoryWatchdog(100, state_path, check_interval=0, **kwargs)
+    watchdog._measure = lambda: memory
+    return watchdog
+
+
+def test_recycle(tmpdir):
+    '''Tests that only workers over the limit are recycled'''
+    state_path = str(tmpdir.join('state'))
+    assert not _watchdog(state_path, 100).should_recycle()
+    assert not _watchdog(state_path, None).should_recycle()
+
+    watchdog = _watchdog(state_path, 101)
+    assert watchdog.should_recycle()
+    assert watchdog.recycles() == 1
+
+
+def test_stagger(tmpdir):
+    '''Tests that workers over the limit are not recycled within the stagger interval of each other'''
+    state_path = str(tmpdir.join('state'))
+    first, second = _watchdog(state_path, 200, stagger=60), _watchdog(state_path, 200, stagger=60)
+    assert first.should_recycle()
+    assert not second.should_recycle()
+    assert second.recycles() == 1
+
+    third = _watchdog(state_path, 200, stagger=0)
+    assert third.should_recycle()
+    assert third.recycles() == 2
+
+
+def test_check_interval(tmpdir):
+    '''Tests that memory is measured at most once per check interval'''
+    watchdog = MemoryWatchdog(100, str(tmpdir.join('state')), check_interval=60)
+    measurements = []
+    watchdog._measure = lambda: measurements.append(True) or 50
+    for _ in range(10):
+        watchdog.should_recycle()
+    assert len(measurements) == 1
+
+
+def test_metrics(tmpdir):
+    '''Tests that the memory and the number of recycles are exposed as metrics'''
+    registry = Registry()
+    watchdog = _watchdog(str(tmpdir.join('state')), 200, measure='uss', metrics=registry)
+    watchdog.should_recycle()
+
+    metrics = registry.render()
+    assert 'acumos_worker_memory_bytes{measure="uss",pid="' in metrics
+    assert '"} 200\n' in metrics
+    assert registry.counter('acumos_worker_memory_recycles_total', '').value() == 1
+    assert '\nacumos_worker_memory_recycles_total 1\n' in metrics  # the count of all workers, so without a pid
+
+
+def test_invalid_measure(tmpdir):
+    '''Tests that unknown memory measures are rejected'''
+    with pytest.raises(ValueError):
+        MemoryWatchdog(100, str(tmpdir.join('state')), measure='vms')
+
+
+if __name__ == '__main__':
+    '''Test area'''
+    pytest.main([__file__, ])
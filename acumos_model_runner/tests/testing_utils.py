@@ -19,8 +19,12 @@
 '''
 Provides testing utilities
 '''
+import threading
+import contextlib
 from functools import partial
 from os.path import dirname
+from socketserver import ThreadingMixIn
+from http.server import HTTPServer, BaseHTTPRequestHandler
 
 from acumos_model_runner.utils import load_data
 
@@ -28,3 +32,35 @@ from acumos_model_runner.utils import load_data
 _TEST_DIR = dirname(__file__)
 
 load_testing_data = partial(load_data, prefix=_TEST_DIR)
+
+
+@contextlib.contextmanager
+def recording_server(status=200):
+    '''Runs an HTTP server that records POSTed (path, headers, body) tuples. Yields (base_url, received)'''
+    received = []
+
+    class Handler(BaseHTTPRequestHandler):
+
+        protocol_version = 'HTTP/1.1'
+
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers['Content-Length']))
+            received.append((self.path, dict(self.headers), body))
+            self.send_response(status)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+
+        def log_message(self, *args):
+            pass
+
+    class Server(ThreadingMixIn, HTTPServer):
+        daemon_threads = True
+
+    server = Server(('localhost', 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield "http://localhost:{}".format(server.server_port), received
+    finally:
+        server.shutdown()
+        server.server_close()
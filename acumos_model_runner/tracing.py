@@ -0,0 +1,275 @@
+# -*- coding: utf-8 -*-
+# ===============LICENSE_START=======================================================
+# Acumos Apache-2.0
+# ===================================================================================
+# Copyright (C) 2017-2018 AT&T Intellectual Property & Tech Mahindra. All rights reserved.
+# ===================================================================================
+# This Acumos software file is distributed by AT&T and Tech Mahindra
+# under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# This file is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ===============LICENSE_END=========================================================
+"""
+Provides W3C trace context propagation and request spans
+"""
+import os
+import re
+import json
+import time
+import queue
+import threading
+import contextlib
+from collections import namedtuple
+
+try:
+    from contextvars import ContextVar
+except ImportError:  # Python 3.6
+    ContextVar = None
+
+
+TRACEPARENT = 'traceparent'
+TRACESTATE = 'tracestate'
+
+_TRACEPARENT_RE = re.compile(r'^([0-9a-f]{2})-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})(-.*)?$')
+_INVALID_TRACE_ID = '0' * 32
+_INVALID_SPAN_ID = '0' * 16
+_SAMPLED = 0x01
+
+SpanContext = namedtuple('SpanContext', 'trace_id, span_id, flags, tracestate')
+SpanContext.__new__.__defaults__ = (_SAMPLED, None)
+
+
+class _ThreadLocalVar(threading.local):
+    '''Stands in for a ContextVar with a thread-local value where contextvars is not available
+
+    Requests are handled on one thread each with the gunicorn workers available on Python 3.6, so the active span of a
+    thread is the active span of its request.
+    '''
+
+    def __init__(self, name, default=None):
+        self.name = name
+        self._value = default
+
+    def get(self):
+        return self._value
+
+    def set(self, value):
+        token = self._value
+        self._value = value
+        return token
+
+    def reset(self, token):
+        self._value = token
+
+
+_current_span = (_ThreadLocalVar if ContextVar is None else ContextVar)('acumos_model_runner_span', default=None)
+
+
+def parse_traceparent(header, tracestate=None):
+    '''Returns a SpanContext from a `traceparent` header value, or None if the header is missing or invalid'''
+    if not header:
+        return None
+    match = _TRACEPARENT_RE.match(header.strip().lower())
+    if match is None:
+        return None
+    version, trace_id, span_id, flags, rest = match.groups()
+    if version == 'ff' or (version == '00' and rest) or trace_id == _INVALID_TRACE_ID or span_id == _INVALID_SPAN_ID:
+        return None
+    return SpanContext(trace_id, span_id, int(flags, 16), tracestate)
+
+
+def format_traceparent(context):
+    '''Returns a version 00 `traceparent` header value for a SpanContext'''
+    return "00-{}-{}-{:02x}".format(context.trace_id, context.span_id, context.flags & 0xff)
+
+
+def current_span():
+    '''Returns the active Span of the current request, or None'''
+    return _current_span.get()
+
+
+def inject(headers=None):
+    '''Adds trace context headers of the active span to `headers`, e.g. for outgoing chain calls'''
+    headers = dict() if headers is None else headers
+    span = current_span()
+    if span is not None:
+        headers[TRACEPARENT] = format_traceparent(span.context)
+        if span.context.tracestate:
+            headers[TRACESTATE] = span.context.tracestate
+    return headers
+
+
+def _new_trace_id():
+    return os.urandom(16).hex()
+
+
+def _new_span_id():
+    return os.urandom(8).hex()
+
+
+class Span(object):
+    '''A timed operation within a trace'''
+
+    def __init__(self, name, context, parent_id=None, attributes=None):
+        self.name = name
+        self.context = context
+        self.parent_id = parent_id
+        self.attributes = dict() if attributes is None else attributes
+        self.start_time = time.time()
+        self.end_time = None
+        self.error = None
+        self._start = time.perf_counter()
+        self._end = None
+
+    @property
+    def duration(self):
+        '''Returns the span duration in seconds, or None if the span has not ended'''
+        return None if self._end is None else self._end - self._start
+
+    def end(self):
+        '''Ends the span'''
+        self._end = time.perf_counter()
+        self.end_time = self.start_time + self.duration
+
+    def to_dict(self):
+        '''Returns a JSON-serializable representation of the span'''
+        return {'name': self.name,
+                'trace_id': self.context.trace_id,
+                'span_id': self.context.span_id,
+                'parent_id': self.parent_id,
+                'start_time': self.start_time,
+                'end_time': self.end_time,
+                'duration': self.duration,
+                'attributes': self.attributes,
+                'error': self.error}
+
+
+class Tracer(object):
+
+    def __init__(self, exporter=None):
+        '''Creates spans and hands finished, sampled spans to `exporter`'''
+        self.exporter = exporter
+
+    @contextlib.contextmanager
+    def span(self, name, traceparent=None, tracestate=None, **attributes):
+        '''Context manager that makes a new span the active span
+
+        The parent is the span described by `traceparent` if provided and valid, otherwise the active span.
+        Without a parent, a new trace is started.
+        '''
+        parent = parse_traceparent(traceparent, tracestate)
+        if parent is None:
+            active = current_span()
+            parent = None if active is None else active.context
+
+        if parent is None:
+            context = SpanContext(_new_trace_id(), _new_span_id())
+            parent_id = None
+        else:
+            context = SpanContext(parent.trace_id, _new_span_id(), parent.flags, parent.tracestate)
+            parent_id = parent.span_id
+
+        span = Span(name, context, parent_id, attributes)
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as err:
+            span.error = "{}: {}".format(type(err).__name__, err)
+            raise
+        finally:
+            _current_span.reset(token)
+            span.end()
+            if self.exporter is not None and context.flags & _SAMPLED:
+                self.exporter.export(span)
+
+
+class InMemoryExporter(object):
+
+    def __init__(self):
+        '''Keeps finished spans in memory. Intended for tests'''
+        self.spans = []
+
+    def export(self, span):
+        self.spans.append(span)
+
+    def clear(self):
+        self.spans = []
+
+
+class FileExporter(object):
+
+    def __init__(self, path):
+        '''Appends finished spans to `path` as JSON lines'''
+        self.path = path
+        self._lock = threading.Lock()
+
+    def export(self, span):
+        line = json.dumps(span.to_dict()) + '\n'
+        with self._lock:
+            with open(self.path, 'a') as file:
+                file.write(line)
+
+
+class CollectorExporter(object):
+
+    def __init__(self, url, batch_size=64, interval=1.0, timeout=2.0):
+        '''POSTs batches of finished spans as a JSON array to a local collector at `url`
+
+        Spans are sent from a background thread so that request handling never waits on the collector.
+        '''
+        self.url = url
+        self.batch_size = batch_size
+        self.interval = interval
+        self.timeout = timeout
+        self._queue = queue.Queue(maxsize=batch_size * 64)
+        self._thread = None
+
+    def export(self, span):
+        if self._thread is None:
+            # the thread is started lazily so that it belongs to the gunicorn worker process
+            self._thread = threading.Thread(target=self._run, name='acumos-trace-exporter', daemon=True)
+            self._thread.start()
+        try:
+            self._queue.put_nowait(span.to_dict())
+        except queue.Full:
+            pass  # drop spans rather than block requests
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.interval
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self._send(batch)
+
+    def _send(self, batch):
+        import urllib.request  # imported here so that tracing without a collector stays light
+        data = json.dumps(batch).encode('utf-8')
+        req = urllib.request.Request(self.url, data=data, headers={'Content-Type': 'application/json'})
+        try:
+            urllib.request.urlopen(req, timeout=self.timeout).close()
+        except OSError:
+            pass  # the collector is best effort
+
+
+def create_exporter(spec):
+    '''Returns a span exporter given a spec: "file:<path>" or an http(s) collector URL'''
+    if spec.startswith('file:'):
+        return FileExporter(spec[len('file:'):])
+    elif spec.startswith(('http://', 'https://')):
+        return CollectorExporter(spec)
+    else:
+        raise ValueError("Unknown trace exporter {!r}. Expected 'file:<path>' or an http(s) URL".format(spec))
@@ -19,6 +19,8 @@
 """
 Provides model runner utilities
 """
+import os
+import sys
 from os.path import dirname, join as path_join
 
 
@@ -34,3 +36,31 @@ def load_data(*path, prefix=_DATA_DIR, mode='r', loader=lambda file: file.read()
     '''Loads and returns the contents of a file in the acumos_model_runner/data/ dir'''
     with open(data_path(*path, prefix=prefix), mode) as file:
         return loader(file)
+
+
+def get_rss():
+    '''Returns the resident set size of the current process in bytes, or None if it cannot be determined'''
+    try:
+        with open('/proc/self/statm') as file:
+            return int(file.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        pass
+    try:
+        import resource
+    except ImportError:
+        return None
+    # peak rather than current usage. Reported in kilobytes on Linux and in bytes on macOS
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return maxrss if sys.platform == 'darwin' else maxrss * 1024
+
+
+def get_uss():
+    '''Returns the unique set size of the current process in bytes, i.e. memory not shared with other processes such
+    as the gunicorn master or other workers, or None if it cannot be determined'''
+    for path in ('/proc/self/smaps_rollup', '/proc/self/smaps'):
+        try:
+            with open(path) as file:
+                return sum(int(line.split()[1]) * 1024 for line in file if line.startswith(('Private_Clean:', 'Private_Dirty:')))
+        except (OSError, ValueError, IndexError):
+            pass
+    return None
@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+# ===============LICENSE_START=======================================================
+# Acumos Apache-2.0
+# ===================================================================================
+# Copyright (C) 2017-2018 AT&T Intellectual Property & Tech Mahindra. All rights reserved.
+# ===================================================================================
+# This Acumos software file is distributed by AT&T and Tech Mahindra
+# under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# This file is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ===============LICENSE_END=========================================================
+"""
+Provides a warmup pass that sends sample inputs through every model method before a worker reports ready
+"""
+import time
+import logging
+
+from acumos_model_runner.tracing import Tracer
+from acumos_model_runner.samples import create_samples, request_variants
+
+
+logger = logging.getLogger('gunicorn.error')
+
+
+def warm_up(app, samples_dir=None, rounds=3):
+    '''Sends sample inputs through the full decode, compute and encode path of every method of a model Flask app
+
+    Every method is called `rounds` times, at least once, with each body type it consumes. Inputs are read from `samples_dir` as
+    described in `acumos_model_runner.samples`, or synthesized from the protobuf descriptors of the loaded model. The app's
+    tracer, slow request log and traffic recorder are disabled meanwhile, so that warmup requests are not reported as traffic.
+
+    Returns a list of dicts with the method, body type, status code and milliseconds of each round.
+    '''
+    start = time.perf_counter()
+    samples = create_samples(app.model, app.methods_info, samples_dir)
+
+    saved = (app.tracer, app.slow_request_log, app.traffic_recorder)
+    app.tracer, app.slow_request_log, app.traffic_recorder = Tracer(), None, None
+    try:
+        client = app.test_client()
+        results = [_warm_up_method(client, method_name, label, headers, body, rounds)
+                   for method_name, label, headers, body in request_variants(app.methods_info, samples)]
+    finally:
+        app.tracer, app.slow_request_log, app.traffic_recorder = saved
+
+    logger.info("Warmed up %d methods in %.1fms", len(app.methods_info), (time.perf_counter() - start) * 1000)
+    return results
+
+
+def _warm_up_method(client, method_name, label, headers, body, rounds):
+    '''Calls a method `rounds` times and logs the timings'''
+    timings = []
+    for _ in range(max(rounds, 1)):
+        start = time.perf_counter()
+        resp = client.post("/model/methods/{}".format(method_name), data=body, headers=headers)
+        timings.append((time.perf_counter() - start) * 1000)
+        resp.close()
+
+    if resp.status_code != 200:
+        # synthesized inputs may be invalid for a model, which only means that the method is warmed up less
+        logger.warning("Warmup of %s with a %s body failed with status %d: %s", method_name, label, resp.status_code,
+                       resp.get_data(as_text=True)[:200])
+    logger.info("Warmed up %s with a %s body: %s", method_name, label, " ".join("{:.1f}ms".format(t) for t in timings))
+    return {'method': method_name, 'body': label, 'status': resp.status_code, 'timings': timings}
@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+# ===============LICENSE_START=======================================================
+# Acumos Apache-2.0
+# ===================================================================================
+# Copyright (C) 2017-2018 AT&T Intellectual Property & Tech Mahindra. All rights reserved.
+# ===================================================================================
+# This Acumos software file is distributed by AT&T and Tech Mahindra
+# under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# This file is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ===============LICENSE_END=========================================================
+"""
+Provides a memory watchdog that recycles gunicorn workers whose memory grows past a limit
+
+Workers share a small state file holding the time of the last recycle and the number of recycles, so that recycles
+are staggered across workers and counted across worker lifetimes.
+"""
+import os
+import json
+import time
+import fcntl
+import logging
+
+from acumos_model_runner.utils import get_rss, get_uss
+
+
+logger = logging.getLogger('gunicorn.error')
+
+_MEASURES = {'rss': get_rss, 'uss': get_uss}
+
+
+class MemoryWatchdog(object):
+
+    def __init__(self, limit, state_path, measure='rss', stagger=30.0, check_interval=1.0, metrics=None):
+        '''Decides when a worker should be recycled because its memory exceeds `limit`
+
+        Parameters
+        ----------
+        limit : int
+            Memory limit in bytes
+        state_path : str
+            File shared by all workers that coordinates and counts recycles
+        measure : str, optional
+            'rss' for the resident set size, or 'uss' for the unique set size, which excludes memory shared with
+            the master and other workers
+        stagger : float, optional
+            Minimum seconds between two recycles of any workers, so that capacity is never lost all at once
+        check_interval : float, optional
+            Minimum seconds between two memory measurements of this worker
+        metrics : acumos_model_runner.metrics.Registry, optional
+            Registry to expose the worker memory and the number of recycles in
+        '''
+        if measure not in _MEASURES:
+            raise ValueError("Memory measure must be one of {}".format(sorted(_MEASURES)))
+        self.limit = limit
+        self.state_path = state_path
+        self.measure = measure
+        self.stagger = stagger
+        self.check_interval = check_interval
+        self._measure = _MEASURES[measure]
+        self._last_check = None
+        self._memory = None
+        self._memory_gauge = None
+        self._recycles = None
+        if metrics is not None:
+            self._memory_gauge = metrics.gauge('acumos_worker_memory_bytes', 'Worker memory as measured by the memory watchdog')
+            # every worker reads the count of all workers from the state file
+            self._recycles = metrics.counter('acumos_worker_memory_recycles_total', 'Workers recycled for exceeding the memory limit',
+                                             shared=True)
+            metrics.add_collector(self._collect)
+
+    def should_recycle(self):
+        '''Returns True if the worker is over the limit and it is its turn to be recycled'''
+        now = time.monotonic()
+        if self._last_check is not None and now - self._last_check < self.check_interval:
+            return False
+        self._last_check = now
+
+        self._memory = self._measure()
+        if self._memory is None or self._memory <= self.limit:
+            return False
+        return self._claim_recycle()
+
+    def _claim_recycle(self):
+        '''Records a recycle in the shared state unless another worker was recycled less than `stagger` seconds ago'''
+        with open(self.state_path, 'a+') as file:
+            fcntl.flock(file, fcntl.LOCK_EX)
+            try:
+                state = _read_state(file)
+                if time.time() - state['last'] < self.stagger:
+                    return False
+                state = {'last': time.time(), 'count': state['count'] + 1}
+                file.seek(0)
+                file.truncate()
+                json.dump(state, file)
+                file.flush()
+            finally:
+                fcntl.flock(file, fcntl.LOCK_UN)
+
+        logger.warning("Recycling worker %d: %s of %.1fMiB exceeds the limit of %.1fMiB", os.getpid(), self.measure.upper(),
+                       self._memory / (1024 * 1024), self.limit / (1024 * 1024))
+        return True
+
+    def recycles(self):
+        '''Returns the number of workers recycled since the state file was created'''
+        try:
+            with open(self.state_path) as file:
+                fcntl.flock(file, fcntl.LOCK_SH)
+                try:
+                    return _read_state(file)['count']
+                finally:
+                    fcntl.flock(file, fcntl.LOCK_UN)
+        except OSError:
+            return 0
+
+    def _collect(self):
+        '''Updates the metrics before they are rendered'''
+        memory = self._measure()
+        if memory is not None:
+            self._memory_gauge.set(memory, measure=self.measure)
+        self._recycles.set(self.recycles())
+
+
+def _read_state(file):
+    '''Reads the shared state from the start of a locked file'''
+    file.seek(0)
+    try:
+        return json.loads(file.read())
+    except ValueError:
+        return {'last': 0, 'count': 0}  # new file
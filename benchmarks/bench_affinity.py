@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+# ===============LICENSE_START=======================================================
+# Acumos Apache-2.0
+# ===================================================================================
+# Copyright (C) 2017-2018 AT&T Intellectual Property & Tech Mahindra. All rights reserved.
+# ===================================================================================
+# This Acumos software file is distributed by AT&T and Tech Mahindra
+# under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# This file is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ===============LICENSE_END=========================================================
+'''
+Benchmarks the latency of a CPU bound model with and without --cpu-affinity
+
+Each case starts a model runner with one worker per group of CPUs and drives it with more concurrent clients than
+workers, so that workers and their BLAS threads compete for the CPUs. Latency percentiles are in milliseconds.
+'''
+import os
+import sys
+import json
+from tempfile import TemporaryDirectory
+from os.path import join as path_join
+
+import numpy as np
+from acumos.session import AcumosSession
+from acumos.modeling import Model, List
+
+from acumos_model_runner.bench import RunnerProcess
+from acumos_model_runner.loadgen import LoadRequest, run_load
+
+from benchutils import benchmark_parser, finish, print_table
+
+
+_METRICS = ('p50', 'p90', 'p99', 'max')
+_SIZE = 128
+
+
+def _create_model():
+    '''Returns a model whose method multiplies matrices, so that requests use native threads and CPU caches'''
+    def multiply(values: List[float]) -> float:
+        matrix = np.array(values).reshape(_SIZE, _SIZE)
+        return float(np.linalg.norm(matrix @ matrix @ matrix))
+
+    return Model(multiply=multiply)
+
+
+def run(workers, concurrency, requests, warmup):
+    '''Returns case name to latency percentiles with CPU affinity off and on'''
+    body = json.dumps({'values': [float(i % 7) for i in range(_SIZE * _SIZE)]}).encode()
+    headers = {'Content-Type': 'application/json', 'Accept': 'application/json'}
+
+    with TemporaryDirectory() as tdir:
+        AcumosSession().dump(_create_model(), 'bench-model', tdir)
+        model_dir = path_join(tdir, 'bench-model')
+
+        results = dict()
+        for affinity in (False, True):
+            options = {'workers': workers, 'cpu_affinity': affinity}
+            with RunnerProcess(model_dir, options=options) as runner:
+                run_load(runner.base_url, [LoadRequest(None, 'multiply', headers, body)] * warmup, concurrency)
+                stats = run_load(runner.base_url, [LoadRequest(None, 'multiply', headers, body)] * requests, concurrency)
+            assert stats['errors'] == 0, stats
+            case = "workers={}/affinity={}".format(workers, 'on' if affinity else 'off')
+            results[case] = {metric: stats[metric] for metric in _METRICS}
+        return results
+
+
+if __name__ == '__main__':
+    parser = benchmark_parser('affinity', __doc__.strip().splitlines()[0])
+    parser.add_argument('--workers', type=int, default=max(1, len(os.sched_getaffinity(0)) // 2), help='The number of gunicorn workers')
+    parser.add_argument('--concurrency', type=int, default=None, help='The number of concurrent clients. Defaults to twice the workers')
+    parser.add_argument('--requests', type=int, default=2000, help='Measured requests per case')
+    parser.add_argument('--warmup', type=int, default=200, help='Unmeasured requests per case')
+    pargs = parser.parse_args()
+
+    results = run(pargs.workers, pargs.concurrency or 2 * pargs.workers, pargs.requests, pargs.warmup)
+    print_table(results, _METRICS, 'ms')
+    sys.exit(finish(pargs, results, ('p50', 'p99')))
@@ -0,0 +1,136 @@
+# -*- coding: utf-8 -*-
+# ===============LICENSE_START=======================================================
+# Acumos Apache-2.0
+# ===================================================================================
+# Copyright (C) 2017-2018 AT&T Intellectual Property & Tech Mahindra. All rights reserved.
+# ===================================================================================
+# This Acumos software file is distributed by AT&T and Tech Mahindra
+# under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# This file is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ===============LICENSE_END=========================================================
+'''
+Benchmarks the request hot path of api.methods in process, without sockets
+
+Each request is sent through the Flask test client, so the full connexion and Flask dispatch is included.
+The request spans of the runner split the time per request into:
+
+- framework: connexion, Flask and the test client, i.e. everything outside of api.methods
+- dispatch: api.methods overhead such as content type checks, i.e. everything outside of the phases below
+- decode, compute, encode: input decoding, model method and output encoding
+'''
+import sys
+import json
+import time
+from collections import Counter, defaultdict
+from tempfile import TemporaryDirectory
+from os.path import join as path_join
+
+from acumos.session import AcumosSession
+from acumos.modeling import Model, List, Dict, new_type
+
+from acumos_model_runner.api import _JSON, _PROTO, _TEXT, _OCTET_STREAM
+from acumos_model_runner.runner import _write_oas
+from acumos_model_runner.server import _build_app
+from acumos_model_runner.tracing import Tracer, InMemoryExporter
+
+from benchutils import benchmark_parser, finish, median, print_table
+
+
+_METRICS = ('total', 'framework', 'dispatch', 'decode', 'compute', 'encode')
+
+
+def _create_model():
+    '''Returns a model with the method shapes of the runner tests'''
+    def add(x: int, y: int) -> int:
+        return x + y
+
+    def count(strings: List[str]) -> Dict[str, int]:
+        return Counter(strings)
+
+    Image = new_type(raw_type=bytes, name="Image")
+
+    def rotate_image(img: Image) -> Image:
+        return img
+
+    Dictionary = new_type(raw_type=dict, name="Dictionary")
+
+    def handle_dict(_dict: Dictionary) -> Dictionary:
+        return _dict
+
+    Text = new_type(str, 'Text')
+
+    def count_words(text: Text) -> int:
+        return len(text.split(u' '))
+
+    return Model(add=add, count=count, rotate_image=rotate_image, handle_dict=handle_dict, count_words=count_words)
+
+
+def _cases(model):
+    '''Returns (case name, method, Content-Type, Accept, body) tuples'''
+    add_in = {'x': 1, 'y': 2}
+    count_in = {'strings': ['a', 'b', 'c', 'a'] * 25}
+    return [
+        ('add/json', 'add', _JSON, _JSON, json.dumps(add_in).encode()),
+        ('add/protobuf', 'add', _PROTO, _PROTO, model.methods['add'].pb_input_type(**add_in).SerializeToString()),
+        ('count/json', 'count', _JSON, _JSON, json.dumps(count_in).encode()),
+        ('count/protobuf', 'count', _PROTO, _PROTO, model.methods['count'].pb_input_type(**count_in).SerializeToString()),
+        ('rotate_image/raw', 'rotate_image', _OCTET_STREAM, _OCTET_STREAM, bytes(range(256)) * 64),
+        ('handle_dict/raw', 'handle_dict', _JSON, _JSON, json.dumps({str(i): i for i in range(100)}).encode()),
+        ('count_words/raw', 'count_words', _TEXT, _JSON, " ".join(['word'] * 100).encode()),
+    ]
+
+
+def run(iterations, warmup):
+    '''Returns case name to median microseconds per phase'''
+    with TemporaryDirectory() as tdir:
+        AcumosSession().dump(_create_model(), 'bench-model', tdir)
+        model_dir = path_join(tdir, 'bench-model')
+        _write_oas(model_dir)
+        app = _build_app(model_dir, None)
+        exporter = InMemoryExporter()
+        app.tracer = Tracer(exporter)
+        client = app.test_client()
+
+        results = dict()
+        for name, method, content_type, accept, body in _cases(app.model):
+            path = "/model/methods/{}".format(method)
+            headers = {'Content-Type': content_type, 'Accept': accept}
+            for _ in range(warmup):
+                client.post(path, data=body, headers=headers)
+
+            samples = defaultdict(list)
+            for _ in range(iterations):
+                exporter.clear()
+                start = time.perf_counter()
+                resp = client.post(path, data=body, headers=headers)
+                total = time.perf_counter() - start
+                assert resp.status_code == 200, resp.data
+
+                spans = {span.name: span.duration for span in exporter.spans}
+                samples['total'].append(total)
+                samples['framework'].append(total - spans['request'])
+                samples['dispatch'].append(spans['request'] - spans['decode'] - spans['compute'] - spans['encode'])
+                for phase in ('decode', 'compute', 'encode'):
+                    samples[phase].append(spans[phase])
+
+            results[name] = {metric: median(values) * 1e6 for metric, values in samples.items()}
+        return results
+
+
+if __name__ == '__main__':
+    parser = benchmark_parser('hot_path', __doc__.strip().splitlines()[0])
+    parser.add_argument('--iterations', type=int, default=2000, help='Measured requests per case')
+    parser.add_argument('--warmup', type=int, default=200, help='Unmeasured requests per case')
+    pargs = parser.parse_args()
+
+    results = run(pargs.iterations, pargs.warmup)
+    print_table(results, _METRICS, 'us')
+    sys.exit(finish(pargs, results, ('total', 'framework', 'dispatch')))
@@ -0,0 +1,161 @@
+# -*- coding: utf-8 -*-
+# ===============LICENSE_START=======================================================
+# Acumos Apache-2.0
+# ===================================================================================
+# Copyright (C) 2017-2018 AT&T Intellectual Property & Tech Mahindra. All rights reserved.
+# ===================================================================================
+# This Acumos software file is distributed by AT&T and Tech Mahindra
+# under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# This file is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ===============LICENSE_END=========================================================
+"""
+Benchmarks OpenAPI specification generation on synthetic protobuf files with many, deeply nested messages
+
+Each case generates the same messages as protobuf IDL and as a FileDescriptorProto, and times IDL parsing,
+definition building from the parsed IDL and from the descriptor, and complete specification generation.
+"""
+import sys
+import time
+
+from google.protobuf.descriptor_pb2 import FileDescriptorProto, FieldDescriptorProto
+
+from acumos_model_runner.proto_parser import parse_proto
+from acumos_model_runner.oas_gen import create_spec, _create_definitions, _create_descriptor_definitions
+
+from benchutils import benchmark_parser, finish, median, print_table
+
+
+_METRICS = ('parse', 'idl_definitions', 'descriptor_definitions', 'spec_idl', 'spec_descriptor')
+_CASES = ((1000, 1), (1000, 8), (10000, 1), (10000, 8))
+
+_PACKAGE = 'synthetic'
+_SCALARS = (('int64', FieldDescriptorProto.TYPE_INT64), ('string', FieldDescriptorProto.TYPE_STRING),
+            ('double', FieldDescriptorProto.TYPE_DOUBLE), ('bool', FieldDescriptorProto.TYPE_BOOL))
+
+
+def synthesize(num_messages, depth):
+    '''Returns protobuf IDL and an equivalent FileDescriptorProto with `num_messages` messages nested `depth` deep
+
+    Messages form chains of `depth` nested messages. Every message has scalar, repeated and map fields, a field of
+    its nested message type referenced by its local name, a field of the chain's enum, and a field of the previous
+    chain's top-level message referenced by its global name.
+    '''
+    lines = ['syntax = "proto3";', "package {};".format(_PACKAGE)]
+    file_proto = FileDescriptorProto(name='synthetic.proto', package=_PACKAGE, syntax='proto3')
+    for chain in range(num_messages // depth):
+        enum_name = "Enum{}".format(chain)
+        lines.append("enum {} {{ {}_A = 0; {}_B = 1; }}".format(enum_name, enum_name, enum_name))
+        enum_proto = file_proto.enum_type.add(name=enum_name)
+        enum_proto.value.add(name="{}_A".format(enum_name), number=0)
+        enum_proto.value.add(name="{}_B".format(enum_name), number=1)
+
+        previous = "Chain{}".format(chain - 1) if chain else None
+        lines.extend(_synthesize_message(file_proto.message_type.add(), "Chain{}".format(chain), (), depth, enum_name, previous))
+    return "\n".join(lines), file_proto
+
+
+def _synthesize_message(msg_proto, name, scope, depth, enum_name, previous):
+    '''Fills a DescriptorProto and yields the equivalent IDL lines of a message and its nested messages'''
+    scope = scope + (name, )
+    full_name = ".{}.{}".format(_PACKAGE, ".".join(scope))
+    msg_proto.name = name
+    yield "message {} {{".format(name)
+
+    number = 1
+    for type_name, type_ in _SCALARS:
+        yield "  {} {}_value = {};".format(type_name, type_name, number)
+        msg_proto.field.add(name="{}_value".format(type_name), number=number, type=type_, label=FieldDescriptorProto.LABEL_OPTIONAL)
+        number += 1
+
+    yield "  repeated double values = {};".format(number)
+    msg_proto.field.add(name='values', number=number, type=FieldDescriptorProto.TYPE_DOUBLE, label=FieldDescriptorProto.LABEL_REPEATED)
+    number += 1
+
+    yield "  map<string, int32> counts = {};".format(number)
+    entry = msg_proto.nested_type.add(name='CountsEntry')
+    entry.options.map_entry = True
+    entry.field.add(name='key', number=1, type=FieldDescriptorProto.TYPE_STRING, label=FieldDescriptorProto.LABEL_OPTIONAL)
+    entry.field.add(name='value', number=2, type=FieldDescriptorProto.TYPE_INT32, label=FieldDescriptorProto.LABEL_OPTIONAL)
+    msg_proto.field.add(name='counts', number=number, type=FieldDescriptorProto.TYPE_MESSAGE, label=FieldDescriptorProto.LABEL_REPEATED,
+                        type_name="{}.CountsEntry".format(full_name))
+    number += 1
+
+    yield "  {} kind = {};".format(enum_name, number)
+    msg_proto.field.add(name='kind', number=number, type=FieldDescriptorProto.TYPE_ENUM, label=FieldDescriptorProto.LABEL_OPTIONAL,
+                        type_name=".{}.{}".format(_PACKAGE, enum_name))
+    number += 1
+
+    if previous is not None:
+        yield "  {} previous = {};".format(previous, number)
+        msg_proto.field.add(name='previous', number=number, type=FieldDescriptorProto.TYPE_MESSAGE, label=FieldDescriptorProto.LABEL_OPTIONAL,
+                            type_name=".{}.{}".format(_PACKAGE, previous))
+        number += 1
+
+    if depth > 1:
+        child = "Level{}".format(len(scope))
+        yield from _synthesize_message(msg_proto.nested_type.add(), child, scope, depth - 1, enum_name, None)
+        yield "  repeated {} children = {};".format(child, number)
+        msg_proto.field.add(name='children', number=number, type=FieldDescriptorProto.TYPE_MESSAGE, label=FieldDescriptorProto.LABEL_REPEATED,
+                            type_name="{}.{}".format(full_name, child))
+
+    yield "}"
+
+
+def _metadata():
+    '''Returns model metadata with a single method taking the first synthetic message'''
+    type_def = {'name': 'Chain0', 'media_type': ['application/vnd.google.protobuf'], 'metadata': {}, 'description': ''}
+    return {'schema': 'acumos.schema.model:0.6.0', 'name': 'synthetic',
+            'methods': {'predict': {'input': dict(type_def), 'output': dict(type_def), 'description': ''}}}
+
+
+def _time(func, repeat):
+    '''Returns the median seconds of calling `func` and its last result'''
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        times.append(time.perf_counter() - start)
+    return median(times), result
+
+
+def run(cases, repeat):
+    '''Returns case name to median milliseconds per metric'''
+    results = dict()
+    for num_messages, depth in cases:
+        proto, file_proto = synthesize(num_messages, depth)
+        parse, top_level = _time(lambda: parse_proto(proto), repeat)
+        idl_definitions, idl_defs = _time(lambda: _create_definitions(top_level), repeat)
+        descriptor_definitions, descriptor_defs = _time(lambda: _create_descriptor_definitions(file_proto), repeat)
+        assert idl_defs == descriptor_defs
+        spec_idl, _ = _time(lambda: create_spec(_metadata(), proto), repeat)
+        spec_descriptor, _ = _time(lambda: create_spec(_metadata(), proto, file_proto), repeat)
+
+        seconds = dict(parse=parse, idl_definitions=idl_definitions, descriptor_definitions=descriptor_definitions,
+                       spec_idl=spec_idl, spec_descriptor=spec_descriptor)
+        results["{}x{}".format(num_messages, depth)] = {metric: value * 1000 for metric, value in seconds.items()}
+    return results
+
+
+def _case(value):
+    '''Parses a <messages>x<depth> case'''
+    num_messages, depth = value.split('x')
+    return int(num_messages), int(depth)
+
+
+if __name__ == '__main__':
+    parser = benchmark_parser('oas', __doc__.strip().splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=3, help='Repetitions per measurement')
+    parser.add_argument('cases', nargs='*', type=_case, default=_CASES, help='Cases as <messages>x<depth>, e.g. 10000x8')
+    pargs = parser.parse_args()
+
+    results = run(pargs.cases, pargs.repeat)
+    print_table(results, _METRICS, 'ms')
+    sys.exit(finish(pargs, results, _METRICS))
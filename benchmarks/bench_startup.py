@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+# ===============LICENSE_START=======================================================
+# Acumos Apache-2.0
+# ===================================================================================
+# Copyright (C) 2017-2018 AT&T Intellectual Property & Tech Mahindra. All rights reserved.
+# ===================================================================================
+# This Acumos software file is distributed by AT&T and Tech Mahindra
+# under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# This file is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ===============LICENSE_END=========================================================
+'''
+Benchmarks the time to first successful request for the backward compatible model fixtures
+
+Every measurement runs in a fresh interpreter on a fresh copy of the fixture, so that imports, unpickling
+and model extraction are as cold as in a newly started container. Time is split into imports, create_oas,
+App.add_api, load_model, _read_methods and the first request.
+'''
+import os
+import sys
+import json
+import time
+import shutil
+import subprocess
+from collections import defaultdict
+from tempfile import TemporaryDirectory
+from os.path import abspath, dirname, join as path_join
+
+from benchutils import benchmark_parser, finish, median, print_table
+
+
+FIXTURES_DIR = abspath(path_join(dirname(__file__), '..', 'acumos_model_runner', 'tests', 'data', 'backward_compatible_models'))
+
+_METRICS = ('total', 'imports', 'create_oas', 'add_api', 'load_model', 'read_methods', 'first_request')
+
+
+def measure(model_dir):
+    '''Starts a model in the current interpreter and returns seconds per phase. Must run in a fresh interpreter'''
+    start = time.perf_counter()
+    from acumos_model_runner.profiling import StartupProfile
+    from acumos_model_runner.runner import _write_oas, _methods_from_spec
+    from acumos_model_runner.server import _build_app
+    from acumos_model_runner.bundle import Bundle
+    imports = time.perf_counter() - start
+
+    profile = StartupProfile()
+    spec = _write_oas(model_dir, profile)
+    app = _build_app(model_dir, None, profile=profile, bundle=Bundle(None, spec, _methods_from_spec(spec)))
+
+    first_request = time.perf_counter()
+    headers = {'Content-Type': 'application/json', 'Accept': 'application/json'}
+    resp = app.test_client().post('/model/methods/add', data=json.dumps({'x': 1, 'y': 2}), headers=headers)
+    assert resp.status_code == 200, resp.data
+    end = time.perf_counter()
+
+    return dict(profile.phases, imports=imports, first_request=end - first_request, total=end - start)
+
+
+def run(fixtures, repeat):
+    '''Returns fixture name to median milliseconds per phase'''
+    results = dict()
+    for fixture in fixtures:
+        samples = defaultdict(list)
+        for _ in range(repeat):
+            with TemporaryDirectory() as tdir:
+                model_dir = path_join(tdir, fixture)
+                shutil.copytree(path_join(FIXTURES_DIR, fixture), model_dir)
+                proc = subprocess.run([sys.executable, __file__, '--child', model_dir], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+            if proc.returncode != 0:
+                print("Skipping {}: {}".format(fixture, proc.stderr.decode().strip().splitlines()[-1]))
+                break
+            for phase, seconds in json.loads(proc.stdout.decode().strip().splitlines()[-1]).items():
+                samples[phase].append(seconds)
+        else:
+            results[fixture] = {phase: median(values) * 1000 for phase, values in samples.items()}
+    return results
+
+
+if __name__ == '__main__':
+    if sys.argv[1:2] == ['--child']:
+        print(json.dumps(measure(sys.argv[2])))
+        sys.exit(0)
+
+    parser = benchmark_parser('startup', __doc__.strip().splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=5, help='Cold starts per fixture')
+    parser.add_argument('fixtures', nargs='*', default=sorted(os.listdir(FIXTURES_DIR)), help='Fixture names. Defaults to all')
+    pargs = parser.parse_args()
+
+    results = run(pargs.fixtures, pargs.repeat)
+    if not results:
+        print("No fixture could be loaded. The fixtures require Python 3.6")
+        sys.exit(1)
+    print_table(results, _METRICS, 'ms')
+    sys.exit(finish(pargs, results, _METRICS))
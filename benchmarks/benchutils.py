@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+# ===============LICENSE_START=======================================================
+# Acumos Apache-2.0
+# ===================================================================================
+# Copyright (C) 2017-2018 AT&T Intellectual Property & Tech Mahindra. All rights reserved.
+# ===================================================================================
+# This Acumos software file is distributed by AT&T and Tech Mahindra
+# under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# This file is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ===============LICENSE_END=========================================================
+'''
+Provides utilities shared by the benchmarks
+'''
+import os
+import json
+import time
+import argparse
+import platform
+from os.path import dirname, join as path_join
+
+
+BASELINE_DIR = path_join(dirname(__file__), 'baselines')
+
+
+def benchmark_parser(name, description):
+    '''Returns an argument parser with the options common to all benchmarks'''
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument('--baseline', type=str, default=path_join(BASELINE_DIR, "{}.json".format(name)),
+                        help='Baseline results to compare against')
+    parser.add_argument('--save', action='store_true', help='Saves the results as the new baseline instead of comparing')
+    parser.add_argument('--history', type=str, default=None, help='Appends the results as a JSON line to this file')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='Relative slowdown reported as a regression')
+    return parser
+
+
+def environment():
+    '''Returns a description of the environment the benchmark ran in'''
+    return {'python': platform.python_version(), 'platform': platform.platform(), 'cpus': os.cpu_count(), 'time': time.time()}
+
+
+def median(values):
+    '''Returns the median of a sequence of numbers'''
+    values = sorted(values)
+    mid = len(values) // 2
+    return values[mid] if len(values) % 2 else (values[mid - 1] + values[mid]) / 2.
+
+
+def finish(pargs, results, metrics):
+    '''Saves, records and compares benchmark results. Returns an exit code
+
+    Parameters
+    ----------
+    pargs : argparse.Namespace
+        Parsed arguments from `benchmark_parser`
+    results : dict
+        Case name to a dict of metric name to value, where lower values are better
+    metrics : sequence of str
+        The metrics to compare against the baseline
+    '''
+    report = {'environment': environment(), 'results': results}
+
+    if pargs.history is not None:
+        with open(pargs.history, 'a') as file:
+            file.write(json.dumps(report) + '\n')
+
+    if pargs.save:
+        os.makedirs(dirname(pargs.baseline), exist_ok=True)
+        with open(pargs.baseline, 'w') as file:
+            json.dump(report, file, indent=2, sort_keys=True)
+        print("Saved baseline to {}".format(pargs.baseline))
+        return 0
+
+    if not os.path.isfile(pargs.baseline):
+        print("No baseline at {}. Run with --save to create one".format(pargs.baseline))
+        return 0
+
+    with open(pargs.baseline) as file:
+        baseline = json.load(file)['results']
+
+    regressions = compare(results, baseline, metrics, pargs.tolerance)
+    for case, metric, old, new in regressions:
+        print("REGRESSION {} {}: {:.3f} -> {:.3f} ({:+.0%})".format(case, metric, old, new, new / old - 1))
+    if not regressions:
+        print("No regressions beyond {:.0%} of {}".format(pargs.tolerance, pargs.baseline))
+    return 1 if regressions else 0
+
+
+def compare(results, baseline, metrics, tolerance):
+    '''Returns (case, metric, baseline value, new value) tuples for metrics that slowed down by more than `tolerance`'''
+    regressions = []
+    for case, values in sorted(results.items()):
+        for metric in metrics:
+            old = baseline.get(case, dict()).get(metric)
+            new = values.get(metric)
+            if old and new is not None and new > old * (1 + tolerance):
+                regressions.append((case, metric, old, new))
+    return regressions
+
+
+def print_table(results, metrics, unit):
+    '''Prints results as a table'''
+    labels = ["{} ({})".format(metric, unit) for metric in metrics]
+    width = max(len(case) for case in results)
+    print("  ".join(['case'.ljust(width)] + [label.rjust(max(12, len(label))) for label in labels]))
+    for case, values in sorted(results.items()):
+        cells = ["{:.1f}".format(values[metric]).rjust(max(12, len(label))) for metric, label in zip(metrics, labels)]
+        print("  ".join([case.ljust(width)] + cells))
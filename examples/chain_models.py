@@ -26,9 +26,11 @@ import requests
 import pexpect
 from acumos.session import AcumosSession
 from acumos.modeling import Model, List, Dict
+from acumos_model_runner.tracing import Tracer, inject
 
 
 _JSON = 'application/json'
+_TRACER = Tracer()
 
 
 class Runner(object):
@@ -50,12 +52,15 @@ class Runner(object):
 
     def call(self, method, data):
         '''Calls a model method with JSON data. If `method` is a chain, returns the downstream response'''
-        if method in self.chains:
-            upstream_method, downstream_runner, downstream_method = self.chains[method]
-            resp_up = requests.post(self._full_url(upstream_method), json=data, headers=self._HEADERS).json()
-            resp = downstream_runner.call(downstream_method, resp_up)
-        else:
-            resp = requests.post(self._full_url(method), json=data, headers=self._HEADERS).json()
+        # both hops of a chain are reported under the same trace via the W3C traceparent header
+        with _TRACER.span(method):
+            headers = inject(dict(self._HEADERS))
+            if method in self.chains:
+                upstream_method, downstream_runner, downstream_method = self.chains[method]
+                resp_up = requests.post(self._full_url(upstream_method), json=data, headers=headers).json()
+                resp = downstream_runner.call(downstream_method, resp_up)
+            else:
+                resp = requests.post(self._full_url(method), json=data, headers=headers).json()
         return resp
 
     def _full_url(self, method):
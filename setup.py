@@ -61,6 +61,8 @@ setup(
                       'jinja2',
                       'protobuf',
                       'flask-cors'],
+    extras_require={'http2': ['hypercorn>=0.15'],
+                    'compression': ['zstandard', 'brotli']},
     keywords='acumos machine learning model runner server protobuf ml ai',
     license='Apache License 2.0',
     long_description='\n'.join(_long_descr()),